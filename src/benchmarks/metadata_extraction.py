@@ -0,0 +1,143 @@
+"""Benchmarks `extract_metadata` against the previous row by row version,
+on endpoints resampled from a file, and checks that the outputs are identical.
+The hit rate of the memoized metadata parser is reported for each size.
+The previous version is only run up to `legacy_rows` endpoints.
+
+Usage: metadata_extraction.py --data_path=<data_path> [--sizes=<sizes>] [--legacy_rows=<legacy_rows>]
+
+Options:
+--data_path=<data_path>         Path to a .parquet, .arrow or .xlsx file with response_metadata and parameters columns
+--sizes=<sizes>                 Comma separated numbers of endpoints [default: 10000,100000,1000000]
+--legacy_rows=<legacy_rows>     Largest number of endpoints run with the previous version [default: 100000]
+
+Example (from the src folder):
+python -m benchmarks.metadata_extraction --data_path=../data/processed/pii_fii_all.parquet
+"""
+
+from docopt import docopt
+from utils.artifacts import read_artifact
+from numpy import NaN
+from utils.literal_parser import clear_parser_cache, parser_stats
+from utils.metadata_extraction import extract_metadata
+import pandas as pd
+import time
+
+# the header rules of the previous version
+high_risk_security_headers = [
+    'x-frame-options', 'x-xss-protection', 'strict-transport-security',
+    'expect-ct', 'referrer-policy', 'content-type', 'set-cookie',
+    'access-control-allow-origin', 'server', 'x-powered-by',
+    'x-aspnet-version', 'x-ratelimit-limit'
+]
+recommend_dict = {
+    'x-frame-options': 'DENY',
+    'x-xss-protection': '0',
+    'strict-transport-security': 'includeSubDomains',
+    'expect-ct': 'max-age',
+    'referrer-policy': 'strict-origin-when-cross-origin',
+    'content-type': 'charset',
+    'set-cookie': 'Secure',
+    'access-control-allow-origin': 'https'
+}
+should_not_be_present = ['server', 'x-powered-by', 'x-aspnet-version']
+good_to_be_present = ['x-ratelimit-limit']
+
+
+def previous_extract_metadata(df):
+    """
+    Extracts the metadata features the way `extract_metadata` used to:
+    row by row, with scalar writes to the dataframe.
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The dataframe to be processed.
+    Returns
+    -------
+    df : pandas.DataFrame
+        The dataframe with the metadata features.
+    """
+    df["response_metadata"] = df["response_metadata"].fillna("{}")
+    df["parameters"] = df["parameters"].fillna("{}")
+    for header in high_risk_security_headers:
+        df[header] = NaN
+    df["metadata_fields_count"] = 0
+    df["parameters_count"] = 0
+
+    for i in range(len(df)):
+        meta_count = 0
+        sample_response_dict = eval(df['response_metadata'].iloc[i])
+        if df['response_metadata'].iloc[i] is not None:
+            sample_response_dict = eval(df['response_metadata'].iloc[i])
+            for key, value in sample_response_dict.items():
+                if key.lower() in high_risk_security_headers:
+                    df.loc[df.index[i], key.lower()] = value
+                    meta_count += 1
+        df.loc[df.index[i], "metadata_fields_count"] = meta_count
+        df.loc[df.index[i], "parameters_count"] = len(
+            eval(df['parameters'].iloc[i]))
+
+    for i in range(len(df)):
+        for key, value in recommend_dict.items():
+            if pd.notnull(df[key].iloc[i]):
+                df.loc[df.index[i], key] = 0 if value in df[key].iloc[i] else 1
+
+    for i in range(len(df)):
+        for field in should_not_be_present:
+            if not pd.isna(df[field].iloc[i]):
+                df.loc[df.index[i], field] = 1
+        for field in good_to_be_present:
+            if not pd.isna(df[field].iloc[i]):
+                df.loc[df.index[i], field] = 0
+
+    for header in high_risk_security_headers:
+        df[header] = df[header].fillna(0)
+
+    return df.drop_duplicates()
+
+
+def timed(function, df):
+    """
+    Runs a metadata extraction on a copy of the dataframe.
+    Parameters
+    ----------
+    function : function
+        The extraction function.
+    df : pandas.DataFrame
+        The endpoints.
+    Returns
+    -------
+    result : tuple
+        The elapsed seconds and the extracted dataframe.
+    """
+    df = df.copy()
+    start = time.perf_counter()
+    result = function(df)
+    return time.perf_counter() - start, result
+
+
+def main(data_path, sizes, legacy_rows):
+    source = read_artifact(data_path,
+                           columns=["response_metadata", "parameters"])
+    rows = []
+    for size in sizes:
+        df = source.sample(n=size, replace=True, random_state=42)
+        # unique ids so that the duplicated endpoints are not dropped
+        df["api_endpoint_id"] = range(size)
+        df = df.reset_index(drop=True)
+        clear_parser_cache()
+        new_time, new = timed(extract_metadata, df)
+        row = {"endpoints": size, "vectorized_s": round(new_time, 2),
+               "parser_hit_rate": round(parser_stats()["hit_rate"], 3)}
+        if size <= legacy_rows:
+            old_time, old = timed(previous_extract_metadata, df)
+            pd.testing.assert_frame_equal(new, old)
+            row.update(previous_s=round(old_time, 2),
+                       speedup=round(old_time / new_time, 1))
+        rows.append(row)
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == "__main__":
+    opt = docopt(__doc__)
+    main(opt["--data_path"], [int(size) for size in opt["--sizes"].split(",")],
+         int(opt["--legacy_rows"]))
@@ -0,0 +1,85 @@
+"""Benchmarks the format detection and parsing of the sample responses,
+before the NLP analysis, against the previous BeautifulSoup based detection.
+
+Usage: pii_parsing.py --data_path=<data_path> [--repeat=<repeat>]
+
+Options:
+--data_path=<data_path>     Path to a .parquet, .arrow or .xlsx file with a sample_response column
+--repeat=<repeat>           Number of runs, the best one is kept [default: 3]
+
+Example (from the src folder):
+python -m benchmarks.pii_parsing --data_path=../data/processed/pii_fii_all.parquet
+"""
+
+from bs4 import BeautifulSoup
+from docopt import docopt
+from utils.artifacts import read_artifact
+from utils.pii_extraction import _sniff_text
+import json
+import time
+import warnings
+
+
+def previous_parsing(text):
+    """
+    Detects and parses a text the way `pii_extraction` used to:
+    two BeautifulSoup parses, then a json validation and a json parse.
+    Parameters
+    ----------
+    text : str
+        The text to be parsed.
+    Returns
+    -------
+    content : object
+        The text of the html, the parsed json or the plain text.
+    """
+    if bool(BeautifulSoup(text, "html.parser").find()):
+        return BeautifulSoup(text, "html.parser").text
+    try:
+        json.loads(text)
+    except ValueError:
+        return text
+    return json.loads(text)
+
+
+def best_time(function, texts, repeat):
+    """
+    Times a parsing function over all the texts.
+    Parameters
+    ----------
+    function : function
+        The parsing function.
+    texts : list
+        The texts to be parsed.
+    repeat : int
+        The number of runs.
+    Returns
+    -------
+    seconds : float
+        The time of the fastest run.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            function(text)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(data_path, repeat):
+    warnings.filterwarnings("ignore")
+    texts = [str(text) for text in read_artifact(data_path, columns=["sample_response"])["sample_response"]]
+
+    previous = best_time(previous_parsing, texts, repeat)
+    current = best_time(_sniff_text, texts, repeat)
+    print(f"rows: {len(texts)}")
+    print(f"previous parsing: {previous * 1e6 / len(texts):.0f} us/row")
+    print(f"current parsing:  {current * 1e6 / len(texts):.0f} us/row")
+    print(f"saved:            {(previous - current) * 1e6 / len(texts):.0f} us/row "
+          f"({previous / current:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    opt = docopt(__doc__)
+    main(opt["--data_path"], int(opt["--repeat"]))
@@ -0,0 +1,77 @@
+"""Benchmarks the throughput and recall of the PII engine profiles.
+The recall of the is_pii and is_fii flags of each profile is measured
+against the flags of the accurate profile on the same responses, which
+is always run first.
+
+Usage: pii_profiles.py --data_path=<data_path> [--sample_size=<sample_size>] [--profiles=<profiles>]
+
+Options:
+--data_path=<data_path>         Path to a .parquet, .arrow or .xlsx file with a sample_response column
+--sample_size=<sample_size>     Number of responses to analyze [default: 500]
+--profiles=<profiles>           Comma separated profiles [default: accurate,fast,regex-only]
+
+Example (from the src folder):
+python -m benchmarks.pii_profiles --data_path=../data/processed/pii_fii_all.parquet
+"""
+
+from docopt import docopt
+from utils.artifacts import read_artifact
+from utils.pii_extraction import pii_fii_extraction_batch, get_analyzer, set_profile
+import pandas as pd
+import time
+
+
+def recall(predicted, reference):
+    """
+    Computes the recall of the predicted flags.
+    Parameters
+    ----------
+    predicted : list
+        The predicted flags.
+    reference : list
+        The reference flags.
+    Returns
+    -------
+    recall : float
+        The share of the positive references that are predicted.
+    """
+    positives = [p for p, r in zip(predicted, reference) if r]
+    return sum(positives) / len(positives) if positives else float("nan")
+
+
+def main(data_path, sample_size, profiles):
+    df = read_artifact(data_path, columns=["sample_response"])
+    df = df.sample(n=min(sample_size, len(df)), random_state=42)
+    texts = df["sample_response"].tolist()
+
+    rows = []
+    reference = None
+    for profile in ["accurate"] + [p for p in profiles if p != "accurate"]:
+        set_profile(profile)
+        start = time.perf_counter()
+        get_analyzer()
+        load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        flags = pii_fii_extraction_batch(texts, 0.5)
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference = flags
+        if profile not in profiles:
+            continue
+        rows.append({
+            "profile": profile,
+            "load_s": round(load_time, 2),
+            "rows_per_s": round(len(texts) / elapsed, 1),
+            "pii_recall": round(recall([f[0] for f in flags],
+                                       [f[0] for f in reference]), 3),
+            "fii_recall": round(recall([f[1] for f in flags],
+                                       [f[1] for f in reference]), 3),
+        })
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == "__main__":
+    opt = docopt(__doc__)
+    main(opt["--data_path"], int(opt["--sample_size"]),
+         opt["--profiles"].split(","))
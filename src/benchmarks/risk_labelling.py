@@ -0,0 +1,126 @@
+"""Benchmarks the hash index of the risk rules against the previous rule by
+rule scan of `classify_risk`, on synthetic rules and endpoints, and checks
+that the labels are identical. The previous version is only run on the
+first `legacy_rows` endpoints and its time is extrapolated to all of them.
+
+Usage: risk_labelling.py [--rows=<rows>] [--rules=<rules>] [--legacy_rows=<legacy_rows>]
+
+Options:
+--rows=<rows>                   Number of endpoints [default: 1000000]
+--rules=<rules>                 Number of rules [default: 10000]
+--legacy_rows=<legacy_rows>     Number of endpoints labelled with the previous version [default: 20]
+
+Example (from the src folder):
+python -m benchmarks.risk_labelling
+"""
+
+from docopt import docopt
+from utils.risk_labelling import RuleIndex
+import numpy as np
+import pandas as pd
+import time
+
+# the values of each column of the rules and endpoints, the rules also use
+# the wildcards and synthetic test categories to reach the number of rules
+domains = {
+    "authentication": ["No Authentication", "Some Authentication"],
+    "security_test_category": ["Injections", "Broken Authentication",
+                               "No Test Performed/Available", "Buffer Overflow",
+                               "XML External Enteties", "Cross-Site Scripting"],
+    "security_test_result": ["Fail", "Pass", "None"],
+    "server_location": ["Russia", "China", "Others", "West Europe", "Americas"],
+    "hosting_isp": ["Anyone"],
+    "PII": ["Yes", "No"],
+    "FII": ["Yes", "No"],
+}
+labels = ["Imminent", "High", "Medium", "Low"]
+
+
+def previous_classify_risk(row, rule_df):
+    """
+    Labels a row the way `classify_risk` used to: rule by rule.
+    Parameters
+    ----------
+    row : pandas.Series
+        A row of the endpoints.
+    rule_df : pandas.DataFrame
+        The risk rules.
+    Returns
+    -------
+    label : str
+        The risk label.
+    """
+    row = row.drop(labels=["api_endpoint_id"])
+    for i in range(len(rule_df)):
+        rule_copy = rule_df.iloc[i]
+        rule_copy = rule_copy.drop(["Risk_Label"])
+        if rule_copy['server_location'] == 'Anywhere':
+            rule_copy['server_location'] = row['server_location']
+        if rule_copy['security_test_category'] == 'All Tests Performed/Available':
+            rule_copy['security_test_category'] = row['security_test_category']
+        if row.equals(rule_copy):
+            return rule_df.iloc[i]["Risk_Label"]
+    return "Low"
+
+
+def synthetic_data(n_rows, n_rules):
+    """
+    Draws random rules and endpoints.
+    Parameters
+    ----------
+    n_rows : int
+        The number of endpoints.
+    n_rules : int
+        The number of rules.
+    Returns
+    -------
+    data : tuple
+        The endpoints and the rules dataframes.
+    """
+    rng = np.random.default_rng(42)
+    rule_domains = dict(domains)
+    rule_domains["security_test_category"] = (
+        domains["security_test_category"] + ["All Tests Performed/Available"] +
+        [f"Test {i}" for i in range(n_rules // 100)])
+    rule_domains["server_location"] = domains["server_location"] + ["Anywhere"]
+
+    rule_df = pd.DataFrame({column: rng.choice(values, n_rules)
+                            for column, values in rule_domains.items()},
+                           dtype="object")
+    rule_df["Risk_Label"] = rng.choice(labels, n_rules)
+    df = pd.DataFrame({column: rng.choice(values, n_rows)
+                       for column, values in domains.items()},
+                      dtype="object")
+    df.insert(0, "api_endpoint_id", np.arange(n_rows))
+    return df, rule_df
+
+
+def main(n_rows, n_rules, legacy_rows):
+    df, rule_df = synthetic_data(n_rows, n_rules)
+
+    start = time.perf_counter()
+    rule_index = RuleIndex(rule_df)
+    compile_time = time.perf_counter() - start
+    start = time.perf_counter()
+    new = rule_index.classify(df)
+    new_time = time.perf_counter() - start
+
+    sample = df.head(legacy_rows)
+    start = time.perf_counter()
+    old = sample.apply(previous_classify_risk, axis=1, args=(rule_df,))
+    old_time = (time.perf_counter() - start) * n_rows / len(sample)
+    assert old.tolist() == new[:legacy_rows]
+
+    print(pd.DataFrame([{
+        "endpoints": n_rows,
+        "rules": n_rules,
+        "compile_s": round(compile_time, 3),
+        "indexed_s": round(new_time, 2),
+        "previous_s (extrapolated)": round(old_time),
+        "speedup": round(old_time / new_time),
+    }]).to_string(index=False))
+
+
+if __name__ == "__main__":
+    opt = docopt(__doc__)
+    main(int(opt["--rows"]), int(opt["--rules"]), int(opt["--legacy_rows"]))
@@ -0,0 +1,135 @@
+"""Benchmarks the time and peak memory of `security_test_feat_creation`
+against the previous version, which ran a ColumnTransformer over every
+column, on a wide frame of endpoints resampled from a file with extra
+numeric columns. Checks that the values are identical and that the new
+version keeps the dtypes.
+
+Usage: security_test_feat_creation.py --data_path=<data_path> [--rows=<rows>] [--extra_columns=<extra_columns>]
+
+Options:
+--data_path=<data_path>             Path to a .parquet, .arrow or .xlsx file of endpoints with security_test_category and security_test_result columns
+--rows=<rows>                       Number of endpoints [default: 100000]
+--extra_columns=<extra_columns>     Number of numeric columns added to the endpoints [default: 50]
+
+Example (from the src folder):
+python -m benchmarks.security_test_feat_creation --data_path=../data/processed/pii_fii_all.parquet
+"""
+
+from docopt import docopt
+from sklearn.compose import make_column_transformer
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder
+from utils.artifacts import read_artifact
+from utils.security_test_feat_creation import security_test_feat_creation
+import numpy as np
+import pandas as pd
+import time
+import tracemalloc
+
+
+def previous_security_test_feat_creation(df):
+    """
+    Creates the security test features the way
+    `security_test_feat_creation` used to: through a ColumnTransformer
+    passing every other column through.
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The endpoints.
+    Returns
+    -------
+    transformed_df : pandas.DataFrame
+        The endpoints with the security test features.
+    """
+    df['security_test_category_processed'] = df['security_test_category']
+    df['security_test_result_processed'] = df['security_test_result']
+    categorical_features = ["security_test_category_processed"]
+    ordinal_features = ["security_test_result_processed"]
+    passthrough_features = [
+        feature for feature in df.columns
+        if feature not in ordinal_features + categorical_features
+    ]
+    categorical_transformer = make_pipeline(
+        SimpleImputer(strategy="constant", fill_value="Missing"),
+        OneHotEncoder(handle_unknown="ignore", sparse=False),
+    )
+    ordinal_transformer = make_pipeline(
+        SimpleImputer(strategy="constant", fill_value=0.5),
+        OrdinalEncoder(categories=[[0.0, 0.5, 1.0]], dtype=int)
+    )
+    preprocessor = make_column_transformer(
+        ("passthrough", passthrough_features),
+        (ordinal_transformer, ordinal_features),
+        (categorical_transformer, categorical_features),
+    )
+    preprocessor.fit(df)
+    transformed = preprocessor.transform(df)
+    ohe_features = list(preprocessor.named_transformers_['pipeline-2'].named_steps['onehotencoder'].get_feature_names())
+    feature_names = passthrough_features + ordinal_features + ohe_features
+    transformed_df = pd.DataFrame(transformed, columns=feature_names)
+    return transformed_df.drop_duplicates()
+
+
+def measured(function, df):
+    """
+    Runs a security test feature creation on copies of the dataframe,
+    once timed and once with its memory allocations traced.
+    Parameters
+    ----------
+    function : function
+        The feature creation function.
+    df : pandas.DataFrame
+        The endpoints.
+    Returns
+    -------
+    result : tuple
+        The elapsed seconds, the peak of allocated MB and the result.
+    """
+    copy = df.copy()
+    start = time.perf_counter()
+    result = function(copy)
+    elapsed = time.perf_counter() - start
+    del result
+
+    copy = df.copy()
+    tracemalloc.start()
+    result = function(copy)
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main(data_path, n_rows, extra_columns):
+    source = read_artifact(data_path)
+    df = source.sample(n=n_rows, replace=True, random_state=42)
+    df = df.reset_index(drop=True)
+    # unique ids so that the duplicated endpoints are not dropped
+    df["api_endpoint_id"] = range(n_rows)
+    rng = np.random.default_rng(42)
+    for i in range(extra_columns):
+        df[f"feature_{i}"] = rng.random(n_rows)
+    df = df.copy()
+
+    new_time, new_peak, new = measured(security_test_feat_creation, df)
+    old_time, old_peak, old = measured(previous_security_test_feat_creation, df)
+
+    assert new.columns.tolist() == old.columns.tolist()
+    pd.testing.assert_frame_equal(new.astype(object), old, check_dtype=False)
+    assert (new.dtypes[df.columns] == df.dtypes).all()
+
+    print(pd.DataFrame([{
+        "endpoints": n_rows,
+        "columns": len(df.columns),
+        "new_s": round(new_time, 3),
+        "previous_s": round(old_time, 3),
+        "new_peak_mb": round(new_peak, 1),
+        "previous_peak_mb": round(old_peak, 1),
+        "object_columns": (new.dtypes == object).sum(),
+        "previous_object_columns": (old.dtypes == object).sum(),
+    }]).to_string(index=False))
+
+
+if __name__ == "__main__":
+    opt = docopt(__doc__)
+    main(opt["--data_path"], int(opt["--rows"]), int(opt["--extra_columns"]))
@@ -2,19 +2,20 @@
 This script trains ML model on the pre-processed train data.
 The train files must be named X_train.csv and y_train.csv
 
-Usage: create_model.py --train_path=<train_path> --create_save_path=<create_save_path>
+Usage: create_model.py --train_path=<train_path> --create_save_path=<create_save_path> [--featurizer_path=<featurizer_path>]
 
 Options:
---train_path=<train_path>                         The path to the training csv files.
+--train_path=<train_path>                         The path to the training file: .parquet, .arrow or .xlsx
 --create_save_path=<create_save_path>             The folder to save the model results to
+--featurizer_path=<featurizer_path>               The featurizer fitted by preprocessing, saved next to the model, featurizer.joblib next to the train file by default
 
 Example:
-python src/create_model.py --train_path=data/processed/preprocessed_train.xlsx --create_save_path=models/
+python src/create_model.py --train_path=data/processed/preprocessed_train.parquet --create_save_path=models/
 """
 
 from docopt import docopt
 from pathlib import Path
-import pandas as pd
+import shutil
 from joblib import dump
 from sklearn.linear_model import LogisticRegression
 from sklearn.preprocessing import StandardScaler
@@ -22,6 +23,8 @@ from sklearn.pipeline import make_pipeline
 from imblearn.over_sampling import SMOTE
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.feature_selection import RFE
+from utils.artifacts import read_artifact
+from utils.featurizer import featurizer_file
 
 opt = docopt(__doc__)
 
@@ -80,15 +83,18 @@ def get_features_selection(X_train, y_train):
     return feature_list
 
 
-def main(train_path, create_save_path):
+def main(train_path, create_save_path, featurizer_path=None):
     '''
-    This function trains the model and saves it to the given path.
+    This function trains the model and saves it to the given path,
+    with the featurizer of the training data.
     Parameters
     -----------
     train_path : string
         The path to the training csv files.
     create_save_path : string
         The path to the save the model.
+    featurizer_path : string
+        The path to the featurizer fitted by preprocessing.
 
     Returns
     -----------
@@ -101,7 +107,7 @@ def main(train_path, create_save_path):
     #############
     # READ DATA #
     #############
-    api_df = pd.read_excel(train_path)
+    api_df = read_artifact(train_path)
 
     # X, y split for train-set
     X_train, y_train = api_df.drop(columns=["Risk_Label"]), api_df["Risk_Label"]
@@ -122,6 +128,16 @@ def main(train_path, create_save_path):
     dump(pipe_lr_tuned, f"{path}/model.joblib")
     print(f'Model saved to {path}/model.joblib')
 
+    # Save the featurizer of the training data with the model
+    if featurizer_path is None:
+        featurizer_path = Path(train_path).parent / featurizer_file
+        if not featurizer_path.exists():
+            print(f'No featurizer found at {featurizer_path}')
+            return
+    shutil.copyfile(featurizer_path, path / featurizer_file)
+    print(f'Featurizer saved to {path}/{featurizer_file}')
+
 
 if __name__ == "__main__":
-    main(opt["--train_path"], opt["--create_save_path"])
+    main(opt["--train_path"], opt["--create_save_path"],
+         opt["--featurizer_path"])
@@ -2,20 +2,29 @@
 This script trains ML model on the pre-processed train data. 
 The train files must be named X_train.csv and y_train.csv
 
-Usage: predict.py --model_path=<model_path> --predict_path=<predict_path --predict_save_path=<predict_save_path>
+Usage: predict.py --model_path=<model_path> --predict_path=<predict_path> --predict_save_path=<predict_save_path> [--featurize] [--format=<format>] [--export_excel]
 
 Options:
 --model_path=<model_path>                           The path to the model
---predict_path=<predict_path>                       The path to the predict csv files.
+--predict_path=<predict_path>                       The path to the predict file: .parquet, .arrow or .xlsx, or the raw endpoint workbook with --featurize
 --predict_save_path=<predict_save_path>             The folder to save the results to
+--featurize                                         Featurize the raw endpoints of the predict_path workbook with the featurizer saved next to the model
+--format=<format>                                   Format of the predictions: parquet, arrow or excel [default: parquet]
+--export_excel                                      Also export the predictions to a .xlsx file
 
 Example:
-python src/predict.py --model_path=models/model.joblib --predict_path=data/processed/preprocessed_test.xlsx --predict_save_path=data/processed/
+python src/predict.py --model_path=models/model.joblib --predict_path=data/processed/preprocessed_test.parquet --predict_save_path=data/processed/
 """
 
 from docopt import docopt
 import pandas as pd
 from joblib import load
+from pathlib import Path
+from utils.artifacts import artifact_path, read_artifact, write_artifact
+from utils.endpoint_reader import read_endpoints
+from utils.featurizer import featurizer_file
+from utils.metadata_extraction import extract_metadata
+from utils.pii_extraction import pii_fii_extraction_batch
 
 opt = docopt(__doc__)
 
@@ -44,7 +53,36 @@ def get_features_selection():
     return features
 
 
-def main(model_path, predict_path, predict_save_path):
+def featurize(predict_df, featurizer_path):
+    '''
+    This function adds the features of raw endpoints, with the featurizer
+    fitted on the training data, so that the columns match the training
+    data. The PII and FII flags are extracted if they are missing.
+    Parameters
+    -----------
+    predict_df : pandas.DataFrame
+        The endpoints to predict.
+    featurizer_path : string
+        The path to the .joblib file containing the featurizer.
+
+    Returns
+    -----------
+    featurized_df : pandas.DataFrame
+        The endpoints with their features.
+    '''
+    featurizer = load(featurizer_path)
+    if "is_pii" not in predict_df.columns:
+        flags = pd.DataFrame(
+            pii_fii_extraction_batch(predict_df["sample_response"]),
+            index=predict_df.index)
+        predict_df["is_pii"] = flags["is_pii"]
+        predict_df["is_fii"] = flags["is_fii"]
+    predict_df = featurizer.transform(predict_df)
+    return extract_metadata(predict_df)
+
+
+def main(model_path, predict_path, predict_save_path, featurize_data=False,
+         artifact_format="parquet", export_excel=False):
     '''
     This function loads the model and performs predictions on the test data.
     Parameters
@@ -52,18 +90,33 @@ def main(model_path, predict_path, predict_save_path):
     model_path : string
         The path to the .joblib file containing the model.
     predict_path : string
-        The path to the predict csv files.
+        The path to the predict file, or to the raw endpoint workbook
+        if `featurize_data`.
     predict_save_path : string
         The folder to save the results to
+    featurize_data : bool
+        Whether to featurize the raw endpoints with the featurizer
+        saved next to the model.
+    artifact_format : string
+        The format of the predictions: parquet, arrow or excel.
+    export_excel : bool
+        Whether to also export the predictions to a .xlsx file.
 
     Returns
     -----------
     None
     '''
     pipe_lr_tuned = load_model(model_path)
-    predict_df = pd.read_excel(predict_path)
-    X_test, y_test = predict_df.drop(
-        columns=["Risk_Label"]), predict_df["Risk_Label"]
+    if featurize_data:
+        # the Core_Endpoint sheet of the raw workbook, read like in
+        # preprocessing
+        predict_df = read_endpoints(predict_path)
+        print('Featurizing the endpoints...')
+        predict_df = featurize(predict_df,
+                               Path(model_path).parent / featurizer_file)
+    else:
+        predict_df = read_artifact(predict_path)
+    X_test = predict_df.drop(columns=["Risk_Label"], errors="ignore")
 
     select_features = get_features_selection()
     X_select = X_test[select_features]
@@ -73,10 +126,16 @@ def main(model_path, predict_path, predict_save_path):
     predict_df['Risk_Label'] = y_pred
 
     # save the test data with the predicted labels
-    predict_df.to_excel(predict_save_path + 'df_predicted.xlsx', index=False)
-    print(f'Test data saved to {predict_save_path}df_predicted.xlsx')
+    formats = [artifact_format]
+    if export_excel and artifact_format != "excel":
+        formats.append("excel")
+    for format in formats:
+        path = artifact_path(predict_save_path, 'df_predicted', format)
+        write_artifact(predict_df, path)
+        print(f'Test data saved to {path}')
 
 
 if __name__ == "__main__":
     main(opt["--model_path"], opt["--predict_path"],
-         opt["--predict_save_path"])
+         opt["--predict_save_path"], opt["--featurize"], opt["--format"],
+         opt["--export_excel"])
@@ -1,5 +1,5 @@
 """Reads train csv data from path, preprocess the data, and save the preprocessed data to path.
-Usage: preprocessing.py --endpoint_path=<endpoint_path> --country_path=<country_path> --risk_rules_path=<risk_rules_path> --output_path=<output_path> --split_data=<split_data>
+Usage: preprocessing.py --endpoint_path=<endpoint_path> --country_path=<country_path> --risk_rules_path=<risk_rules_path> --output_path=<output_path> --split_data=<split_data> [--n_workers=<n_workers>] [--profile=<profile>] [--sample_size=<sample_size>] [--max_bytes=<max_bytes>] [--schema_inference] [--conf_threshold=<conf_threshold>] [--entities=<entities>] [--header_rules_path=<header_rules_path>] [--format=<format>] [--export_excel] [--chunk_size=<chunk_size>]
  
 Options:
 --endpoint_path=<endpoint_path>       Path to input data
@@ -7,6 +7,17 @@ Options:
 --risk_rules_path=<risk_rules_path>   Path to risk rules
 --output_path=<output_path>           Path for preprocessed file to be saved
 --split_data=<split_data>             Whether to split data into train and test
+--n_workers=<n_workers>               Number of processes for the PII extraction [default: 1]
+--profile=<profile>                   PII engine profile: accurate, fast or regex-only [default: accurate]
+--sample_size=<sample_size>           Records analyzed per json array of records with the same keys, 0 for all [default: 0]
+--max_bytes=<max_bytes>               Bytes analyzed per response, 0 for all [default: 0]
+--schema_inference                    Infer the PII flags from the json key names and reuse them across responses of an api with the same keys
+--conf_threshold=<conf_threshold>     Confidence threshold of the PII and FII flags [default: 0.5]
+--entities=<entities>                 Comma separated entities taken into account by the flags, all by default, not with --schema_inference
+--header_rules_path=<header_rules_path>  Path to the security header rules, config/header_rules.csv by default
+--format=<format>                     Format of the pii_fii and preprocessed files: parquet, arrow or excel [default: parquet]
+--export_excel                        Also export the preprocessed data to .xlsx files
+--chunk_size=<chunk_size>             Endpoints per chunk to preprocess the data out of core, 0 to preprocess it in memory [default: 0]
 
 Example:
 python src/preprocessing.py --endpoint_path=data/raw/RiskClassification_Data_Endpoints_V4_Shared1.xlsx --country_path=data/raw/nri_2021_dataset.xlsx --risk_rules_path=data/raw/RiskRules.xlsx --output_path=data/processed/ --split_data=True
@@ -14,88 +25,262 @@ python src/preprocessing.py --endpoint_path=data/raw/RiskClassification_Data_End
 
 from docopt import docopt
 from sklearn.model_selection import train_test_split
-from utils.country_n_cat_featuring import add_country_and_cat_feats
-from utils.metadata_extraction import extract_metadata
-from utils.pii_extraction import pii_extraction
+from utils.artifacts import artifact_path, concat_artifacts, unified_dtypes, write_artifact
+from utils.endpoint_reader import read_endpoint_chunks, read_endpoints
+from utils.featurizer import Featurizer, featurizer_file
+from utils.literal_parser import parser_stats
+from utils.metadata_extraction import extract_metadata, load_header_rules
+from utils.metadata_extraction import header_rules_path as default_header_rules_path
+from utils.pii_cache import PiiCache
+from utils.pii_extraction import analyzer_version, pii_fii_extraction_batch, pii_scores_batch, rethreshold, set_profile
 from utils.risk_labelling import create_risk_label
-from utils.security_test_feat_creation import security_test_feat_creation
+from utils.stage_runner import Stage, file_hash, run_stages
+from functools import partial
+import numpy as np
 import pandas as pd
+from joblib import dump
 from pathlib import Path
+import shutil
 
 opt = docopt(__doc__)
 
 
-def preprocessing(df, name, output_path, risk_rules_path, country_path):
+def extract_pii_scores(df, output_path, pii_params):
+    '''
+    Extract the highest score of each PII and FII entity of the
+    sample responses
+    '''
+    # WARNING: This function takes 30+ mins to run on responses
+    # that were never analyzed, the others are read from the cache
+    print("Extracting PII and FII scores...")
+    with PiiCache(output_path + "/pii_cache.sqlite") as cache:
+        scores = pii_scores_batch(df["sample_response"], cache=cache,
+                                  **pii_params)
+        stats = cache.stats()
+    print(f"PII cache: {stats['hits']} hits, {stats['misses']} misses, "
+          f"{stats['entries']} entries")
+    scores.index = df.index
+    return scores
+
+
+def add_pii_features(df, scores, conf_threshold=0.5, entities=None):
+    '''
+    Add the PII and FII flags of the sample responses, derived from
+    their scores with the threshold and the entities
+    '''
+    flags = rethreshold(scores, conf_threshold, entities)
+    print(f"{scores['sampled'].sum()} responses were sampled")
+    df["is_pii"] = flags["is_pii"]
+    df["is_fii"] = flags["is_fii"]
+    return df
+
+
+def add_schema_pii_features(df, output_path, pii_params):
+    '''
+    Extract the PII and FII flags of the sample responses with the per
+    api json schema cache of `pii_fii_extraction_batch`
+    '''
+    print("Extracting PII and FII features...")
+    with PiiCache(output_path + "/pii_cache.sqlite") as cache:
+        # The schema flags only exist for the given threshold
+        flags = pii_fii_extraction_batch(df["sample_response"],
+                                         early_exit=True, cache=cache,
+                                         api_ids=df["api_id"],
+                                         schema_cache=cache, **pii_params)
+        stats = cache.stats()
+    print(f"PII cache: {stats['hits']} hits, {stats['misses']} misses, "
+          f"{stats['entries']} entries")
+    flags = pd.DataFrame(flags, index=df.index)
+    print(f"{flags['sampled'].sum()} responses were sampled")
+    df["is_pii"] = flags["is_pii"]
+    df["is_fii"] = flags["is_fii"]
+    return df
+
+
+def add_metadata_features(df, header_rules_path=None):
+    '''
+    Add the security header and count features of the metadata
     '''
-    Preprocess the data:
-    1. Extract PII and FII
-    2. Add country features and category features
-    3. Add security test features
-    4. Add metadata features
-    5. Add risk label
-    '''
-
-    ########################
-    # ADD PII FII FEATURES #
-    ########################
-    # WARNING: This function takes 30+ mins to run
-    # so consider reading it from the processed file
-    path_to_pii = output_path + "/pii_fii_" + name + ".xlsx"
-    pii_path = Path(path_to_pii)
-    if not pii_path.is_file():    # delete the file if you want to run it again
-        print("Extracting PII and FII features. This will take a while...")
-        df["is_pii"] = df["sample_response"].swifter.apply(
-            pii_extraction, args=("pii", 0.5,)).astype(bool)
-        df["is_fii"] = df["sample_response"].swifter.apply(
-            pii_extraction, args=("fii", 0.5,)).astype(bool)
-        # save df with pii and fii
-        df.to_excel(path_to_pii, index=False)
-    else:
-        df = pd.read_excel(path_to_pii)
-
-    #############################################
-    # ADD COUNTRY SCORE AND CATEGORIES FEATURES #
-    #############################################
-    print('Adding country score and OHE categories features...')
-    df = add_country_and_cat_feats(df, country_path)
-
-    ##############################
-    # ADD SECURITY TEST FEATURES #
-    ##############################
-    print('Adding security test features...')
-    df = security_test_feat_creation(df)
-
-    #########################
-    # ADD METADATA FEATURES #
-    #########################
     print('Adding metadata features...')
-    df = extract_metadata(df)
+    header_rules = None
+    if header_rules_path is not None:
+        header_rules = load_header_rules(header_rules_path)
+    df = extract_metadata(df, header_rules)
+    stats = parser_stats()
+    print(f"Metadata parser: {stats['hit_rate']:.1%} hit rate, "
+          f"{stats['entries']} distinct strings")
+    return df
 
-    ###################
-    # ADD RISK LABELS #
-    ###################
+
+def add_risk_labels(df, risk_rules_path, snapshot_path=None):
+    '''
+    Add the risk label of the endpoints, and drop the duplicates
+
+    With `snapshot_path`, only the endpoints affected by the changes of
+    the rules or of the endpoints since the previous labelling are
+    relabelled
+    '''
     print('Adding risk labels...')
-    df = create_risk_label(df, risk_rules_path)
+    df = create_risk_label(df, risk_rules_path, snapshot_path=snapshot_path)
     # drop duplicates
-    df = df.drop_duplicates()
+    return df.drop_duplicates()
 
-    return df
+
+def part_path(output_path, artifact, part):
+    '''
+    Path of a part of an artifact in the chunked mode,
+    in output_path/parts/artifact
+    '''
+    folder = Path(output_path) / "parts" / artifact
+    folder.mkdir(parents=True, exist_ok=True)
+    return artifact_path(str(folder), f"part-{part:05d}")
 
 
-def save_preprocessed_data(df, name, country_path, risk_rules_path, output_path):
+def preprocessing(df, name, output_path, risk_rules_path, country_path,
+                  pii_params=None, header_rules_path=None, featurizer=None,
+                  artifact_format="parquet", part=None):
+    '''
+    Preprocess the data:
+    1. Extract PII and FII
+    2. Add country, category and security test features
+    3. Add metadata features
+    4. Add risk label
+
+    The steps are stages of `run_stages`, whose outputs are cached in
+    output_path/stage_cache/name. A stage is only recomputed when its
+    input, its parameters or its version change, like the risk labels
+    after an edit of the risk rules, and the cache hits are reported.
+
+    `pii_params` are passed to `pii_scores_batch` (n_workers,
+    sample_size, max_bytes...). The scores are the output of a stage,
+    saved in a side table, and the flags are derived from them with
+    `conf_threshold` and `entities` by the next stage, so a rerun with
+    another threshold or subset of the entities reads the scores from
+    the cache instead of analyzing the responses. `schema_inference`
+    rather extracts the flags with the per api json schema cache of
+    `pii_fii_extraction_batch`, for all the entities
+
+    `header_rules_path` is the security header rules table
+    of `extract_metadata`
+
+    `featurizer` is the `Featurizer` fitted on the training data,
+    by default it is fitted on `df`
+
+    The data with the PII and FII flags is saved to output_path in
+    `artifact_format`: parquet, arrow or excel
+
+    `part` is the number of the chunk of `df` in the chunked mode: its
+    stages are cached in stage_cache/name/part-<part>, its PII scores
+    are a part of the pii_scores_name folder and its data with the
+    PII and FII flags is saved as a part to be concatenated
+    '''
+    pii_params = dict(pii_params or {})
+    schema_inference = pii_params.pop("schema_inference", False)
+    conf_threshold = pii_params.pop("conf_threshold", 0.5)
+    entities = pii_params.pop("entities", None)
+    if schema_inference and entities is not None:
+        raise ValueError("`entities` cannot be used with `schema_inference`")
+    if part is None:
+        cache_dir = output_path + "/stage_cache/" + name
+        scores_path = output_path + "/pii_scores_" + name + ".parquet"
+        pii_fii_path = artifact_path(output_path, "pii_fii_" + name,
+                                     artifact_format)
+    else:
+        cache_dir = output_path + "/stage_cache/" + name + f"/part-{part:05d}"
+        scores_path = artifact_path(output_path + "/pii_scores_" + name,
+                                    f"part-{part:05d}")
+        pii_fii_path = part_path(output_path, "pii_fii_" + name, part)
+    if featurizer is None:
+        featurizer = Featurizer(country_path).fit(df)
+    # the number of workers does not change the scores and flags
+    pii_key_params = {key: value for key, value in pii_params.items()
+                      if key != "n_workers"}
+
+    if schema_inference:
+        stages = [
+            Stage("pii",
+                  partial(add_schema_pii_features, output_path=output_path,
+                          pii_params=dict(pii_params,
+                                          conf_threshold=conf_threshold)),
+                  ["endpoints"],
+                  {"pii_params": sorted(pii_key_params.items()),
+                   "conf_threshold": conf_threshold,
+                   "analyzer": analyzer_version()},
+                  2),
+        ]
+    else:
+        stages = [
+            Stage("pii_scores",
+                  partial(extract_pii_scores, output_path=output_path,
+                          pii_params=pii_params),
+                  ["endpoints"],
+                  {"pii_params": sorted(pii_key_params.items()),
+                   "analyzer": analyzer_version()},
+                  1),
+            Stage("pii",
+                  partial(add_pii_features, conf_threshold=conf_threshold,
+                          entities=entities),
+                  ["endpoints", "pii_scores"],
+                  {"conf_threshold": conf_threshold,
+                   "entities": sorted(entities) if entities else None},
+                  2),
+        ]
+    stages += [
+        # country score, OHE categories and security test features
+        Stage("features", featurizer.transform, ["pii"],
+              {"featurizer": featurizer.fingerprint()}, 2),
+        Stage("metadata",
+              partial(add_metadata_features,
+                      header_rules_path=header_rules_path),
+              ["features"],
+              {"header_rules": file_hash(header_rules_path or
+                                         default_header_rules_path)},
+              1),
+        Stage("risk_labels",
+              partial(add_risk_labels, risk_rules_path=risk_rules_path,
+                      snapshot_path=cache_dir + "/risk_snapshot.pkl"),
+              ["metadata"],
+              {"risk_rules": file_hash(risk_rules_path)},
+              1),
+    ]
+    targets = ["pii", "risk_labels"]
+    if not schema_inference:
+        targets.append("pii_scores")
+    outputs, report = run_stages(stages, {"endpoints": df}, cache_dir,
+                                 targets=targets)
+    # save df with pii and fii
+    write_artifact(outputs["pii"], pii_fii_path)
+    if schema_inference:
+        # the scores of a previous run are not those of the flags
+        Path(scores_path).unlink(missing_ok=True)
+    else:
+        # save the scores to derive the flags for other thresholds
+        Path(scores_path).parent.mkdir(parents=True, exist_ok=True)
+        outputs["pii_scores"].to_parquet(scores_path)
+    if part is not None:
+        name = f"{name} part {part}"
+    print(f"Stages of {name}: " + ", ".join(
+        f"{stage} {status}" for stage, status
+        in zip(report["stage"], report["status"])))
+    return outputs["risk_labels"]
+
+
+def save_preprocessed_data(df, name, country_path, risk_rules_path, output_path,
+                           pii_params=None, header_rules_path=None,
+                           featurizer=None, artifact_format="parquet",
+                           export_excel=False, part=None):
     '''
     Save the preprocessed data:
     1. Run preprocessing function
     2. Drop columns that are not needed
-    3. Save the data to output_path
+    3. Save the data to output_path in `artifact_format`,
+       and to a .xlsx file if `export_excel`, or as a part of the
+       preprocessed data in the chunked mode
     '''
 
     processed_df = preprocessing(
-        df, name, output_path, risk_rules_path, country_path)
-    processed_df.to_excel(output_path +
-                          "/preprocessed_" +
-                          name +
-                          ".xlsx", index=False)
+        df, name, output_path, risk_rules_path, country_path, pii_params,
+        header_rules_path, featurizer, artifact_format, part)
     columns_to_drop = [
         "api_endpoint_id",
         "api_id",
@@ -118,31 +303,148 @@ def save_preprocessed_data(df, name, country_path, risk_rules_path, output_path)
         "Country",
     ]
     processed_df.drop(columns=columns_to_drop, inplace=True)
-    processed_df.to_excel(output_path +
-                          "/preprocessed_" +
-                          name +
-                          ".xlsx", index=False)
+    if part is not None:
+        write_artifact(processed_df, part_path(
+            output_path, "preprocessed_" + name, part))
+        return
+    write_artifact(processed_df, artifact_path(
+        output_path, "preprocessed_" + name, artifact_format))
+    if export_excel and artifact_format != "excel":
+        write_artifact(processed_df, artifact_path(
+            output_path, "preprocessed_" + name, "excel"))
+
+
+def split_rows(chunks, split_data):
+    '''
+    First pass of the chunked mode: find the rows of the endpoints that
+    are not duplicated, from a hash of each row, and split them into
+    train and test like `train_test_split` splits the data in memory.
+    Only the row and hash of each endpoint are kept, 16 bytes.
+    '''
+    rows = []
+    hashes = []
+    for chunk in chunks:
+        rows.append(chunk.index.to_numpy())
+        hashes.append(pd.util.hash_pandas_object(chunk, index=False).to_numpy())
+    rows = np.concatenate(rows)
+    hashes = np.concatenate(hashes)
+    # keep the first endpoint of each hash, like drop_duplicates
+    _, first = np.unique(hashes, return_index=True)
+    rows = rows[np.sort(first)]
+    if split_data.lower() == "true":
+        train, test = train_test_split(rows, test_size=0.3, random_state=42)
+        return {"train": np.sort(train), "test": np.sort(test)}
+    return {"all": rows}
+
+
+def chunked_preprocessing(endpoint_path, country_path, risk_rules_path,
+                          output_path, split_data, chunk_size,
+                          pii_params=None, header_rules_path=None,
+                          artifact_format="parquet", export_excel=False):
+    '''
+    Preprocess the data out of core, with a chunk of `chunk_size`
+    endpoints in memory at a time:
+    1. Find the dtypes of the columns over all the chunks
+    2. Drop the duplicates and split the data, with `split_rows`
+    3. Fit the featurizer on the training chunks: the NRI score mean
+       and the vocabularies are the only global statistics
+    4. Preprocess each chunk of each split and save it as a part
+    5. Concatenate the parts into the pii_fii and preprocessed files
+
+    The chunks are streamed from the columnar copy of the workbook,
+    so each pass is cheap once it is converted. The splits have the
+    same endpoints as in memory, in the order of the workbook.
+    '''
+    def chunks():
+        for chunk in read_endpoint_chunks(endpoint_path, chunk_size):
+            yield chunk.astype(dtypes)
+
+    dtypes = unified_dtypes(read_endpoint_chunks(endpoint_path, chunk_size))
+    splits = split_rows(chunks(), split_data)
+
+    # The featurizer is fitted on the training data only, and saved
+    # to be used with the model
+    fit_rows = splits["train" if "train" in splits else "all"]
+    featurizer = Featurizer(country_path)
+    for chunk in chunks():
+        chunk = chunk[chunk.index.isin(fit_rows)]
+        if len(chunk):
+            featurizer.partial_fit(chunk)
+    dump(featurizer, output_path + "/" + featurizer_file)
+
+    parts = {name: 0 for name in splits}
+    for chunk in chunks():
+        for name, rows in splits.items():
+            split_chunk = chunk[chunk.index.isin(rows)].copy()
+            if len(split_chunk):
+                save_preprocessed_data(split_chunk, name, country_path,
+                                       risk_rules_path, output_path,
+                                       pii_params, header_rules_path,
+                                       featurizer, artifact_format,
+                                       part=parts[name])
+                parts[name] += 1
+
+    for name, count in parts.items():
+        for artifact in ["pii_fii_" + name, "preprocessed_" + name]:
+            part_paths = [part_path(output_path, artifact, part)
+                          for part in range(count)]
+            concat_artifacts(part_paths, artifact_path(
+                output_path, artifact, artifact_format))
+            if artifact.startswith("preprocessed_") and export_excel and \
+                    artifact_format != "excel":
+                concat_artifacts(part_paths, artifact_path(
+                    output_path, artifact, "excel"))
+        # the scores of the parts of a previous run with more chunks
+        for scores_path in (Path(output_path) /
+                            ("pii_scores_" + name)).glob("part-*.parquet"):
+            if int(scores_path.stem.split("-")[1]) >= count:
+                scores_path.unlink()
+    shutil.rmtree(Path(output_path) / "parts")
 
 
 def main(endpoint_path,
          country_path,
          risk_rules_path,
          output_path,
-         split_data):
+         split_data,
+         n_workers=1,
+         profile="accurate",
+         sample_size=None,
+         max_bytes=None,
+         schema_inference=False,
+         conf_threshold=0.5,
+         entities=None,
+         header_rules_path=None,
+         artifact_format="parquet",
+         export_excel=False,
+         chunk_size=0):
+    # the schema flags are for all the entities
+    if schema_inference and entities:
+        raise ValueError("`--entities` cannot be used with `--schema_inference`")
     path = Path(output_path)
     path.mkdir(parents=True, exist_ok=True)
+    set_profile(profile)
+    pii_params = {"n_workers": n_workers,
+                  "sample_size": sample_size,
+                  "max_bytes": max_bytes,
+                  "schema_inference": schema_inference,
+                  "conf_threshold": conf_threshold,
+                  "entities": entities}
+
+    # The data larger than memory is preprocessed chunk by chunk
+    if chunk_size:
+        chunked_preprocessing(endpoint_path, country_path, risk_rules_path,
+                              output_path, split_data, chunk_size,
+                              pii_params, header_rules_path, artifact_format,
+                              export_excel)
+        return
 
     #####################
     # STEP 1: READ DATA #
     #####################
-    df = pd.read_excel(endpoint_path, "Core_Endpoint", usecols="A:S")
-    df.rename(
-        columns={
-            "security_test_result (FALSE=Passed; TRUE=Failed)":
-            "security_test_result"
-        },
-        inplace=True,
-    )
+    # The workbook is streamed once into a columnar copy next to it,
+    # which is read instead while the workbook is unchanged
+    df = read_endpoints(endpoint_path)
     orignial_df = df.drop_duplicates()
     # make a copy of the dataframe
     df = orignial_df.copy()
@@ -150,18 +452,35 @@ def main(endpoint_path,
     ################################
     # STEP 2: SPLIT TRAIN AND TEST #
     ################################
+    # The featurizer is fitted on the training data only, and saved
+    # to be used with the model
     if split_data.lower() == "true":
         train, test = train_test_split(df, test_size=0.3, random_state=42)
+        featurizer = Featurizer(country_path).fit(train)
+        dump(featurizer, output_path + "/" + featurizer_file)
         save_preprocessed_data(train, "train", country_path,
-                               risk_rules_path, output_path)
+                               risk_rules_path, output_path, pii_params,
+                               header_rules_path, featurizer, artifact_format,
+                               export_excel)
         save_preprocessed_data(test, "test", country_path,
-                               risk_rules_path, output_path)
+                               risk_rules_path, output_path, pii_params,
+                               header_rules_path, featurizer, artifact_format,
+                               export_excel)
     else:
+        featurizer = Featurizer(country_path).fit(df)
+        dump(featurizer, output_path + "/" + featurizer_file)
         save_preprocessed_data(df, "all", country_path,
-                               risk_rules_path, output_path)
+                               risk_rules_path, output_path, pii_params,
+                               header_rules_path, featurizer, artifact_format,
+                               export_excel)
 
 
 if __name__ == "__main__":
     main(opt["--endpoint_path"], opt["--country_path"],
          opt["--risk_rules_path"], opt["--output_path"],
-         opt["--split_data"])
\ No newline at end of file
+         opt["--split_data"], int(opt["--n_workers"]), opt["--profile"],
+         int(opt["--sample_size"]) or None, int(opt["--max_bytes"]) or None,
+         opt["--schema_inference"], float(opt["--conf_threshold"]),
+         opt["--entities"].split(",") if opt["--entities"] else None,
+         opt["--header_rules_path"], opt["--format"], opt["--export_excel"],
+         int(opt["--chunk_size"]))
\ No newline at end of file
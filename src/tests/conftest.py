@@ -0,0 +1,19 @@
+import pandas as pd
+from pytest import fixture
+
+
+@fixture
+def country_workbook(tmp_path):
+    # Writes the NRI scores of the countries to tmp_path/nri.xlsx,
+    # and returns its path
+    def write(scores):
+        path = str(tmp_path / "nri.xlsx")
+        # The NRI sheet has a title row, and the countries in columns B:C
+        table = pd.DataFrame({"Rank": range(1, len(scores) + 1),
+                              "Country": list(scores),
+                              "NRI score": list(scores.values())})
+        with pd.ExcelWriter(path) as writer:
+            table.to_excel(writer, "NRI 2021 - results", startrow=1,
+                           index=False)
+        return path
+    return write
@@ -0,0 +1,72 @@
+from utils.artifacts import (artifact_path, concat_artifacts, read_artifact,
+                             unified_dtypes, write_artifact)
+from numpy import NaN
+import pandas as pd
+from pytest import raises
+
+
+def test_wrong_parameters(tmp_path):
+    with raises(TypeError):
+        write_artifact("raw_text", str(tmp_path / "df.parquet"))
+
+    with raises(TypeError):
+        read_artifact(None)
+
+    # The format is given by the extension
+    with raises(ValueError):
+        write_artifact(pd.DataFrame({"a": [1]}), str(tmp_path / "df.json"))
+
+    with raises(ValueError):
+        artifact_path(str(tmp_path), "df", "csv")
+
+    with raises(TypeError):
+        concat_artifacts([], str(tmp_path / "df.parquet"))
+
+    with raises(TypeError):
+        unified_dtypes(["raw_text"])
+
+
+def test_artifacts(tmp_path):
+    df = pd.DataFrame({
+        "is_pii": [True, False, True],
+        "NRI score": [50.0, NaN, 70.5],
+        "count": [1, 2, 3],
+        "category": ["News & Media", NaN, "Finance & Banking"],
+        # an Excel text column with a cell typed as a number
+        "sample_response": ['{"a": 1}', 123, NaN],
+    }, index=[5, 3, 9])
+
+    for format in ["parquet", "arrow", "excel"]:
+        path = artifact_path(str(tmp_path), "preprocessed", format)
+        write_artifact(df, path)
+        expected = df.reset_index(drop=True)
+        if format != "excel":
+            expected["sample_response"] = ['{"a": 1}', "123", NaN]
+        pd.testing.assert_frame_equal(read_artifact(path), expected,
+                                      check_dtype=format != "excel")
+        assert read_artifact(path, ["count"]).columns.tolist() == ["count"]
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "preprocessed.arrow", "preprocessed.parquet", "preprocessed.xlsx"]
+
+
+def test_concat_artifacts(tmp_path):
+    # The parts are typed on their own, like the chunks of a workbook
+    parts = [pd.DataFrame({"result": [False, True], "count": [1, 2],
+                           "city": [NaN, NaN]}),
+             pd.DataFrame({"result": [NaN, 1.0], "count": [3, 4],
+                           "city": ["Paris", 123]})]
+    assert unified_dtypes(parts) == {"result": "float64", "count": "int64",
+                                     "city": object}
+
+    part_paths = []
+    for i, part in enumerate(parts):
+        part_paths.append(str(tmp_path / f"part-{i}.parquet"))
+        write_artifact(part, part_paths[-1])
+    expected = pd.DataFrame({"result": [0.0, 1.0, NaN, 1.0],
+                             "count": [1, 2, 3, 4],
+                             "city": [NaN, NaN, "Paris", "123"]})
+    for format in ["parquet", "arrow", "excel"]:
+        path = artifact_path(str(tmp_path), "concatenated", format)
+        concat_artifacts(part_paths, path)
+        pd.testing.assert_frame_equal(read_artifact(path), expected,
+                                      check_dtype=format != "excel")
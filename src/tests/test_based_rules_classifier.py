@@ -15,4 +15,25 @@ def test_wrong_parameters():
         classify_risk(False)
 
     with raises(TypeError):
-        classify_risk(None)
\ No newline at end of file
+        classify_risk(None)
+
+
+def test_classify_risk():
+    rule_df = pd.DataFrame({
+        "server_location": ["Anywhere", "Americas"],
+        "security_test_category": ["Injections", "All Tests Performed/Available"],
+        "PII": ["Yes", "No"],
+        "Risk_Label": ["High", "Medium"],
+    })
+    rows = pd.DataFrame({
+        "api_endpoint_id": [1, 2, 3],
+        "server_location": ["Others", "Americas", "Americas"],
+        "security_test_category": ["Injections", "Injections", "Injections"],
+        "PII": ["Yes", "No", "Maybe"],
+    })
+    # Check if the wildcards match any value, and the default label
+    assert [classify_risk(row, rule_df) for _, row in rows.iterrows()] == \
+        ["High", "Medium", "Low Risk"]
+
+    with raises(TypeError):
+        classify_risk(rows.iloc[0], "rules")
@@ -1,4 +1,6 @@
-from utils.country_n_cat_featuring import add_country_and_cat_feats
+from utils.country_n_cat_featuring import (add_country_and_cat_feats,
+                                           load_country_metrics)
+import os
 import pandas as pd
 from pytest import raises
 
@@ -15,4 +17,42 @@ def test_wrong_parameters():
         add_country_and_cat_feats(False)
 
     with raises(TypeError):
-        add_country_and_cat_feats(None)
\ No newline at end of file
+        add_country_and_cat_feats(None)
+
+
+def test_load_country_metrics(tmp_path, country_workbook):
+    path = country_workbook({"Canada": 70.0, "France": 65.0})
+    table = load_country_metrics(path)
+    assert table["Country"].tolist() == ["Canada", "France"]
+    assert (tmp_path / "nri.nri.pkl").exists()
+
+    # The sidecar is used while the workbook is unchanged, even if touched
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    pd.testing.assert_frame_equal(load_country_metrics(path), table)
+    sidecar = pd.read_pickle(str(tmp_path / "nri.nri.pkl"))
+    assert sidecar["mtime"] == stat.st_mtime_ns + 10**9
+
+    # A new workbook invalidates the sidecar
+    country_workbook({"Canada": 71.0, "Japan": 60.0})
+    table = load_country_metrics(path)
+    assert table["Country"].tolist() == ["Canada", "Japan"]
+    assert table["NRI score"].tolist() == [71.0, 60.0]
+
+
+def test_country_lookup(country_workbook):
+    path = country_workbook({"Canada": 70.0, "France": 50.0, "Chad": 0.0})
+    df = pd.DataFrame({
+        "server_location": ["France", "Mars", "Canada", "Chad", None],
+        "hosting_isp": ["Amazon.com, Inc."] * 5,
+        "authentication": ["none"] * 5,
+        "usage_base": ["commercial"] * 5,
+        "category": ["News & Media"] * 5,
+        "server_name": ["nginx", "obscured", "apache", "nginx", "iis"],
+    }, index=[10, 11, 12, 13, 14])
+    result = add_country_and_cat_feats(df, path)
+    assert result.index.tolist() == [0, 1, 2, 3, 4]
+    assert result["Country"].isna().tolist() == [False, True, False, False,
+                                                 True]
+    # Unknown and zero scores are imputed with the mean of the known ones
+    assert result["NRI score"].tolist() == [50.0, 60.0, 70.0, 60.0, 60.0]
@@ -0,0 +1,60 @@
+from utils.endpoint_reader import read_endpoint_chunks, read_endpoints
+from openpyxl import Workbook
+import pandas as pd
+from pytest import raises
+
+
+def write_endpoint_workbook(path, rows):
+    # The raw workbook has other sheets, and columns after S
+    workbook = Workbook()
+    workbook.active.title = "ReadMe"
+    sheet = workbook.create_sheet("Core_Endpoint")
+    sheet.append(["api_endpoint_id", "category", "sample_response",
+                  "security_test_result (FALSE=Passed; TRUE=Failed)"] +
+                 [f"column_{i}" for i in range(4, 19)] + ["after_S"])
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+
+
+def test_wrong_parameters(tmp_path):
+    with raises(TypeError):
+        read_endpoint_chunks(None)
+
+    with raises(TypeError):
+        read_endpoint_chunks(str(tmp_path / "endpoints.xlsx"), "100")
+
+    with raises(ValueError):
+        read_endpoint_chunks(str(tmp_path / "endpoints.xlsx"), 0)
+
+
+def test_read_endpoints(tmp_path):
+    path = str(tmp_path / "endpoints.xlsx")
+    rows = [[1, "News & Media", '{"a": 1}', False],
+            [2, None, 123, True],
+            [],
+            [3, "Finance & Banking", "[]", None, None, 5.0, None, None,
+             None, None, None, None, None, None, None, None, None, None,
+             None, "ignored"],
+            [4.0, "News & Media", "{}", 0]]
+    write_endpoint_workbook(path, rows + [[], []])
+    expected = pd.read_excel(path, "Core_Endpoint", usecols="A:S")
+    expected = expected.rename(columns={
+        "security_test_result (FALSE=Passed; TRUE=Failed)":
+        "security_test_result"})
+    expected["sample_response"] = ['{"a": 1}', "123", None, "[]", "{}"]
+    expected["sample_response"] = expected["sample_response"].fillna(
+        float("nan"))
+
+    chunks = list(read_endpoint_chunks(path, chunk_size=2))
+    assert [chunk.index.tolist() for chunk in chunks] == [[0, 1], [2, 3], [4]]
+    # Each chunk is typed on its own
+    assert chunks[0]["security_test_result"].dtype == "bool"
+    assert chunks[1]["security_test_result"].dtype == "float64"
+    assert (tmp_path / "endpoints.endpoints" / "sha256").exists()
+
+    # The columnar copy is read while the workbook is unchanged
+    pd.testing.assert_frame_equal(read_endpoints(path), expected)
+
+    write_endpoint_workbook(path, rows[:2])
+    assert read_endpoints(path)["api_endpoint_id"].tolist() == [1, 2]
@@ -0,0 +1,94 @@
+from utils.featurizer import Featurizer
+from joblib import dump, load
+import numpy as np
+import pandas as pd
+from pytest import raises
+
+
+def endpoints(server_location, category, security_test_category,
+              security_test_result):
+    n_rows = len(server_location)
+    return pd.DataFrame({
+        "server_location": server_location,
+        "hosting_isp": ["Amazon.com, Inc."] * n_rows,
+        "authentication": ["OAuth2"] * n_rows,
+        "usage_base": ["commercial"] * n_rows,
+        "category": category,
+        "server_name": ["nginx"] * n_rows,
+        "security_test_category": security_test_category,
+        "security_test_result": security_test_result,
+    })
+
+
+def test_wrong_parameters(country_workbook):
+    with raises(TypeError):
+        Featurizer(None)
+
+    path = country_workbook({"Canada": 70.0, "France": 50.0})
+    with raises(TypeError):
+        Featurizer(path).fit("raw_text")
+
+    # The featurizer should be fitted before transforming
+    with raises(ValueError):
+        Featurizer(path).transform(endpoints(["Canada"], ["News & Media"],
+                                             ["SQL Injection"], [1.0]))
+
+
+def test_featurizer(tmp_path, country_workbook):
+    path = country_workbook({"Canada": 70.0, "France": 50.0})
+    train = endpoints(["Canada", "France", "Mars"],
+                      ["News & Media", "Finance & Banking", "News & Media"],
+                      ["SQL Injection", None, "SQL Injection"],
+                      [1.0, np.nan, 0.0])
+    featurizer = Featurizer(path).fit(train)
+    train_df = featurizer.transform(train)
+
+    # The batch has unseen values, and is encoded with the training columns
+    batch = endpoints(["Mars", "France"], ["Sports & Entertainment", None],
+                      ["Cross-Site Scripting", "SQL Injection"], [0.0, 1.0])
+    batch.index = [7, 3]
+    dump(featurizer, str(tmp_path / "featurizer.joblib"))
+    batch_df = load(str(tmp_path / "featurizer.joblib")).transform(batch)
+    assert batch_df.columns.tolist() == train_df.columns.tolist()
+    assert batch_df.index.tolist() == [7, 3]
+    # The unknown countries get the NRI score mean of the training data
+    assert batch_df["NRI score"].tolist() == [60.0, 50.0]
+    assert batch_df["security_test_result_processed"].tolist() == [0, 2]
+    assert batch_df["x0_SQL Injection"].tolist() == [0.0, 1.0]
+    assert batch_df["x0_Missing"].tolist() == [0.0, 0.0]
+    assert batch_df["News & Media"].tolist() == [0.0, 0.0]
+    assert "x0_Cross-Site Scripting" not in batch_df.columns
+
+
+def test_partial_fit(country_workbook):
+    path = country_workbook({"Canada": 70.0, "France": 50.0})
+    train = endpoints(["Canada", "France", "Mars", "France"],
+                      ["News & Media", None, "Finance & Banking",
+                       "News & Media"],
+                      ["SQL Injection", None, "SQL Injection", "XSS"],
+                      [1.0, np.nan, 0.0, 1.0])
+    featurizer = Featurizer(path).fit(train)
+
+    # The chunks give the statistics of the whole training data
+    chunked = Featurizer(path)
+    for start in range(0, len(train), 2):
+        chunked.partial_fit(train.iloc[start:start + 2])
+    assert chunked.nri_mean == featurizer.nri_mean
+    assert chunked.categories[:2] == ["Finance & Banking", "News & Media"]
+    assert np.isnan(chunked.categories[2])
+    assert chunked.test_categories == featurizer.test_categories
+    pd.testing.assert_frame_equal(chunked.transform(train),
+                                  featurizer.transform(train))
+
+    # The fingerprint does not depend on the way the featurizer was fitted
+    assert chunked.fingerprint() == featurizer.fingerprint()
+    assert chunked.fingerprint()[1][2] is None
+
+    # A fit forgets the previous chunks
+    chunked.fit(train.iloc[:1])
+    assert chunked.nri_mean == 70.0
+    assert chunked.categories == ["News & Media"]
+    assert chunked.fingerprint() != featurizer.fingerprint()
+
+    with raises(ValueError):
+        Featurizer(path).fingerprint()
@@ -0,0 +1,34 @@
+from utils.literal_parser import clear_parser_cache, parse_literal, parser_stats
+from pytest import raises
+
+
+def test_wrong_parameters():
+    with raises(TypeError):
+        parse_literal(123)
+
+    with raises(TypeError):
+        parse_literal(None)
+
+    # Test if the code is not evaluated
+    with raises(ValueError):
+        parse_literal("__import__('os').getcwd()")
+
+    with raises(ValueError):
+        parse_literal("{'a': ")
+
+
+def test_parse_literal():
+    # Test if both the json and the Python literals are parsed
+    assert parse_literal('{"a": null, "b": true}') == {"a": None, "b": True}
+    assert parse_literal("{'a': None, 'b': (1, 2)}") == {"a": None, "b": (1, 2)}
+    assert parse_literal("[]") == []
+
+
+def test_parser_stats():
+    clear_parser_cache()
+    assert parser_stats()["hit_rate"] == 0.0
+    for _ in range(4):
+        parse_literal('{"server": "nginx"}')
+    stats = parser_stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (3, 1, 1)
+    assert stats["hit_rate"] == 0.75
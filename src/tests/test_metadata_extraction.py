@@ -1,4 +1,4 @@
-from utils.metadata_extraction import extract_metadata
+from utils.metadata_extraction import extract_metadata, load_header_rules
 import pandas as pd
 from pytest import raises
 
@@ -15,4 +15,51 @@ def test_wrong_parameters():
         extract_metadata(False)
 
     with raises(TypeError):
-        extract_metadata(None)
\ No newline at end of file
+        extract_metadata(None)
+
+
+def test_headers():
+    df = pd.DataFrame({
+        "response_metadata": ['{"X-Frame-Options": "DENY", "Server": "nginx", '
+                              '"Content-Type": "text/html", "Date": "today"}',
+                              None],
+        "parameters": ['{"q": "hello", "mode": "JSON"}', None],
+    })
+    df = extract_metadata(df)
+    # Check if the recommended rules are followed (0) or not (1)
+    assert df["x-frame-options"].tolist() == [0, 0]
+    assert df["content-type"].tolist() == [1, 0]
+    # Check if the headers that should not be present are flagged
+    assert df["server"].tolist() == [1, 0]
+    assert df["x-powered-by"].tolist() == [0, 0]
+    assert df["metadata_fields_count"].tolist() == [3, 0]
+    assert df["parameters_count"].tolist() == [2, 0]
+
+
+def test_header_rules(tmp_path):
+    path = tmp_path / "header_rules.csv"
+    path.write_text("header,rule,pattern\n"
+                    "Content-Security-Policy,regex,default-src\\s+'self'\n"
+                    "server,absent,\n")
+    header_rules = load_header_rules(str(path))
+    assert list(header_rules) == ["content-security-policy", "server"]
+
+    df = pd.DataFrame({
+        "response_metadata": ['{"Content-Security-Policy": "default-src  \'self\'"}',
+                              '{"content-security-policy": "default-src *"}',
+                              '{"Server": "nginx"}'],
+        "parameters": ["{}", "{}", "{}"],
+    })
+    df = extract_metadata(df, header_rules)
+    # Check if only the headers of the rules are extracted
+    assert "x-frame-options" not in df.columns
+    assert df["content-security-policy"].tolist() == [0, 1, 0]
+    assert df["server"].tolist() == [0, 0, 1]
+
+    path.write_text("header,rule,pattern\nserver,forbidden,\n")
+    with raises(ValueError):
+        load_header_rules(str(path))
+
+    path.write_text("header,rule,pattern\nserver,contains,\n")
+    with raises(ValueError):
+        load_header_rules(str(path))
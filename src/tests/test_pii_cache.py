@@ -0,0 +1,43 @@
+from utils.pii_cache import PiiCache, cache_key
+from pytest import raises
+
+
+def test_wrong_parameters(tmp_path):
+    # Test if the function raises an error when the path is not a string
+    with raises(TypeError):
+        PiiCache(123)
+
+    # Test if the function raises an error when max_entries is not valid
+    with raises(TypeError):
+        PiiCache(str(tmp_path / "cache.sqlite"), max_entries="10")
+
+    with raises(ValueError):
+        PiiCache(str(tmp_path / "cache.sqlite"), max_entries=0)
+
+
+def test_cache_key():
+    # Check if the key depends on the text, entities, version and params
+    key = cache_key("text", ["PERSON", "CRYPTO"], "v1", 0.5)
+    assert key == cache_key("text", ["CRYPTO", "PERSON"], "v1", 0.5)
+    assert key != cache_key("other", ["PERSON", "CRYPTO"], "v1", 0.5)
+    assert key != cache_key("text", ["PERSON"], "v1", 0.5)
+    assert key != cache_key("text", ["PERSON", "CRYPTO"], "v2", 0.5)
+    assert key != cache_key("text", ["PERSON", "CRYPTO"], "v1", 0.6)
+
+
+def test_hits_and_eviction(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    with PiiCache(path, max_entries=2) as cache:
+        cache.set_many({"a": [True, False], "b": [False, False]})
+        assert cache.get_many(["a", "c"]) == {"a": [True, False]}
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        # Check if the least recently used entry is evicted
+        cache.set_many({"c": [False, True]})
+        assert len(cache) == 2
+        assert cache.get_many(["a", "b", "c"]).keys() == {"a", "c"}
+
+    # Check if the results persist on disk
+    with PiiCache(path, max_entries=2) as cache:
+        assert cache.get_many(["c"]) == {"c": [False, True]}
+        assert cache.stats()["hit_rate"] == 1.0
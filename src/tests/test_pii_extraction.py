@@ -1,4 +1,12 @@
-from utils.pii_extraction import pii_extraction
+from utils.pii_extraction import (analyzer_version, get_analyzer,
+                                  pii_extraction, pii_extraction_batch,
+                                  pii_extraction_with_paths,
+                                  pii_fii_extraction, pii_fii_extraction_batch,
+                                  pii_scores_batch, rethreshold,
+                                  set_analyzer, set_profile)
+from utils import pii_extraction as pii_extraction_module
+from utils.pii_cache import PiiCache
+import json
 import pandas as pd
 from pytest import raises
 
@@ -55,3 +63,286 @@ def test_html():
     assert isinstance(
         results, list
     ), "A List should be returned."
+
+
+def test_batch():
+    texts = ["raw_text",
+             '{"email": "abc@test.com", "ip": ["127.0.0.1", 3]}',
+             "<html><body>abc@test.com</body></html>"]
+    results = pii_extraction_batch(texts, type="pii", conf_threshold=0.5)
+
+    # Check if there is one list of results per text
+    assert len(results) == len(texts), "One result per text should be returned."
+
+    # Check if the batch results are the same as the single results
+    for text, batch_results in zip(texts, results):
+        single_results = pii_extraction(text, type="pii", conf_threshold=0.5)
+        assert [(r.entity_type, r.start, r.end) for r in batch_results] == [
+            (r.entity_type, r.start, r.end) for r in single_results
+        ], "Batch results should match the single results."
+
+    with raises(ValueError):
+        pii_extraction_batch(texts, type="test", conf_threshold=0.5)
+
+
+def test_pii_fii():
+    texts = ["raw_text",
+             '{"email": "abc@test.com", "ip": "127.0.0.1"}',
+             '[{"email": "abc@test.com"}, {"iban": "DE89370400440532013000"}]']
+    flags = pii_fii_extraction_batch(texts, conf_threshold=0.5)
+
+    # Check if the flags are the same as the separate pii and fii scans
+    for text, flag in zip(texts, flags):
+        assert flag.is_pii == bool(pii_extraction(text, type="pii"))
+        assert flag.is_fii == bool(pii_extraction(text, type="fii"))
+        assert not flag.sampled
+
+    # Check if the early exit does not change the flags
+    assert pii_fii_extraction_batch(texts, early_exit=True) == flags
+    assert pii_fii_extraction(texts[2], early_exit=True) == flags[2]
+
+    with raises(TypeError):
+        pii_fii_extraction("raw_text", early_exit="yes")
+
+
+def test_pii_fii_early_exit(monkeypatch):
+    # The leaves are split into several documents, the first one
+    # deciding both flags
+    leaves = {"email": "abc@test.com", "iban": "DE89370400440532013000"}
+    leaves.update({f"key_{i}": f"plain text {i}" for i in range(20)})
+    texts = [json.dumps(leaves), "raw_text"]
+    monkeypatch.setattr(pii_extraction_module, "max_document_length", 40)
+    processed = []
+    process_batch = pii_extraction_module._process_batch
+
+    def counted_process_batch(analyzer, documents):
+        documents = list(documents)
+        processed.extend(documents)
+        return process_batch(analyzer, documents)
+
+    monkeypatch.setattr(pii_extraction_module, "_process_batch",
+                        counted_process_batch)
+    flags = pii_fii_extraction_batch(texts)
+    n_documents = len(processed)
+    assert n_documents > 3
+
+    # Check if the documents after the decision are not analyzed
+    processed.clear()
+    assert pii_fii_extraction_batch(texts, early_exit=True) == flags
+    assert flags[0][:2] == (True, True)
+    assert len(processed) == 2
+
+
+def test_pii_fii_cache(tmp_path):
+    texts = ["raw_text", '{"email": "abc@test.com"}', "raw_text"]
+    with PiiCache(str(tmp_path / "cache.sqlite")) as cache:
+        flags = pii_fii_extraction_batch(texts, cache=cache)
+        assert flags == pii_fii_extraction_batch(texts)
+        # Check if the identical texts are only stored once
+        assert len(cache) == 2
+
+        # Check if the second run is read from the cache
+        assert pii_fii_extraction_batch(texts, cache=cache) == flags
+        assert cache.hits == 2
+
+
+def test_pii_fii_parallel():
+    texts = ["raw_text", '{"email": "abc@test.com"}',
+             '{"iban": "DE89370400440532013000"}'] * 3
+    # Check if the results are the same and in the same order
+    flags = pii_fii_extraction_batch(texts, n_workers=2, chunk_size=2)
+    assert flags == pii_fii_extraction_batch(texts)
+
+    with raises(ValueError):
+        pii_fii_extraction_batch(texts, n_workers=0)
+
+    with raises(TypeError):
+        pii_fii_extraction_batch(texts, chunk_size="100")
+
+
+def test_pii_fii_parallel_errors(monkeypatch):
+    texts = ['{"email": "abc@test.com"}'] * 3
+
+    def missing_model(profile):
+        raise OSError("Can't find model 'en_core_web_lg'")
+
+    # Check if the errors of the set up of the engine are raised
+    # instead of restarting the workers
+    monkeypatch.setattr(pii_extraction_module, "_create_analyzer",
+                        missing_model)
+    set_analyzer(None)
+    with raises(OSError):
+        pii_fii_extraction_batch(texts, n_workers=2, chunk_size=1)
+
+    # Check if a worker that failed to set up the engine raises the error
+    pii_extraction_module._init_worker("accurate", None)
+    try:
+        with raises(OSError):
+            pii_extraction_module._scan_chunk((len, texts))
+    finally:
+        pii_extraction_module._worker_error = None
+
+
+def test_process_batch():
+    analyzer = get_analyzer()
+    # The batches rely on a private method of the pinned presidio version
+    assert hasattr(analyzer.nlp_engine, "_doc_to_nlp_artifact"), \
+        "presidio-analyzer has no SpacyNlpEngine._doc_to_nlp_artifact, " \
+        "see its pin in requirements.txt"
+    documents = ['{"email": "abc@test.com"}', "DE89370400440532013000"]
+    results = list(pii_extraction_module._process_batch(analyzer, documents))
+    assert [document for document, _ in results] == documents
+    # Check if the artifacts give the results of the analysis of the text
+    for document, nlp_artifacts in results:
+        batch = analyzer.analyze(text=document, language="en",
+                                 nlp_artifacts=nlp_artifacts)
+        single = analyzer.analyze(text=document, language="en")
+        assert [(r.entity_type, r.start, r.end, r.score) for r in batch] == \
+            [(r.entity_type, r.start, r.end, r.score) for r in single]
+
+
+def test_lazy_analyzer():
+    engine = get_analyzer()
+    # Check if the engine is only set up once
+    assert get_analyzer() is engine
+
+    # Check if the version does not set up the engine
+    set_analyzer(None)
+    analyzer_version()
+    assert pii_extraction_module._analyzer is None
+
+    # Check if the engine can be replaced
+    set_analyzer(engine)
+    assert get_analyzer() is engine
+
+
+def test_profile():
+    # Test if the function raises an error when the profile is not valid
+    with raises(TypeError):
+        set_profile(1)
+
+    with raises(ValueError):
+        set_profile("slow")
+
+    # Check if the regex-only profile still finds the FII
+    set_profile("regex-only")
+    try:
+        assert "profile=regex-only" in analyzer_version()
+        assert "disable=tok2vec" in analyzer_version()
+        assert pii_fii_extraction('{"iban": "DE89370400440532013000"}')[1]
+    finally:
+        set_profile("accurate")
+
+
+def test_json_paths():
+    text = ('{"users": [{"email": "abc@test.com"}, {"email": "abc@test.com"}],'
+            ' "contact": "mail me at def@test.com"}')
+    results = pii_extraction_with_paths(text, type="pii", conf_threshold=0.5)
+    emails = [(path, result.start, result.end) for path, result in results
+              if result.entity_type == "EMAIL_ADDRESS"]
+
+    # Check if the results are mapped back to each json path of the leaf
+    assert emails == [(("users", 0, "email"), 0, 12),
+                      (("users", 1, "email"), 0, 12),
+                      (("contact",), 11, 23)]
+
+    # Check if the text results have an empty path
+    results = pii_extraction_with_paths("abc@test.com", type="pii")
+    assert [path for path, _ in results] == [()]
+
+
+def test_pii_fii_sampling():
+    records = [{"id": i, "name": "user" + str(i)} for i in range(1000)]
+    records[500]["name"] = "abc@test.com"
+    text = json.dumps({"data": records})
+
+    # Check if the sampled arrays are recorded
+    flag = pii_fii_extraction(text, sample_size=10)
+    assert flag.sampled
+    assert pii_fii_extraction(text, sample_size=2000) == (True, False, False)
+
+    # Check if the arrays of different records are not sampled
+    records[1]["extra"] = "field"
+    assert not pii_fii_extraction(json.dumps(records), sample_size=10).sampled
+
+    # Check if the byte budget truncates the responses
+    assert pii_fii_extraction("x" * 100 + " abc@test.com",
+                              max_bytes=50) == (False, False, True)
+    assert pii_fii_extraction('{"a": "abc@test.com"}',
+                              max_bytes=50) == (True, False, False)
+
+    with raises(ValueError):
+        pii_fii_extraction(text, sample_size=0)
+
+
+def test_pii_fii_schema(tmp_path):
+    texts = ['{"user": {"email": "abc@test.com", "iban": "DE89370400440532013000"}}',
+             '{"name": "abc@test.com"}',
+             '{"name": "Vancouver"}',
+             "raw_text"]
+    with PiiCache(str(tmp_path / "cache.sqlite")) as cache:
+        flags = pii_fii_extraction_batch(texts, api_ids=[1, 2, 2, 2],
+                                         schema_cache=cache)
+        # Check if the flags are inferred from the keys
+        assert flags[0] == (True, True, False)
+        # Check if the responses with the same keys reuse the flags
+        assert flags[1] == (True, False, False)
+        assert flags[2] == (True, False, True)
+        assert flags[3] == (False, False, False)
+
+        # Check if the next responses of a known schema are not analyzed
+        flags = pii_fii_extraction_batch(['{"name": "Paris"}'], api_ids=[2],
+                                         schema_cache=cache)
+        assert flags == [(True, False, True)]
+
+        # Check if the values of a generic key name are analyzed
+        flags = pii_fii_extraction_batch(['{"mac_address": "00:1B:44:11:3A:B7"}'],
+                                         api_ids=[3], schema_cache=cache)
+        assert flags == [(False, False, False)]
+
+    with raises(ValueError):
+        pii_fii_extraction_batch(texts, api_ids=[1], schema_cache=cache)
+
+
+def test_html_script():
+    # Check if the content of the script and style elements is ignored
+    results = pii_extraction("<html><script>var a = 'abc@test.com';</script>"
+                             "<body>def@test.com</body></html>",
+                             type="pii",
+                             conf_threshold=0.5)
+    assert [(r.start, r.end) for r in results] == [(0, 12)]
+
+    # Check if the xml with an encoding declaration is parsed
+    results = pii_extraction('<?xml version="1.0" encoding="UTF-8"?>'
+                             '<user><email>abc@test.com</email></user>',
+                             type="pii",
+                             conf_threshold=0.5)
+    assert [r.entity_type for r in results] == ["EMAIL_ADDRESS"]
+
+
+def test_pii_scores(tmp_path):
+    texts = ["raw_text", '{"email": "abc@test.com"}',
+             '{"iban": "DE89370400440532013000", "ip": "192.168.0.1"}']
+    with PiiCache(str(tmp_path / "cache.sqlite")) as cache:
+        scores = pii_scores_batch(texts, cache=cache)
+        # Check if the second run is read from the cache
+        assert pii_scores_batch(texts, cache=cache).equals(scores)
+        assert cache.hits == 3
+    assert scores["EMAIL_ADDRESS"].notna().tolist() == [False, True, False]
+
+    # Check if the flags match the ones of a scan with the same threshold
+    for conf_threshold in [0, 0.5, 0.9, 1]:
+        flags = rethreshold(scores, conf_threshold)
+        expected = pii_fii_extraction_batch(texts, conf_threshold)
+        assert flags.values.tolist() == [[f.is_pii, f.is_fii] for f in expected]
+
+    # Check if the entities outside of the subset are ignored
+    flags = rethreshold(scores, 0.5, entities=["EMAIL_ADDRESS"])
+    assert flags["is_pii"].tolist() == [False, True, False]
+    assert not flags["is_fii"].any()
+
+    with raises(ValueError):
+        rethreshold(scores, 0.5, entities=["PASSWORD"])
+
+    with raises(TypeError):
+        rethreshold(texts, 0.5)
@@ -0,0 +1,47 @@
+from utils.pii_schema import classify_key, infer_key_entities, schema_fingerprint
+from pytest import raises
+
+
+def test_wrong_parameters():
+    # Test if the function raises an error when the key is not a string
+    with raises(TypeError):
+        classify_key(123)
+
+    with raises(TypeError):
+        classify_key(None)
+
+
+def test_classify_key():
+    assert classify_key("email") == "EMAIL_ADDRESS"
+    assert classify_key("userEmail") == "EMAIL_ADDRESS"
+    assert classify_key("SSN") == "US_SSN"
+    assert classify_key("billing-iban") == "IBAN_CODE"
+    assert classify_key("card_number") == "CREDIT_CARD"
+    # Check if the longest known name is used
+    assert classify_key("client_ip_address") == "IP_ADDRESS"
+    assert classify_key("temperature") is None
+    # Check if the generic names only match the whole key
+    assert classify_key("address") == "LOCATION"
+    assert classify_key("billingAddress") == "LOCATION"
+    assert classify_key("mac_address") is None
+    assert classify_key("contract_address") is None
+    assert classify_key("wallet_address") == "CRYPTO"
+    assert classify_key("gift_card_number") is None
+
+
+def test_infer_key_entities():
+    objs = {"user": {"email": "abc@test.com", "ssn": None},
+            "payments": [{"iban": "DE89370400440532013000"}]}
+    # Check if the keys with an empty value are ignored
+    assert infer_key_entities(objs) == {"EMAIL_ADDRESS", "IBAN_CODE"}
+    assert infer_key_entities({"mac_address": "00:1B:44:11:3A:B7"}) == set()
+
+
+def test_schema_fingerprint():
+    # Check if the number of records does not change the fingerprint
+    one = schema_fingerprint({"data": [{"id": 1, "name": "a"}]})
+    two = schema_fingerprint({"data": [{"id": 1, "name": "a"},
+                                       {"id": 2, "name": "b"}]})
+    assert one == two
+    assert one != schema_fingerprint({"data": [{"id": 1}]})
+    assert schema_fingerprint([1, 2, 3]) is None
@@ -1,4 +1,7 @@
-from utils.risk_labelling import classify_risk, create_risk_label
+from utils.risk_labelling import (RuleIndex, classify_risk, compile_rules,
+                                  create_risk_label, load_rules,
+                                  diff_rules, relabel_changed_rules,
+                                  relabel_from_snapshot)
 import pandas as pd
 from pytest import raises
 
@@ -28,4 +31,169 @@ def test_wrong_parameters():
         create_risk_label(False)
 
     with raises(TypeError):
-        create_risk_label(None)
\ No newline at end of file
+        create_risk_label(None)
+
+
+def test_rule_index():
+    rule_df = pd.DataFrame({
+        "server_location": ["Anywhere", "China", "China", "Anywhere"],
+        "security_test_category": ["Injections", "Injections",
+                                   "All Tests Performed/Available",
+                                   "All Tests Performed/Available"],
+        "PII": ["Yes", "Yes", "No", "No"],
+        "Risk_Label": ["High", "Imminent", "Medium", "Low"],
+    })
+    rule_index = RuleIndex(rule_df)
+    df = pd.DataFrame({
+        "api_endpoint_id": [1, 2, 3, 4],
+        "server_location": ["China", "Russia", "China", "Russia"],
+        "security_test_category": ["Injections", "Injections",
+                                   "Buffer Overflow", "Injections"],
+        "PII": ["Yes", "Yes", "No", "Maybe"],
+    })
+    # Check if the first matching rule wins, with the wildcards
+    assert rule_index.classify(df) == ["High", "High", "Medium", "Low"]
+    assert [classify_risk(row, rule_df) for _, row in df.iterrows()] == \
+        ["High", "High", "Medium", "Low"]
+    assert classify_risk(df.iloc[2], rule_index) == "Medium"
+
+    # Check if the rows with other columns match no rule
+    assert classify_risk(df.iloc[2][["api_endpoint_id", "PII"]],
+                         rule_index) == "Low"
+
+    with raises(ValueError):
+        rule_index.classify(df.drop(columns=["PII"]))
+
+
+def test_create_risk_label(tmp_path):
+    rule_df = pd.DataFrame({
+        "api_vendor": ["Enterprise", "Enterprise"],
+        "authentication": ["No Authentication", "Some Authentication"],
+        "security_test_category": ["Injections", "All Tests Performed/Available"],
+        "security_test_result": ["Fail", None],
+        "server_location": ["Anywhere", "Americas"],
+        "hosting_isp": ["Anyone", "Anyone"],
+        "PII": ["Yes", "No"],
+        "FII": [None, None],
+        "Risk_Label": ["Imminent", "Medium"],
+    })
+    path = str(tmp_path / "RiskRules.xlsx")
+    rule_df.to_excel(path, sheet_name="RiskRules", index=False)
+    df = pd.DataFrame({
+        "api_endpoint_id": [1, 2, 3],
+        "authentication": [None, "API Key", "API Key"],
+        "security_test_category": ["SQL Injection", "Buffer Overflow", None],
+        "security_test_result": [1., None, None],
+        "server_location": ["Russia", "Canada", "India"],
+        "hosting_isp": ["AWS", "GCP", "GCP"],
+        "is_pii": [True, False, False],
+        "is_fii": [None, None, None],
+    })
+    labelled = create_risk_label(df, path)
+    # Check if the values are mapped to the ones of the rules
+    assert labelled["Risk_Label"].tolist() == ["Imminent", "Medium", "Low"]
+    assert labelled.drop(columns=["Risk_Label"]).equals(df)
+
+
+def test_relabel_changed_rules():
+    old_rules = pd.DataFrame({
+        "server_location": ["Anywhere", "China", "Russia"],
+        "PII": ["Yes", "No", "No"],
+        "Risk_Label": ["High", "Medium", "Low"],
+    })
+    new_rules = pd.DataFrame({
+        "server_location": ["Anywhere", "China", "Others"],
+        "PII": ["Yes", "No", "No"],
+        "Risk_Label": ["High", "Imminent", "Medium"],
+    })
+    old_index, new_index = RuleIndex(old_rules), RuleIndex(new_rules)
+    changes = diff_rules(old_index, new_index)
+    assert len(changes["added"]) == len(changes["removed"]) == 1
+    assert len(changes["changed"]) == 1
+    assert not changes["reordered"]
+
+    api_df = pd.DataFrame({
+        "server_location": ["China", "China", "Russia", "Others"],
+        "PII": ["Yes", "No", "No", "No"],
+    })
+    labels = old_index.classify(api_df)
+    labels, relabelled = relabel_changed_rules(api_df, labels,
+                                               old_index, new_index)
+    # Check if only the rows of the changed rules are relabelled
+    assert relabelled.tolist() == [False, True, True, True]
+    assert labels == new_index.classify(api_df)
+
+    # Check if the reordered rules relabel all the rows
+    reordered = RuleIndex(old_rules.iloc[::-1])
+    assert diff_rules(old_index, reordered)["reordered"]
+    _, relabelled = relabel_changed_rules(api_df, labels, old_index, reordered)
+    assert relabelled.all()
+
+    with raises(ValueError):
+        relabel_changed_rules(api_df, labels[:2], old_index, new_index)
+
+
+def test_relabel_from_snapshot(tmp_path):
+    old_rules = pd.DataFrame({
+        "server_location": ["Anywhere", "China", "Russia"],
+        "PII": ["Yes", "No", "No"],
+        "Risk_Label": ["High", "Medium", "Low"],
+    })
+    new_rules = old_rules.assign(Risk_Label=["High", "Medium", "Imminent"])
+    old_index, new_index = RuleIndex(old_rules), RuleIndex(new_rules)
+    api_df = pd.DataFrame({
+        "api_endpoint_id": [1, 2, 3, 4],
+        "server_location": ["China", "China", "Russia", "Canada"],
+        "PII": ["No", "No", "Yes", "No"],
+    })
+    path = str(tmp_path / "risk_snapshot.pkl")
+    # Check if all the rows are labelled without a snapshot
+    labels, previous, relabelled = relabel_from_snapshot(
+        api_df, old_rules, old_index, path)
+    assert labels.tolist() == old_index.classify(api_df)
+    assert previous.isna().all() and relabelled.all()
+
+    # Check if the changed and new rows are relabelled with the rules
+    api_df.loc[1, "PII"] = "Yes"
+    api_df.loc[2, "PII"] = "No"
+    api_df = pd.concat([api_df, pd.DataFrame({
+        "api_endpoint_id": [5], "server_location": ["China"], "PII": ["No"],
+    })], ignore_index=True)
+    labels, previous, relabelled = relabel_from_snapshot(
+        api_df, new_rules, new_index, path)
+    assert labels.tolist() == new_index.classify(api_df)
+    assert relabelled.tolist() == [False, True, True, False, True]
+    assert previous.tolist()[:4] == ["Medium", "Medium", "High", "Low"]
+
+    # Check if nothing is relabelled when nothing changed
+    _, _, relabelled = relabel_from_snapshot(api_df, new_rules, new_index, path)
+    assert not relabelled.any()
+
+    with raises(TypeError):
+        relabel_from_snapshot(None, new_rules, new_index, path)
+
+
+def test_compile_rules(tmp_path):
+    rule_df = pd.DataFrame({
+        "api_vendor": ["Enterprise", "Academia", "Enterprise", "Enterprise"],
+        "server_location": ["Anywhere", "Anywhere", "China", "Anywhere"],
+        "PII": ["Yes", "Yes", "Yes", "Yes"],
+        "Risk_Label": ["High", "High", "Low", "Medium"],
+    })
+    path = str(tmp_path / "RiskRules.xlsx")
+    rule_df.to_excel(path, sheet_name="RiskRules", index=False)
+    compiled = compile_rules(path)
+    assert len(compiled.rules) == 3
+    # Check if the issues are reported with the rows of the workbook
+    assert compiled.report[["row", "issue", "by_row"]].values.tolist() == \
+        [[3, "duplicate", 2], [4, "shadowed", 2], [5, "conflict", 2]]
+
+    # Check if the artifact is reused until the workbook changes
+    assert load_rules(path).version == compiled.version
+    assert (tmp_path / "RiskRules.rules.pkl").exists()
+    rule_df.iloc[:3].to_excel(path, sheet_name="RiskRules", index=False)
+    assert load_rules(path).version != compiled.version
+    assert len(load_rules(path).report) == 2
+
+    with raises(TypeError):
+        compile_rules(None)
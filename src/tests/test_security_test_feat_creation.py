@@ -15,4 +15,32 @@ def test_wrong_parameters():
         security_test_feat_creation(False)
 
     with raises(TypeError):
-        security_test_feat_creation(None)
\ No newline at end of file
+        security_test_feat_creation(None)
+
+
+def test_security_test_features():
+    df = pd.DataFrame({
+        "api_endpoint_id": [1, 2, 3, 3],
+        "security_test_category": ["SQL Injection", None,
+                                   "Cross-Site Scripting",
+                                   "Cross-Site Scripting"],
+        "security_test_result": [1.0, None, 0.0, 0.0],
+        "NRI score": [50.0, 60.0, 70.0, 70.0],
+    })
+    transformed_df = security_test_feat_creation(df)
+    assert transformed_df.columns.tolist() == [
+        "api_endpoint_id", "security_test_category", "security_test_result",
+        "NRI score", "security_test_result_processed",
+        "x0_Cross-Site Scripting", "x0_Missing", "x0_SQL Injection"]
+    # The duplicated endpoint is dropped
+    assert transformed_df.index.tolist() == [0, 1, 2]
+    assert transformed_df["security_test_result_processed"].tolist() == [2, 1, 0]
+    assert transformed_df["x0_Missing"].tolist() == [0.0, 1.0, 0.0]
+    # The dtypes of the other columns are kept
+    assert transformed_df["api_endpoint_id"].dtype == "int64"
+    assert transformed_df["NRI score"].dtype == "float64"
+
+    with raises(ValueError):
+        security_test_feat_creation(pd.DataFrame({
+            "security_test_category": ["SQL Injection"],
+            "security_test_result": [2.0]}))
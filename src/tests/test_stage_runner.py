@@ -0,0 +1,63 @@
+from utils.stage_runner import Stage, frame_hash, run_stages
+import pandas as pd
+from pytest import raises
+
+
+def test_wrong_parameters(tmp_path):
+    with raises(TypeError):
+        run_stages("raw_text", {}, str(tmp_path))
+
+    with raises(TypeError):
+        frame_hash(None)
+
+    # The inputs should be sources or stages, without cycles
+    df = pd.DataFrame({"a": [1]})
+    with raises(ValueError):
+        run_stages([Stage("b", len, ["c"], {}, 1)], {"a": df}, str(tmp_path))
+
+    with raises(ValueError):
+        run_stages([Stage("b", len, ["c"], {}, 1),
+                    Stage("c", len, ["b"], {}, 1)], {"a": df}, str(tmp_path))
+
+
+def test_run_stages(tmp_path):
+    calls = []
+
+    def stage(name, column, factor):
+        def function(df):
+            calls.append(name)
+            return df.assign(**{column: df["a"] * factor})
+        return function
+
+    def pipeline(double, triple):
+        # declared out of order, "triple" needs "double"
+        return [Stage("triple", stage("triple", "c", triple), ["double"],
+                      {"factor": triple}, 1),
+                Stage("double", stage("double", "b", double), ["endpoints"],
+                      {"factor": double}, 1)]
+
+    df = pd.DataFrame({"a": [1, 2]})
+    cache_dir = str(tmp_path / "cache")
+    outputs, report = run_stages(pipeline(2, 3), {"endpoints": df}, cache_dir)
+    assert calls == ["double", "triple"]
+    assert outputs["triple"]["c"].tolist() == [3, 6]
+    assert report["status"].tolist() == ["recomputed", "recomputed"]
+
+    # A rerun reads the last output only
+    calls.clear()
+    outputs, report = run_stages(pipeline(2, 3), {"endpoints": df}, cache_dir)
+    assert calls == []
+    assert outputs["triple"]["b"].tolist() == [2, 4]
+    assert report["status"].tolist() == ["hit", "hit"]
+
+    # A parameter change only recomputes the stage and the stages after it
+    outputs, report = run_stages(pipeline(2, 4), {"endpoints": df}, cache_dir)
+    assert calls == ["triple"]
+    assert outputs["triple"]["c"].tolist() == [4, 8]
+    assert report["status"].tolist() == ["hit", "recomputed"]
+    assert len(list((tmp_path / "cache").glob("triple-*.pkl"))) == 1
+
+    # And so does a change of the sources
+    calls.clear()
+    run_stages(pipeline(2, 4), {"endpoints": df.iloc[:1]}, cache_dir)
+    assert calls == ["double", "triple"]
@@ -0,0 +1,230 @@
+from numpy import NaN
+import pandas as pd
+from pathlib import Path
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# The file extension of each artifact format
+artifact_formats = {"parquet": ".parquet", "arrow": ".arrow", "excel": ".xlsx"}
+
+
+def artifact_path(folder, name, format="parquet"):
+    """
+    Builds the path of an artifact in a folder.
+    Parameters
+    ----------
+    folder : str
+        The folder of the artifact.
+    name : str
+        The name of the artifact, without extension.
+    format : str
+        The format of the artifact, either 'parquet', 'arrow' or 'excel'.
+    Returns
+    -------
+    path : str
+        The path to the artifact, with the extension of the format.
+    """
+    if not isinstance(folder, str) or not isinstance(name, str):
+        raise TypeError("`folder` and `name` should be strings")
+    if format not in artifact_formats:
+        raise ValueError("`format` should be one of " +
+                         ", ".join(artifact_formats))
+    return str(Path(folder) / (name + artifact_formats[format]))
+
+
+def write_artifact(df, path):
+    """
+    Writes a dataframe, without its index, in the format of the extension
+    of the path: Parquet, Arrow IPC or Excel. The object columns mixing
+    strings and other values, like Excel cells typed as numbers in a text
+    column, are written as strings in the Parquet and Arrow formats.
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The dataframe to be written.
+    path : str
+        The path to the artifact.
+    """
+    if not isinstance(df, pd.DataFrame):
+        raise TypeError("`df` should be a valid Pandas DataFrame")
+    format = _artifact_format(path)
+    if format == "excel":
+        df.to_excel(path, index=False)
+        return
+
+    df = df.reset_index(drop=True)
+    for column in df.columns[df.dtypes == object]:
+        values = df[column].dropna()
+        if values.map(type).nunique() > 1:
+            df[column] = df[column].where(df[column].isna(),
+                                          df[column].astype(str))
+    if format == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.to_feather(path)
+
+
+def read_artifact(path, columns=None):
+    """
+    Reads a dataframe in the format of the extension of the path,
+    with the missing values of its object columns as NaN.
+    Parameters
+    ----------
+    path : str
+        The path to the artifact.
+    columns : list
+        The columns to be read, all by default.
+    Returns
+    -------
+    df : pandas.DataFrame
+        The dataframe.
+    """
+    format = _artifact_format(path)
+    if format == "excel":
+        return pd.read_excel(path, usecols=columns)
+    if format == "parquet":
+        df = pd.read_parquet(path, columns=columns)
+    else:
+        df = pd.read_feather(path, columns=columns)
+    # the missing values of the object columns are NaN, like in Excel
+    for column in df.columns[df.dtypes == object]:
+        df[column] = df[column].where(df[column].notna(), NaN)
+    return df
+
+
+def unified_dtypes(chunks):
+    """
+    Finds the dtype of each column of chunks of a dataframe typed on
+    their own, like a column of booleans which is numeric in the chunks
+    with missing values. A column whose chunks have different dtypes, or
+    with only booleans and numbers in an object column, is typed like a
+    number: float64 when a value is missing or a float, else int64. The
+    other columns keep their dtype, or are objects.
+    Parameters
+    ----------
+    chunks : iterable
+        The chunks, with the same columns. Only the summary of a
+        chunk is kept while the next one is read.
+    Returns
+    -------
+    dtypes : dict
+        The dtype of each column.
+    """
+    summaries = {}
+    for chunk in chunks:
+        if not isinstance(chunk, pd.DataFrame):
+            raise TypeError("`chunks` should be Pandas DataFrames")
+        for column in chunk.columns:
+            values = chunk[column].dropna()
+            dtype = chunk[column].dtype
+            if dtype == object:
+                numeric = values.map(lambda value: isinstance(
+                    value, (bool, int, float))).all()
+                has_float = values.map(
+                    lambda value: isinstance(value, float)).any()
+            else:
+                numeric = dtype.kind in "biuf"
+                has_float = dtype.kind == "f"
+            summary = summaries.setdefault(column, {
+                "dtypes": set(), "numeric": True, "missing": False,
+                "float": False, "values": 0})
+            summary["dtypes"].add(dtype)
+            summary["numeric"] &= bool(numeric)
+            summary["missing"] |= len(values) < len(chunk)
+            summary["float"] |= bool(has_float)
+            summary["values"] += len(values)
+
+    dtypes = {}
+    for column, summary in summaries.items():
+        if len(summary["dtypes"]) == 1 and \
+                object not in summary["dtypes"]:
+            dtypes[column] = summary["dtypes"].pop()
+        elif not summary["numeric"] or not summary["values"]:
+            dtypes[column] = object
+        elif summary["missing"] or summary["float"]:
+            dtypes[column] = "float64"
+        else:
+            dtypes[column] = "int64"
+    return dtypes
+
+
+def concat_artifacts(part_paths, path):
+    """
+    Concatenates the parts of a dataframe written by `write_artifact`
+    into an artifact, reading a single part at a time. The parts are
+    read once to find their `unified_dtypes`, then written one after the
+    other in these dtypes, with the values of the object columns as
+    strings in the Parquet and Arrow formats. The Excel format is kept
+    in memory by its writer until it is saved.
+    Parameters
+    ----------
+    part_paths : list
+        The paths to the parts, in their order.
+    path : str
+        The path to the artifact.
+    """
+    if not isinstance(part_paths, list) or not part_paths:
+        raise TypeError("`part_paths` should be a non empty list")
+    format = _artifact_format(path)
+    dtypes = unified_dtypes(read_artifact(part_path)
+                            for part_path in part_paths)
+
+    def typed_parts():
+        for part_path in part_paths:
+            part = read_artifact(part_path).astype(dtypes)
+            for column in part.columns[part.dtypes == object]:
+                part[column] = part[column].where(part[column].isna(),
+                                                  part[column].astype(str))
+            yield part
+
+    if format == "excel":
+        with pd.ExcelWriter(path) as writer:
+            start = 0
+            for part in typed_parts():
+                part.to_excel(writer, index=False, header=start == 0,
+                              startrow=start + 1 if start else 0)
+                start += len(part)
+        return
+
+    writer = None
+    try:
+        for part in typed_parts():
+            if writer is None:
+                schema = pa.Schema.from_pandas(part, preserve_index=False)
+                # the object columns are strings, even if a part
+                # has only missing values
+                for i, field in enumerate(schema):
+                    if dtypes[field.name] == object:
+                        schema = schema.set(i, pa.field(field.name,
+                                                        pa.string()))
+                if format == "parquet":
+                    writer = pq.ParquetWriter(path, schema)
+                else:
+                    writer = pa.ipc.new_file(path, schema)
+            writer.write_table(pa.Table.from_pandas(
+                part, schema=schema, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _artifact_format(path):
+    """
+    Finds the format of an artifact from its extension.
+    Parameters
+    ----------
+    path : str
+        The path to the artifact.
+    Returns
+    -------
+    format : str
+        The format of the artifact.
+    """
+    if not isinstance(path, str):
+        raise TypeError("`path` should be a string")
+    extension = Path(path).suffix.lower()
+    for format, format_extension in artifact_formats.items():
+        if extension == format_extension:
+            return format
+    raise ValueError("`path` should have one of the extensions " +
+                     ", ".join(artifact_formats.values()))
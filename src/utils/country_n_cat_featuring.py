@@ -1,8 +1,90 @@
 from numpy import NaN
+import hashlib
+import numpy as np
+import os
 import pandas as pd
-from sklearn.preprocessing import OneHotEncoder
+from pathlib import Path
+import pickle
 import re
 
+# the format of the country metrics sidecar, to be increased
+# when the parsing of the workbook changes
+country_format = 1
+
+# The categories of the endpoints, each with a feature
+categories_list = ['AI & Data Science',
+                   'Business & Technology',
+                   'Environment & Weather',
+                   'Finance & Banking',
+                   'Food, Health & Medicine',
+                   'GeoInformatics & Navigation',
+                   'Government & Public Services',
+                   'Health Science & Medicine',
+                   'Information & Science',
+                   'Justice & Public Safety',
+                   'Logistics & Infrastructure',
+                   'Natural Resources & Energy',
+                   'News & Media',
+                   'None',
+                   'Religion & Spirituality',
+                   'Research & Education',
+                   'Sales & Marketing',
+                   'Security & Technology',
+                   'Skills & Career Development',
+                   'Social Media & Technology',
+                   'Software & Services',
+                   'Sports & Entertainment',
+                   'Transportation & Automobile',
+                   'Work & Personal Life',
+                   'eCommerce & Trade']
+
+
+def load_country_metrics(input_path_country):
+    """Read the NRI score of each country, through a cached sidecar.
+    The parsed table is saved next to the workbook with the .nri.pkl
+    extension. It is used while the workbook has the same modification
+    time and size, or else the same sha256.
+    Parameters
+    ----------
+    input_path_country : str
+        The path to the file containing the country information
+    Returns
+    -------
+    country_metric_df : Pandas Dataframe
+        The Country and NRI score of each country, without duplicates
+    """
+    if not isinstance(input_path_country, str):
+        raise TypeError("`input_path_country` should be a string")
+    sidecar_path = str(Path(input_path_country).with_suffix(".nri.pkl"))
+    stat = os.stat(input_path_country)
+
+    sidecar = None
+    if Path(sidecar_path).exists():
+        with open(sidecar_path, "rb") as file:
+            sidecar = pickle.load(file)
+        if sidecar.get("format") != country_format:
+            sidecar = None
+    if sidecar is not None and sidecar["mtime"] == stat.st_mtime_ns \
+            and sidecar["size"] == stat.st_size:
+        return sidecar["table"]
+
+    with open(input_path_country, "rb") as file:
+        digest = hashlib.sha256(file.read()).hexdigest()
+    if sidecar is not None and sidecar["sha256"] == digest:
+        # the workbook was touched but its content did not change
+        country_metric_df = sidecar["table"]
+    else:
+        country_metric_df = pd.read_excel(
+            input_path_country, "NRI 2021 - results", usecols="B:C", skiprows=1
+        )
+        country_metric_df = country_metric_df.drop_duplicates(
+            "Country", ignore_index=True)
+    with open(sidecar_path, "wb") as file:
+        pickle.dump({"format": country_format, "mtime": stat.st_mtime_ns,
+                     "size": stat.st_size, "sha256": digest,
+                     "table": country_metric_df}, file)
+    return country_metric_df
+
 
 def add_country_and_cat_feats(df, input_path_country):
     """Read the file, and preprocess the data.
@@ -23,22 +105,64 @@ def add_country_and_cat_feats(df, input_path_country):
         raise TypeError("`input_path_country` should be a string")
 
     # Read country metric data
-    country_metric_df = pd.read_excel(
-        input_path_country, "NRI 2021 - results", usecols="B:C", skiprows=1
-    )
-
-    # Merge country_metric data with input data
-    df = df.merge(
-        country_metric_df, left_on="server_location",
-        right_on="Country", how="left"
-    )
+    country_metric_df = load_country_metrics(input_path_country)
+    df = lookup_country(df.reset_index(drop=True), country_metric_df)
 
     # Imputation of NRI score with mean value
-    df['NRI score'] = df['NRI score'].replace(0, NaN)
     df['NRI score'] = df['NRI score'].replace(NaN, df['NRI score'].mean())
 
-    # Drop the columns that are not needed
-    # df = df.drop(["server_location"], axis=1)
+    df = map_endpoint_features(df)
+    df = encode_categories(df, category_values(df["category"]))
+    df = map_server_name(df)
+
+    # Drop the rows with duplicates
+    df = df.drop_duplicates()
+    # df = df.drop(['category', 'tagset', 'api_id', 'api_vendor_id',
+    #              'hosting_city', 'hosting_isp'], axis=1)
+    
+    return df
+
+
+def lookup_country(df, country_metric_df):
+    """Add the country and NRI score of the server location, with the
+    NRI score of the unknown countries, or of 0, missing.
+    Parameters
+    ----------
+    df : Pandas Dataframe
+        The endpoints
+    country_metric_df : Pandas Dataframe
+        The Country and NRI score of each country
+    Returns
+    -------
+    df : Pandas Dataframe
+        The endpoints with the Country and NRI score columns
+    """
+    # Look up the country and NRI score of the server location
+    # with the categorical codes of the countries
+    df = df.copy()
+    codes = pd.Categorical(df["server_location"],
+                           categories=country_metric_df["Country"]).codes
+    found = codes >= 0
+    df["Country"] = df["server_location"].where(found)
+    df["NRI score"] = np.where(
+        found, country_metric_df["NRI score"].to_numpy()[codes], NaN)
+    df['NRI score'] = df['NRI score'].replace(0, NaN)
+    return df
+
+
+def map_endpoint_features(df):
+    """Merge the duplicated hosting isp names, and add the authentication
+    and usage base features.
+    Parameters
+    ----------
+    df : Pandas Dataframe
+        The endpoints
+    Returns
+    -------
+    df : Pandas Dataframe
+        The endpoints with the authentication_processed and
+        usage_base_processed columns
+    """
     # Update the rows with duplicates
     df.loc[df["hosting_isp"] == "Amazon.com, Inc.",
            "hosting_isp"] = "Amazon.com"
@@ -77,46 +201,70 @@ def add_country_and_cat_feats(df, input_path_country):
         else:
             usagebase_mapper[variable] = 2
     df['usage_base_processed'] = df['usage_base'].replace(usagebase_mapper)
+    return df
+
 
-    # Categories
-    categories_list = ['AI & Data Science',
-                       'Business & Technology',
-                       'Environment & Weather',
-                       'Finance & Banking',
-                       'Food, Health & Medicine',
-                       'GeoInformatics & Navigation',
-                       'Government & Public Services',
-                       'Health Science & Medicine',
-                       'Information & Science',
-                       'Justice & Public Safety',
-                       'Logistics & Infrastructure',
-                       'Natural Resources & Energy',
-                       'News & Media',
-                       'None',
-                       'Religion & Spirituality',
-                       'Research & Education',
-                       'Sales & Marketing',
-                       'Security & Technology',
-                       'Skills & Career Development',
-                       'Social Media & Technology',
-                       'Software & Services',
-                       'Sports & Entertainment',
-                       'Transportation & Automobile',
-                       'Work & Personal Life',
-                       'eCommerce & Trade']
-
-    category_enc = OneHotEncoder(handle_unknown="ignore", sparse=False)
-    cat = df[['category']]
-    cat_enc = category_enc.fit_transform(cat)
-    cat_column_name = category_enc.get_feature_names_out(['category'])
-    cat_df = pd.DataFrame(cat_enc, columns=cat_column_name)
-    cat_df.columns = cat_df.columns.str.replace(r'^category_', '')
+def category_values(category):
+    """List the categories one hot encoded by `encode_categories`: the
+    sorted categories, then a missing category if there is one.
+    Parameters
+    ----------
+    category : Pandas Series
+        The category of the endpoints
+    Returns
+    -------
+    categories : list
+        The encoded categories
+    """
+    categories = sorted(category.dropna().unique())
+    if category.isna().any():
+        categories.append(NaN)
+    return categories
+
+
+def encode_categories(df, categories):
+    """One hot encode the category of the endpoints, with a column for each
+    of `categories` and for each of the known categories, the unknown
+    categories being encoded with zeros.
+    Parameters
+    ----------
+    df : Pandas Dataframe
+        The endpoints
+    categories : list
+        The encoded categories, from `category_values`
+    Returns
+    -------
+    df : Pandas Dataframe
+        The endpoints with a column per category
+    """
+    known = [category for category in categories if not pd.isna(category)]
+    codes = pd.Categorical(df["category"], categories=known).codes
+    if len(known) < len(categories):
+        codes = np.where(df["category"].isna(), len(known), codes)
+    cat_enc = np.zeros((len(df), len(categories)))
+    found = codes >= 0
+    cat_enc[np.flatnonzero(found), codes[found]] = 1
+    cat_df = pd.DataFrame(cat_enc, columns=[str(category) for category in categories],
+                          index=df.index)
     df = pd.concat([df, cat_df], axis=1)
     for category in categories_list:
         if category not in df.columns:
             df[category] = 0
+    return df
+
 
-    # server_name
+def map_server_name(df):
+    """Add the server name feature: 0 when the server name is hidden,
+    1 otherwise.
+    Parameters
+    ----------
+    df : Pandas Dataframe
+        The endpoints
+    Returns
+    -------
+    df : Pandas Dataframe
+        The endpoints with the server_name_processed column
+    """
     df['server_name_processed'] = df['server_name'].astype(str).str.lower()
     server_name_list = df.server_name_processed.unique().tolist()
     secure_server_keys = {"obscured", 'missing', 'unavailable'}
@@ -129,10 +277,4 @@ def add_country_and_cat_feats(df, input_path_country):
             server_name_mapper[server] = 1
     df['server_name_processed'] = df['server_name_processed'].replace(
         server_name_mapper)
-
-    # Drop the rows with duplicates
-    df = df.drop_duplicates()
-    # df = df.drop(['category', 'tagset', 'api_id', 'api_vendor_id',
-    #              'hosting_city', 'hosting_isp'], axis=1)
-    
     return df
@@ -0,0 +1,235 @@
+from openpyxl import load_workbook
+from pandas.io.parsers import TextParser
+from pathlib import Path
+from utils.artifacts import read_artifact, unified_dtypes, write_artifact
+import hashlib
+import pandas as pd
+import shutil
+
+# The sheet of the raw endpoints and its number of columns, A:S
+endpoint_sheet = "Core_Endpoint"
+endpoint_columns = 19
+renamed_columns = {
+    "security_test_result (FALSE=Passed; TRUE=Failed)": "security_test_result"
+}
+
+
+def read_endpoint_chunks(endpoint_path, chunk_size=10000, cache_dir=None):
+    """
+    Streams the endpoints of the Core_Endpoint sheet of a raw workbook, as
+    dataframes of `chunk_size` rows typed like `pd.read_excel` would.
+    The workbook is read row by row in read-only mode, and converted at
+    the same time into a cached columnar copy, a folder of Parquet parts.
+    The later reads stream the parts instead, as long as the workbook has
+    the same sha256, sliced into chunks of `chunk_size` rows. A part is
+    read whole, so it is better to convert the workbook with the chunk
+    size of the later reads.
+    Parameters
+    ----------
+    endpoint_path : str
+        The path to the raw workbook.
+    chunk_size : int
+        The number of endpoints per chunk.
+    cache_dir : str
+        The folder of the columnar copy, by default next to the workbook
+        with the .endpoints extension.
+    Returns
+    -------
+    chunks : generator
+        The dataframes of the endpoints, indexed by their row in the sheet
+        after its header. A chunk is typed on its own, so a column of
+        booleans is numeric in the chunks with missing values, their
+        `unified_dtypes` are the dtypes of the whole sheet.
+    """
+    if not isinstance(endpoint_path, str):
+        raise TypeError("`endpoint_path` should be a string")
+    if not isinstance(chunk_size, int) or isinstance(chunk_size, bool):
+        raise TypeError("`chunk_size` should be an integer")
+    if chunk_size < 1:
+        raise ValueError("`chunk_size` should be positive")
+    if cache_dir is None:
+        cache_dir = str(Path(endpoint_path).with_suffix(".endpoints"))
+    return _endpoint_chunks(endpoint_path, chunk_size, Path(cache_dir))
+
+
+def read_endpoints(endpoint_path, chunk_size=10000, cache_dir=None):
+    """
+    Reads the endpoints of the Core_Endpoint sheet of a raw workbook,
+    through the chunks and the columnar copy of `read_endpoint_chunks`.
+    Parameters
+    ----------
+    endpoint_path : str
+        The path to the raw workbook.
+    chunk_size : int
+        The number of endpoints per chunk.
+    cache_dir : str
+        The folder of the columnar copy, by default next to the workbook.
+    Returns
+    -------
+    df : pandas.DataFrame
+        The endpoints.
+    """
+    chunks = list(read_endpoint_chunks(endpoint_path, chunk_size, cache_dir))
+    if not chunks:
+        raise ValueError("`endpoint_path` should have endpoints")
+    # The chunks of a column with booleans and missing values or numbers
+    # can be typed differently, the whole column is typed like a number
+    return pd.concat(chunks).astype(unified_dtypes(chunks))
+
+
+def _endpoint_chunks(endpoint_path, chunk_size, cache_dir):
+    """
+    Yields the chunks of the endpoints, from the columnar copy if it is up
+    to date, else from the workbook while the copy is written.
+    Parameters
+    ----------
+    endpoint_path : str
+        The path to the raw workbook.
+    chunk_size : int
+        The number of endpoints per chunk.
+    cache_dir : Path
+        The folder of the columnar copy.
+    Returns
+    -------
+    chunks : generator
+        The dataframes of the endpoints.
+    """
+    digest = hashlib.sha256()
+    with open(endpoint_path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    version = digest.hexdigest()
+
+    # The version is written once all the parts are, so that an
+    # interrupted conversion is not used
+    version_path = cache_dir / "sha256"
+    if version_path.exists() and version_path.read_text() == version:
+        pending = None
+        for part_path in sorted(cache_dir.glob("part-*.parquet")):
+            part = _read_part(str(part_path))
+            if pending is not None:
+                dtypes = unified_dtypes([pending, part])
+                part = pd.concat([pending.astype(dtypes), part.astype(dtypes)])
+            while len(part) >= chunk_size:
+                yield part.iloc[:chunk_size]
+                part = part.iloc[chunk_size:]
+            pending = part if len(part) else None
+        if pending is not None:
+            yield pending
+        return
+
+    if cache_dir.exists():
+        shutil.rmtree(cache_dir)
+    cache_dir.mkdir(parents=True)
+    for i, chunk in enumerate(_workbook_chunks(endpoint_path, chunk_size)):
+        part_path = str(cache_dir / f"part-{i:05d}.parquet")
+        chunk.index.name = "row"
+        write_artifact(chunk.reset_index(), part_path)
+        # the chunks are read from the part, like in the later reads
+        yield _read_part(part_path)
+    version_path.write_text(version)
+
+
+def _read_part(part_path):
+    """
+    Reads a part of the columnar copy.
+    Parameters
+    ----------
+    part_path : str
+        The path to the part.
+    Returns
+    -------
+    chunk : pandas.DataFrame
+        The endpoints of the part, indexed by their row.
+    """
+    chunk = read_artifact(part_path).set_index("row")
+    chunk.index.name = None
+    return chunk
+
+
+def _workbook_chunks(endpoint_path, chunk_size):
+    """
+    Reads the Core_Endpoint sheet row by row, with the cell conversions
+    of `pd.read_excel`, and yields typed chunks of its rows.
+    Parameters
+    ----------
+    endpoint_path : str
+        The path to the raw workbook.
+    chunk_size : int
+        The number of endpoints per chunk.
+    Returns
+    -------
+    chunks : generator
+        The dataframes of the endpoints.
+    """
+    workbook = load_workbook(endpoint_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[endpoint_sheet]
+        # The dimensions saved in the workbook may be wrong
+        sheet.reset_dimensions()
+        rows = sheet.iter_rows(max_col=endpoint_columns, values_only=True)
+        header = [_convert_cell(value) for value in next(rows)]
+        header = [renamed_columns.get(name, name) for name in header]
+
+        chunk = []
+        empty_rows = []
+        start = 0
+        for row in rows:
+            row = [_convert_cell(value) for value in row]
+            # The empty rows are only kept before other rows
+            if all(value == "" for value in row):
+                empty_rows.append(row)
+                continue
+            chunk.extend(empty_rows)
+            empty_rows = []
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield _typed_chunk(chunk[:chunk_size], header, start)
+                start += chunk_size
+                chunk = chunk[chunk_size:]
+        if chunk:
+            yield _typed_chunk(chunk, header, start)
+    finally:
+        workbook.close()
+
+
+def _convert_cell(value):
+    """
+    Converts a cell value like `pd.read_excel`: the empty cells are
+    empty strings and the integral floats are integers.
+    Parameters
+    ----------
+    value : object
+        The value of the cell.
+    Returns
+    -------
+    value : object
+        The converted value.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _typed_chunk(rows, header, start):
+    """
+    Types the rows of a chunk with the parser of `pd.read_excel`.
+    Parameters
+    ----------
+    rows : list
+        The converted cells of the rows.
+    header : list
+        The names of the columns.
+    start : int
+        The position of the first row after the header.
+    Returns
+    -------
+    chunk : pandas.DataFrame
+        The typed chunk.
+    """
+    chunk = TextParser(rows, names=header, header=None,
+                       skip_blank_lines=False).read()
+    chunk.index = pd.RangeIndex(start, start + len(chunk))
+    return chunk
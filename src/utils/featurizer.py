@@ -0,0 +1,149 @@
+from utils.country_n_cat_featuring import (category_values, encode_categories,
+                                           load_country_metrics, lookup_country,
+                                           map_endpoint_features,
+                                           map_server_name)
+from utils.security_test_feat_creation import (encode_security_tests,
+                                               security_test_values)
+from numpy import NaN
+import hashlib
+import pandas as pd
+
+# The file name of the featurizer saved next to the model
+featurizer_file = "featurizer.joblib"
+
+
+class Featurizer:
+    """
+    Creates the country, category, authentication, usage base, server name
+    and security test features of the endpoints. The NRI score imputation
+    mean and the category and security test vocabularies are learned once
+    by `fit`, so that `transform` encodes the test set or a batch to
+    predict with the columns of the training data and without refitting.
+    They can also be learned chunk by chunk with `partial_fit`, for
+    training endpoints that do not fit in memory.
+    The country table is kept with the featurizer, which is pickled with
+    joblib next to the model.
+    Parameters
+    ----------
+    input_path_country : str
+        The path to the file containing the country information
+    """
+
+    def __init__(self, input_path_country):
+        if not isinstance(input_path_country, str):
+            raise TypeError("`input_path_country` should be a string")
+        self.input_path_country = input_path_country
+        self.country_metric_df = None
+
+    def fit(self, df):
+        """
+        Learn the NRI score mean and the vocabularies of the endpoints.
+        Parameters
+        ----------
+        df : Pandas Dataframe
+            The training endpoints
+        Returns
+        -------
+        self : Featurizer
+            The fitted featurizer
+        """
+        self.country_metric_df = None
+        return self.partial_fit(df)
+
+    def partial_fit(self, df):
+        """
+        Learn the NRI score mean and the vocabularies of a chunk of the
+        endpoints, in addition to the chunks given since the last `fit`.
+        Only the sum and count of the NRI scores and the vocabularies
+        are kept between the chunks.
+        Parameters
+        ----------
+        df : Pandas Dataframe
+            A chunk of the training endpoints
+        Returns
+        -------
+        self : Featurizer
+            The featurizer fitted on the chunks
+        """
+        if not isinstance(df, pd.DataFrame):
+            raise TypeError("`df` should be a valid Pandas DataFrame")
+        if self.country_metric_df is None:
+            self.country_metric_df = load_country_metrics(
+                self.input_path_country)
+            self._nri_sum = 0.0
+            self._nri_count = 0
+            self.categories = []
+            self.test_categories = []
+        nri_score = lookup_country(df, self.country_metric_df)["NRI score"]
+        self._nri_sum += nri_score.sum()
+        self._nri_count += nri_score.count()
+        self.nri_mean = (self._nri_sum / self._nri_count
+                         if self._nri_count else NaN)
+        # the vocabularies are kept sorted, a missing category last
+        self.categories = category_values(pd.Series(
+            self.categories + category_values(df["category"]), dtype=object))
+        self.test_categories = sorted(set(self.test_categories).union(
+            security_test_values(df["security_test_category"])))
+        return self
+
+    def transform(self, df):
+        """
+        Add the features to the endpoints, keeping their index and rows.
+        Parameters
+        ----------
+        df : Pandas Dataframe
+            The endpoints
+        Returns
+        -------
+        featurized_df : Pandas Dataframe
+            The endpoints with the features, in the columns of the
+            training endpoints
+        """
+        if not isinstance(df, pd.DataFrame):
+            raise TypeError("`df` should be a valid Pandas DataFrame")
+        if self.country_metric_df is None:
+            raise ValueError("The featurizer should be fitted before `transform`")
+        df = lookup_country(df, self.country_metric_df)
+        df["NRI score"] = df["NRI score"].fillna(self.nri_mean)
+        df = map_endpoint_features(df)
+        df = encode_categories(df, self.categories)
+        df = map_server_name(df)
+        return encode_security_tests(df, self.test_categories)
+
+    def fingerprint(self):
+        """
+        Identify what the fitted featurizer does, to key its outputs in a
+        cache: the NRI score mean, the vocabularies and the hash of the
+        country file. Unlike the pickle of the featurizer, it does not
+        change with the way it was fitted or the loading of the country
+        table.
+        Returns
+        -------
+        fingerprint : tuple
+            The NRI score mean, the category and security test
+            vocabularies, with None for a missing category, and the
+            sha256 hex digest of the country file
+        """
+        if self.country_metric_df is None:
+            raise ValueError("The featurizer should be fitted before `fingerprint`")
+        with open(self.input_path_country, "rb") as file:
+            country_hash = hashlib.sha256(file.read()).hexdigest()
+        return (float(self.nri_mean),
+                [None if pd.isna(category) else category
+                 for category in self.categories],
+                list(self.test_categories),
+                country_hash)
+
+    def fit_transform(self, df):
+        """
+        Fit the featurizer on the endpoints and add their features.
+        Parameters
+        ----------
+        df : Pandas Dataframe
+            The training endpoints
+        Returns
+        -------
+        featurized_df : Pandas Dataframe
+            The endpoints with the features
+        """
+        return self.fit(df).transform(df)
@@ -0,0 +1,75 @@
+from functools import lru_cache
+import ast
+import json
+
+# The number of distinct strings whose parsed value is kept
+max_entries = 100000
+
+
+def parse_literal(text):
+    """
+    Safely parses a json or Python literal string, like a response
+    metadata or parameters cell. The strings are parsed as json first,
+    then as a Python literal, and never evaluated as code. The parsed
+    values are memoized on the raw string and shared between the calls,
+    so they should not be modified.
+    Parameters
+    ----------
+    text : str
+        The string to be parsed.
+    Returns
+    -------
+    value : object
+        The parsed value.
+    """
+    if not isinstance(text, str):
+        raise TypeError("`text` should be a string")
+    return _parse(text)
+
+
+def parser_stats():
+    """
+    Reports the usage of the memo of `parse_literal`.
+    Returns
+    -------
+    stats : dict
+        The hits, misses, hit rate and number of entries.
+    """
+    info = _parse.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_rate": info.hits / lookups if lookups else 0.0,
+        "entries": info.currsize,
+    }
+
+
+def clear_parser_cache():
+    """
+    Empties the memo of `parse_literal` and resets its statistics.
+    """
+    _parse.cache_clear()
+
+
+@lru_cache(maxsize=max_entries)
+def _parse(text):
+    """
+    Parses a string as json, then as a Python literal.
+    Parameters
+    ----------
+    text : str
+        The string to be parsed.
+    Returns
+    -------
+    value : object
+        The parsed value.
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        raise ValueError("`text` should be a json or Python literal")
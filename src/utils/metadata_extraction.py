@@ -1,9 +1,90 @@
 from docopt import docopt
 from numpy import NaN
+from pathlib import Path
+from utils.literal_parser import parse_literal
+import numpy as np
 import pandas as pd
+import re
 
 
-def extract_metadata(df):
+# the header rules: for each high risk security header, the rule type and
+# its pattern. 0 IS GOOD, 1 IS BAD, and a header that is not present is 0
+# - contains: 0 if the value contains the pattern, else 1
+# - regex: 0 if the value matches the regex pattern, else 1
+# - absent: the header is not recommended, 1 if present
+# - present: the header is good to be present, 0 if present
+header_rules_path = str(Path(__file__).resolve().parents[2] /
+                        "config" / "header_rules.csv")
+header_rule_types = ["contains", "regex", "absent", "present"]
+
+
+def load_header_rules(path=header_rules_path):
+    '''
+    Load the header rules table and compile each rule once.
+
+    Parameters:
+    -----------
+    path: str
+        The path to a csv file with header, rule and pattern columns
+
+    Returns:
+    --------
+    dict
+        The compiled rule of each header, in the order of the file.
+        A compiled rule maps a Series of header values to 0 and 1
+
+    '''
+    if not isinstance(path, str):
+        raise TypeError("`path` should be a string")
+    table = pd.read_csv(path, dtype=str, keep_default_na=False)
+    if list(table.columns) != ["header", "rule", "pattern"]:
+        raise ValueError("`path` should have header, rule and pattern columns")
+
+    rules = {}
+    for header, rule, pattern in table.itertuples(index=False):
+        header = header.strip().lower()
+        if header in rules:
+            raise ValueError(f"The header rule of {header} is duplicated")
+        if rule not in header_rule_types:
+            raise ValueError("The rule type should be one of " +
+                             ", ".join(header_rule_types) + f", got {rule}")
+        if rule in ("contains", "regex") and not pattern:
+            raise ValueError(f"The {rule} rule of {header} needs a pattern")
+        rules[header] = _compile_rule(rule, pattern)
+    return rules
+
+
+def _compile_rule(rule, pattern):
+    '''
+    Compile a header rule into a vectorized function.
+
+    Parameters:
+    -----------
+    rule: str
+        The rule type
+    pattern: str
+        The expected pattern of the contains and regex rules
+
+    Returns:
+    --------
+    function
+        The function mapping a Series of header values to 0 and 1
+
+    '''
+    if rule == "regex":
+        pattern = re.compile(pattern)
+
+    def apply_rule(values):
+        if rule in ("contains", "regex"):
+            followed = values.astype(str).str.contains(
+                pattern, regex=rule == "regex")
+            return np.where(followed, 0, 1)
+        return np.full(len(values), 1 if rule == "absent" else 0)
+
+    return apply_rule
+
+
+def extract_metadata(df, header_rules=None):
     '''
     Extract metadata features from the sample response.
 
@@ -11,6 +92,9 @@ def extract_metadata(df):
     -----------
     df: pandas.DataFrame
         The dataframe to be processed
+    header_rules: dict
+        The compiled header rules of `load_header_rules`,
+        by default the ones of `header_rules_path`
 
     Returns:
     --------
@@ -21,107 +105,41 @@ def extract_metadata(df):
     # Check if the df is valid
     if not isinstance(df, pd.DataFrame):
         raise TypeError("`df` should be a valid Pandas DataFrame")
+    if header_rules is None:
+        header_rules = load_header_rules()
 
     # fill missing values with {}
     df["response_metadata"] = df["response_metadata"].fillna("{}")
     df["parameters"] = df["parameters"].fillna("{}")
 
-    # list of columns that have high risk security
-    high_risk_security_headers = [
-        'x-frame-options',
-        'x-xss-protection',
-        'strict-transport-security',
-        'expect-ct',
-        'referrer-policy',
-        'content-type',
-        'set-cookie',
-        'access-control-allow-origin',
-        'server',
-        'x-powered-by',
-        'x-aspnet-version',
-        'x-ratelimit-limit'
-    ]
-
-    # loop through api_df and add columns in high_risk_security_headers
-    for header in high_risk_security_headers:
-        df[header] = NaN
-    # create new column metadata_fields_count and set to 0
-    df["metadata_fields_count"] = 0
-    df["parameters_count"] = 0
-
-    # loop through sample_response see the key match with high_risk_security_headers
-    for i in range(len(df)):
-        meta_count = 0
-        sample_response_dict = eval(df['response_metadata'].iloc[i])
-        if df['response_metadata'].iloc[i] is not None:
-            # convert sample_response to dictionary
-            sample_response_dict = eval(df['response_metadata'].iloc[i])
-            # loop through sample_response_dict and extract key value
-            for key, value in sample_response_dict.items():
-                if key.lower() in high_risk_security_headers:
-                    df.loc[df.index[i], key.lower()] = value
-                    meta_count += 1
-        df.loc[df.index[i],"metadata_fields_count"] = meta_count
-        df.loc[df.index[i], "parameters_count"] = len(
-            eval(df['parameters'].iloc[i]))
-
-    # recommend rule for each high risk security header
-    # to make it simple, if the header is not present, it is considered as not secure
-    x_frame_options = 'DENY'
-    x_xss_protection = '0'
-    strict_transport_security = 'includeSubDomains'
-    expect_ct = 'max-age'
-    referrer_policy = 'strict-origin-when-cross-origin'
-    content_type = 'charset'
-    set_cookie = 'Secure'
-    access_control_allow_origin = 'https'
-    # make a dictionary to store the recommended rule
-    recommend_dict = {
-        'x-frame-options': x_frame_options,
-        'x-xss-protection': x_xss_protection,
-        'strict-transport-security': strict_transport_security,
-        'expect-ct': expect_ct,
-        'referrer-policy': referrer_policy,
-        'content-type': content_type,
-        'set-cookie': set_cookie,
-        'access-control-allow-origin': access_control_allow_origin
-    }
-
-    # the following headers are not recommended
-    should_not_be_present = ['server',
-                            'x-powered-by',
-                            'x-aspnet-version']
-    good_to_be_present = ['x-ratelimit-limit']
-
-    # loop through each row of api_df
-    # to find if the recommended rule is present
-    for i in range(len(df)):
-        # loop through recommend_dict
-        for key, value in recommend_dict.items():
-            if pd.notnull(df[key].iloc[i]):
-                # if the cell contain the value in recommend_dict, then assign the value 0, else assign 1
-                # 0 IS GOOD, 1 IS BAD
-                df.loc[df.index[i], key] = 0 if value in df[key].iloc[i] else 1
-
-    # loop through each row of api_df
-    for i in range(len(df)):
-        # loop through should_not_be_present
-        for field in should_not_be_present:
-            # check if the cell is not NaN
-            if not pd.isna(df[field].iloc[i]):
-                # if the cell contain value, then assign the value 1
-                df.loc[df.index[i], field] = 1
-        # loop through good_to_be_present
-        for field in good_to_be_present:
-            # check if the cell is not NaN
-            if not pd.isna(df[field].iloc[i]):
-                # if the cell contain value, then assign the value 0
-                df.loc[df.index[i], field] = 0
-
-    # Fill the NaN in high_risk_security_headers with 0
-    for header in high_risk_security_headers:
-        df[header] = df[header].fillna(0)
+    # parse each row once, the last value of a header wins. The identical
+    # strings shared by many endpoints are only parsed once
+    headers = {header: [NaN] * len(df) for header in header_rules}
+    metadata_fields_count = np.zeros(len(df), dtype="int64")
+    parameters_count = np.zeros(len(df), dtype="int64")
+    for i, (metadata, parameters) in enumerate(
+            zip(df["response_metadata"], df["parameters"])):
+        for key, value in parse_literal(metadata).items():
+            column = headers.get(key.lower())
+            if column is not None:
+                column[i] = value
+                metadata_fields_count[i] += 1
+        parameters_count[i] = len(parse_literal(parameters))
+
+    # apply the rule of each header to the values that are present
+    for header, values in headers.items():
+        values = pd.Series(values, index=df.index, dtype="object")
+        present = values.notna()
+        if not present.any():
+            # the header is never present
+            df[header] = 0.0
+            continue
+        column = np.zeros(len(df), dtype="int64")
+        column[present.to_numpy()] = header_rules[header](values[present])
+        df[header] = column
+    df["metadata_fields_count"] = metadata_fields_count
+    df["parameters_count"] = parameters_count
 
     df = df.drop_duplicates()
 
-    return df
\ No newline at end of file
+    return df
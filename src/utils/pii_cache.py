@@ -0,0 +1,156 @@
+import hashlib
+import json
+import sqlite3
+
+
+def cache_key(text, entities, version, *params):
+    """
+    Builds the content-addressed key of a PII extraction result.
+    Parameters
+    ----------
+    text : str
+        The analyzed text.
+    entities : list
+        The entities looked for.
+    version : str
+        The version of the analyzer and its NLP model.
+    params : tuple
+        Any other parameter the result depends on.
+    Returns
+    -------
+    key : str
+        The sha256 hex digest of the inputs.
+    """
+    content = json.dumps([str(text), sorted(entities), version, list(params)])
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class PiiCache:
+    """
+    On-disk cache of PII extraction results backed by SQLite.
+    The least recently used entries are evicted once the cache
+    holds more than `max_entries` results.
+    Parameters
+    ----------
+    path : str
+        The path to the SQLite file.
+    max_entries : int
+        The maximum number of results kept in the cache.
+    """
+
+    def __init__(self, path, max_entries=1000000):
+        if not isinstance(path, str):
+            raise TypeError("`path` should be a string")
+        if not isinstance(max_entries, int) or isinstance(max_entries, bool):
+            raise TypeError("`max_entries` should be an integer")
+        if max_entries < 1:
+            raise ValueError("`max_entries` should be positive")
+
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._connection = sqlite3.connect(path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS pii_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "last_access INTEGER NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS pii_cache_last_access "
+            "ON pii_cache (last_access)"
+        )
+        self._connection.commit()
+        # Access counter used to order the entries for the eviction
+        self._clock = self._connection.execute(
+            "SELECT COALESCE(MAX(last_access), 0) FROM pii_cache"
+        ).fetchone()[0]
+
+    def __len__(self):
+        return self._connection.execute(
+            "SELECT COUNT(*) FROM pii_cache").fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get_many(self, keys):
+        """
+        Looks up the results of the given keys.
+        Parameters
+        ----------
+        keys : list
+            The keys to be looked up.
+        Returns
+        -------
+        found : dict
+            A dictionary mapping the keys found to their result.
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        # Stay below the SQLite limit of variables per statement
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self._connection.execute(
+                "SELECT key, value FROM pii_cache WHERE key IN (%s)"
+                % ",".join("?" * len(chunk)), chunk
+            ).fetchall()
+            for key, value in rows:
+                found[key] = json.loads(value)
+        self._clock += 1
+        self._connection.executemany(
+            "UPDATE pii_cache SET last_access = ? WHERE key = ?",
+            [(self._clock, key) for key in found]
+        )
+        self._connection.commit()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, results):
+        """
+        Stores results in the cache and evicts the least recently used.
+        Parameters
+        ----------
+        results : dict
+            A dictionary mapping keys to json serializable results.
+        """
+        self._clock += 1
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO pii_cache (key, value, last_access) "
+            "VALUES (?, ?, ?)",
+            [(key, json.dumps(value), self._clock)
+             for key, value in results.items()]
+        )
+        overflow = len(self) - self.max_entries
+        if overflow > 0:
+            self._connection.execute(
+                "DELETE FROM pii_cache WHERE key IN ("
+                "SELECT key FROM pii_cache ORDER BY last_access LIMIT ?)",
+                (overflow,)
+            )
+        self._connection.commit()
+
+    def stats(self):
+        """
+        Reports the usage of the cache.
+        Returns
+        -------
+        stats : dict
+            The hits, misses, hit rate and number of entries.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+        }
+
+    def close(self):
+        """
+        Closes the connection to the SQLite file.
+        """
+        self._connection.close()
@@ -1,10 +1,58 @@
-from presidio_analyzer import AnalyzerEngine
-from bs4 import BeautifulSoup
+from bisect import bisect_right
+from collections import namedtuple
+from copy import copy
+from importlib.metadata import PackageNotFoundError, version
+from lxml import etree, html
+from multiprocessing import Pool
+from utils.pii_cache import cache_key
+from utils.pii_schema import infer_key_entities, key_inference_version, schema_fingerprint
 import json
+import os
+import pandas as pd
+import re
+import time
 
-# Set up the engine, loads the NLP module (spaCy model by default)
-# and other PII recognizers
-analyzer = AnalyzerEngine()
+# The NLP configuration of the engine profiles:
+# - accurate: the large spaCy model with its full pipeline
+# - fast: the small spaCy model without the parser. The lemmatizer is
+#   kept since the context words that raise the scores of the pattern
+#   recognizers (e.g. "itin" for US_ITIN) are matched on the lemmas
+# - regex-only: only the pattern recognizers, the spaCy pipeline is
+#   reduced to its tokenizer, the NER entities are never found and the
+#   scores are not raised by the context words
+profiles = {
+    "accurate": {"model": "en_core_web_lg", "disable": [], "ner": True},
+    "fast": {"model": "en_core_web_sm",
+             "disable": ["parser"],
+             "ner": True},
+    "regex-only": {"model": "en_core_web_sm",
+                   "disable": ["tok2vec", "tagger", "parser", "senter",
+                               "attribute_ruler", "lemmatizer", "ner"],
+                   "ner": False},
+}
+# The json leaves of a response are analyzed together, in documents of
+# at most `max_document_length` characters separated by `leaf_separator`
+max_document_length = 100000
+leaf_separator = "\n\n"
+# The number of documents the spaCy pipeline processes at a time
+nlp_batch_size = 32
+# The number of documents of a response analyzed before its flags are
+# checked again by `early_exit`
+early_exit_batch_size = 1
+# Matches the tags of a html or xml text
+_tag_pattern = re.compile(r"<[A-Za-z!?/][^>]*>")
+# The result of the combined PII and FII scan, `sampled` tells if only
+# part of the response was analyzed
+PiiFlags = namedtuple("PiiFlags", ["is_pii", "is_fii", "sampled"])
+# The engine is set up on first use by `get_analyzer`, since loading
+# the NLP module (spaCy model by default) takes several seconds
+_profile = "accurate"
+_analyzer = None
+# The profile the engine was set up with, None if it was replaced
+_analyzer_profile = None
+# The error of the set up of the engine in a worker process, raised
+# by the chunks sent to it
+_worker_error = None
 pii = [
     "PERSON",
     "LOCATION",
@@ -16,6 +64,83 @@ pii = [
 fii = ["CREDIT_CARD", "CRYPTO", "IBAN_CODE", "US_BANK_NUMBER", "US_ITIN", "US_SSN"]
 
 
+def get_analyzer():
+    """
+    Returns the analyzer engine, setting it up on first use.
+    Returns
+    -------
+    analyzer : AnalyzerEngine
+        The engine with the NLP module and the PII recognizers loaded.
+    """
+    global _analyzer, _analyzer_profile
+    if _analyzer is None:
+        _analyzer = _create_analyzer(_profile)
+        _analyzer_profile = _profile
+    return _analyzer
+
+
+def set_analyzer(analyzer):
+    """
+    Replaces the analyzer engine used by the extraction.
+    Parameters
+    ----------
+    analyzer : AnalyzerEngine
+        The engine to be used, or None to set up the engine of the
+        current profile on next use.
+    """
+    global _analyzer, _analyzer_profile
+    _analyzer = analyzer
+    _analyzer_profile = None
+
+
+def set_profile(profile):
+    """
+    Selects the profile of the analyzer engine.
+    Parameters
+    ----------
+    profile : str
+        The profile, either 'accurate', 'fast' or 'regex-only'.
+    """
+    global _profile
+    if not isinstance(profile, str):
+        raise TypeError("`profile` should be a string")
+    if profile not in profiles:
+        raise ValueError("`profile` should be one of " + ", ".join(profiles))
+    if profile != _profile:
+        _profile = profile
+        set_analyzer(None)
+
+
+def _create_analyzer(profile):
+    """
+    Sets up the analyzer engine of a profile.
+    Parameters
+    ----------
+    profile : str
+        The profile of the engine.
+    Returns
+    -------
+    analyzer : AnalyzerEngine
+        The engine with the NLP module and the PII recognizers loaded.
+    """
+    from presidio_analyzer import AnalyzerEngine
+    from presidio_analyzer.nlp_engine import NlpEngineProvider
+
+    config = profiles[profile]
+    provider = NlpEngineProvider(nlp_configuration={
+        "nlp_engine_name": "spacy",
+        "models": [{"lang_code": "en", "model_name": config["model"]}],
+    })
+    analyzer = AnalyzerEngine(nlp_engine=provider.create_engine(),
+                              supported_languages=["en"])
+    for nlp in analyzer.nlp_engine.nlp.values():
+        nlp.select_pipes(disable=[pipe for pipe in nlp.pipe_names
+                                  if pipe in config["disable"]])
+    if not config["ner"]:
+        analyzer.registry.remove_recognizer("SpacyRecognizer")
+    return analyzer
+
+
 def pii_extraction(text, type="pii", conf_threshold=0.5):
     """
     Extracts PII from a text.
@@ -32,6 +157,683 @@ def pii_extraction(text, type="pii", conf_threshold=0.5):
     results : list
         A list containing the extracted PII.
     """
+    return [result for _, result in
+            pii_extraction_with_paths(text, type, conf_threshold)]
+
+
+def pii_extraction_with_paths(text, type="pii", conf_threshold=0.5):
+    """
+    Extracts PII from a text along with the json path it was found at.
+    Parameters
+    ----------
+    text : str
+        The text to be analyzed.
+    type : str
+        The type of PII to be extracted.
+    conf_threshold : float
+        The confidence threshold.
+    Returns
+    -------
+    results : list
+        A list of (path, result) tuples. The path is the tuple of keys
+        and indices of the json leaf, or () if the text is not a json,
+        and the result offsets are relative to the leaf.
+    """
+    _validate_parameters(type, conf_threshold)
+
+    results = []
+    for document, spans in _documents_from_text(text):
+        results += _map_results(
+            _pii_extraction_from_text(document, type, conf_threshold), spans)
+    return results
+
+
+def pii_extraction_batch(texts, type="pii", conf_threshold=0.5):
+    """
+    Extracts PII from a batch of texts.
+    All the texts (or the aggregated leaves of the JSON texts) are sent
+    through the spaCy pipeline in batches of `nlp_batch_size` documents,
+    instead of running the model once per string.
+    Parameters
+    ----------
+    texts : iterable
+        The texts to be analyzed.
+    type : str
+        The type of PII to be extracted.
+    conf_threshold : float
+        The confidence threshold.
+    Returns
+    -------
+    results : list
+        A list containing, for each text, the list of extracted PII.
+    """
+    _validate_parameters(type, conf_threshold)
+    entities = pii if type == "pii" else fii
+
+    # Flatten the texts into the documents to be analyzed and
+    # remember which text each document belongs to
+    texts = list(texts)
+    owners = []
+    documents = []
+    for i, text in enumerate(texts):
+        for document, spans in _documents_from_text(text):
+            owners.append((i, spans))
+            documents.append(document)
+
+    results = [[] for _ in texts]
+    analyzer = get_analyzer()
+    nlp_results = _process_batch(analyzer, documents)
+    for (owner, spans), (document, nlp_artifacts) in zip(owners, nlp_results):
+        analyzed = analyzer.analyze(text=document,
+                                    entities=entities,
+                                    language="en",
+                                    nlp_artifacts=nlp_artifacts)
+        filtered = [result for result in analyzed
+                    if result.score >= conf_threshold]
+        results[owner] += [result for _, result in _map_results(filtered, spans)]
+    return results
+
+
+def pii_fii_extraction(text, conf_threshold=0.5, early_exit=False,
+                       sample_size=None, max_bytes=None):
+    """
+    Checks if a text contains PII and FII in a single scan.
+    Parameters
+    ----------
+    text : str
+        The text to be analyzed.
+    conf_threshold : float
+        The confidence threshold.
+    early_exit : bool
+        Whether to stop the scan once both flags are decided.
+    sample_size : int
+        The number of records analyzed in the json arrays of records with
+        the same keys, or None to analyze every record.
+    max_bytes : int
+        The number of bytes of the text analyzed, or None for no limit.
+    Returns
+    -------
+    flags : PiiFlags
+        A tuple (is_pii, is_fii, sampled) of booleans.
+    """
+    return pii_fii_extraction_batch([text], conf_threshold, early_exit,
+                                    sample_size=sample_size,
+                                    max_bytes=max_bytes)[0]
+
+
+def pii_fii_extraction_batch(texts, conf_threshold=0.5, early_exit=False,
+                             cache=None, n_workers=1, chunk_size=100,
+                             sample_size=None, max_bytes=None,
+                             api_ids=None, schema_cache=None):
+    """
+    Checks if each text of a batch contains PII and FII in a single scan.
+    The texts are parsed once and analyzed with the union of the `pii`
+    and `fii` entities. With `early_exit`, the entities already found in
+    a text are no longer looked for, and the rest of the text is skipped
+    once both flags are decided. With `sample_size` or `max_bytes`, the
+    time spent on large responses is bounded by only analyzing part of
+    them, which is recorded in the `sampled` flag. With `api_ids` and
+    `schema_cache`, the json responses are first classified from the
+    names of their keys and from the flags of the responses of the same
+    api with the same key set.
+    Parameters
+    ----------
+    texts : iterable
+        The texts to be analyzed.
+    conf_threshold : float
+        The confidence threshold.
+    early_exit : bool
+        Whether to stop the scan of a text once both flags are decided.
+    cache : PiiCache
+        The cache of the flags. Only the texts that are not cached
+        are analyzed, each distinct text once.
+    n_workers : int
+        The number of worker processes. Each worker loads its own
+        analyzer once and analyzes the texts by chunks.
+    chunk_size : int
+        The number of texts sent to a worker at a time.
+    sample_size : int
+        The number of records analyzed in the json arrays of records with
+        the same keys, or None to analyze every record.
+    max_bytes : int
+        The number of bytes of each text analyzed, or None for no limit.
+    api_ids : iterable
+        The id of the api of each text.
+    schema_cache : PiiCache
+        The cache of the flags per api and json key set. The responses
+        of a key set already classified are not analyzed, their flags
+        are marked as sampled.
+    Returns
+    -------
+    flags : list
+        A list containing, for each text, a tuple (is_pii, is_fii, sampled).
+    """
+    _validate_conf_threshold(conf_threshold)
+    if not isinstance(early_exit, bool):
+        raise TypeError("`early_exit` should be a boolean")
+    _validate_scan_parameters(n_workers, chunk_size, sample_size, max_bytes)
+
+    scan_params = (conf_threshold, early_exit, sample_size, max_bytes)
+
+    def extract_with_cache(texts):
+        flags = _extract_with_cache(texts, cache,
+                                    (conf_threshold, sample_size, max_bytes),
+                                    _pii_fii_flags, scan_params,
+                                    n_workers, chunk_size)
+        return [PiiFlags(*flag) for flag in flags]
+
+    texts = [str(text) for text in texts]
+    if schema_cache is not None and api_ids is not None:
+        return _schema_flags(texts, list(api_ids), schema_cache,
+                             conf_threshold, extract_with_cache)
+    return extract_with_cache(texts)
+
+
+def pii_scores_batch(texts, cache=None, n_workers=1, chunk_size=100,
+                     sample_size=None, max_bytes=None):
+    """
+    Computes the highest score of each PII and FII entity in each text.
+    The texts are fully analyzed once, the flags for any confidence
+    threshold or subset of the entities are then derived from the scores
+    with `rethreshold`, without analyzing the texts again.
+    Parameters
+    ----------
+    texts : iterable
+        The texts to be analyzed.
+    cache : PiiCache
+        The cache of the scores. Only the texts that are not cached
+        are analyzed, each distinct text once.
+    n_workers : int
+        The number of worker processes.
+    chunk_size : int
+        The number of texts sent to a worker at a time.
+    sample_size : int
+        The number of records analyzed in the json arrays of records with
+        the same keys, or None to analyze every record.
+    max_bytes : int
+        The number of bytes of each text analyzed, or None for no limit.
+    Returns
+    -------
+    scores : pandas.DataFrame
+        A dataframe with a row per text, a float32 column per entity with
+        its highest score (NaN if it was not found) and a `sampled` column.
+    """
+    _validate_scan_parameters(n_workers, chunk_size, sample_size, max_bytes)
+
+    texts = [str(text) for text in texts]
+    rows = _extract_with_cache(texts, cache, ("scores", sample_size, max_bytes),
+                               _pii_fii_scores, (0, False, sample_size, max_bytes),
+                               n_workers, chunk_size)
+    entities = pii + fii
+    scores = pd.DataFrame([row[:-1] for row in rows], columns=entities,
+                          dtype="float32")
+    scores["sampled"] = [bool(row[-1]) for row in rows]
+    return scores
+
+
+def rethreshold(scores, conf_threshold=0.5, entities=None):
+    """
+    Derives the PII and FII flags from the scores of `pii_scores_batch`.
+    Parameters
+    ----------
+    scores : pandas.DataFrame
+        The scores of the entities of each text.
+    conf_threshold : float
+        The confidence threshold.
+    entities : list
+        The entities taken into account, or None for all of them.
+    Returns
+    -------
+    flags : pandas.DataFrame
+        A dataframe with the `is_pii` and `is_fii` boolean columns,
+        with the index of `scores`.
+    """
+    if not isinstance(scores, pd.DataFrame):
+        raise TypeError("`scores` should be a pandas DataFrame")
+    _validate_conf_threshold(conf_threshold)
+    if entities is None:
+        entities = pii + fii
+    if not isinstance(entities, (list, tuple, set)):
+        raise TypeError("`entities` should be a list")
+    unknown = set(entities) - set(pii + fii)
+    if unknown:
+        raise ValueError("`entities` should only contain PII and FII "
+                         "entities, got " + ", ".join(sorted(unknown)))
+
+    # NaN is never above the threshold, so the missing entities are ignored
+    found = scores[[entity for entity in pii + fii if entity in entities]] \
+        >= conf_threshold
+    return pd.DataFrame({
+        "is_pii": found[[e for e in pii if e in entities]].any(axis=1),
+        "is_fii": found[[e for e in fii if e in entities]].any(axis=1),
+    }, index=scores.index)
+
+
+def analyzer_version():
+    """
+    Identifies the analyzer profile and the NLP models it uses.
+    The engine is not set up for this, the version of the installed
+    model of the profile is used instead.
+    Returns
+    -------
+    version : str
+        The version of presidio, the profile, its disabled pipes and
+        the NLP models.
+    """
+    models = None
+    if _analyzer is None:
+        profile = _profile
+        model = profiles[profile]["model"]
+        try:
+            models = [model + "==" + version(model)]
+        except PackageNotFoundError:
+            # The model is downloaded when the engine is set up
+            pass
+    if models is None:
+        analyzer = get_analyzer()
+        profile = _analyzer_profile or "custom"
+        models = [
+            nlp.meta["lang"] + "_" + nlp.meta["name"] + "==" + nlp.meta["version"]
+            for nlp in analyzer.nlp_engine.nlp.values()
+        ]
+    names = ["presidio-analyzer==" + version("presidio-analyzer"),
+             "profile=" + profile]
+    if profile in profiles:
+        # the results of a profile change with its disabled pipes
+        names.append("disable=" + ",".join(profiles[profile]["disable"]))
+    return ";".join(names + sorted(models))
+
+
+def _schema_flags(texts, api_ids, schema_cache, conf_threshold, extract):
+    """
+    Classifies the json responses from their keys before analyzing them.
+    The responses of an api whose key set is in the cache get the cached
+    flags. Otherwise the flags are inferred from the key names and, if
+    they are not both found, one response per api and key set is analyzed.
+    Parameters
+    ----------
+    texts : list
+        The texts to be analyzed.
+    api_ids : list
+        The id of the api of each text.
+    schema_cache : PiiCache
+        The cache of the flags per api and json key set.
+    conf_threshold : float
+        The confidence threshold.
+    extract : function
+        The function analyzing a list of texts.
+    Returns
+    -------
+    flags : list
+        A list containing, for each text, a tuple (is_pii, is_fii, sampled).
+    """
+    if len(api_ids) != len(texts):
+        raise ValueError("`api_ids` should have one id per text")
+
+    analyzer_id = analyzer_version()
+    # Group the json responses by api and key set
+    groups = {}
+    key_flags = {}
+    others = []
+    for i, (text, api_id) in enumerate(zip(texts, api_ids)):
+        text_format, objs = _sniff_text(text)
+        fingerprint = None
+        # The missing ids (NaN) are not equal to themselves
+        if api_id is not None and api_id == api_id and \
+                text_format == "json" and isinstance(objs, (dict, list)):
+            fingerprint = schema_fingerprint(objs)
+        if fingerprint is None:
+            others.append(i)
+            continue
+        key = cache_key(str(api_id) + ":" + fingerprint, pii + fii,
+                        analyzer_id, conf_threshold, key_inference_version)
+        if key not in groups:
+            groups[key] = []
+            entities = infer_key_entities(objs)
+            key_flags[key] = (any(entity in pii for entity in entities),
+                              any(entity in fii for entity in entities))
+        groups[key].append(i)
+
+    flags = [None] * len(texts)
+    cached = schema_cache.get_many(groups.keys())
+    computed = {}
+    analyzed = list(others)
+    for key, indices in groups.items():
+        if key in cached:
+            is_pii, is_fii = cached[key]
+        elif all(key_flags[key]):
+            is_pii, is_fii = computed[key] = key_flags[key]
+        else:
+            # Analyze the first response of the group for all of them
+            analyzed.append(indices[0])
+            continue
+        for i in indices:
+            flags[i] = PiiFlags(is_pii, is_fii, i != indices[0] or key in cached)
+
+    results = dict(zip(analyzed, extract([texts[i] for i in analyzed])))
+    for i in others:
+        flags[i] = results[i]
+    for key, indices in groups.items():
+        if indices[0] not in results:
+            continue
+        result = results[indices[0]]
+        is_pii = result.is_pii or key_flags[key][0]
+        is_fii = result.is_fii or key_flags[key][1]
+        computed[key] = (is_pii, is_fii)
+        for i in indices:
+            flags[i] = PiiFlags(is_pii, is_fii, i != indices[0] or result.sampled)
+    if computed:
+        schema_cache.set_many(computed)
+    return flags
+
+
+def _extract_with_cache(texts, cache, key_params, function, scan_params,
+                        n_workers, chunk_size):
+    """
+    Scans the texts that are missing from the cache.
+    Parameters
+    ----------
+    texts : list
+        The texts to be analyzed.
+    cache : PiiCache
+        The cache of the results, or None to analyze every text.
+    key_params : tuple
+        The parameters the cached results depend on.
+    function : function
+        The scan function, called with the texts and `scan_params`.
+    scan_params : tuple
+        The parameters of `function` after the texts.
+    n_workers : int
+        The number of worker processes.
+    chunk_size : int
+        The number of texts sent to a worker at a time.
+    Returns
+    -------
+    results : list
+        The result of each text.
+    """
+    def extract(texts):
+        if n_workers > 1:
+            return _scan_parallel(function, texts, scan_params,
+                                  n_workers, chunk_size)
+        return function(texts, *scan_params)
+
+    if cache is None:
+        return extract(texts)
+    analyzer_id = analyzer_version()
+    keys = [cache_key(text, pii + fii, analyzer_id, *key_params)
+            for text in texts]
+    cached = cache.get_many(keys)
+    # Analyze each distinct text missing from the cache once
+    missing = {key: text for key, text in zip(keys, texts)
+               if key not in cached}
+    computed = extract(list(missing.values()))
+    computed = dict(zip(missing.keys(), computed))
+    if computed:
+        cache.set_many(computed)
+    cached.update(computed)
+    return [cached[key] for key in keys]
+
+
+def _scan_parallel(function, texts, scan_params, n_workers, chunk_size):
+    """
+    Scans the texts with a pool of worker processes. The engine is set
+    up in this process first, so that its errors are raised here, and an
+    engine replaced with `set_analyzer` is sent to the workers.
+    Parameters
+    ----------
+    function : function
+        The scan function, called with a chunk of texts and `scan_params`.
+    texts : list
+        The texts to be analyzed.
+    scan_params : tuple
+        The parameters of `function` after the texts.
+    n_workers : int
+        The number of worker processes.
+    chunk_size : int
+        The number of texts sent to a worker at a time.
+    Returns
+    -------
+    results : list
+        The result of each text, in the order of the texts.
+    """
+    if not texts:
+        return []
+    n_workers = min(n_workers, os.cpu_count() or 1)
+    chunks = [(function, texts[start:start + chunk_size]) + scan_params
+              for start in range(0, len(texts), chunk_size)]
+
+    analyzer = get_analyzer()
+    if _analyzer_profile is not None:
+        # the workers set up the engine of the profile themselves
+        analyzer = None
+
+    results = []
+    start_time = time.perf_counter()
+    with Pool(n_workers, initializer=_init_worker,
+              initargs=(_profile, analyzer)) as pool:
+        # imap returns the chunks in the order they were sent
+        for chunk_results in pool.imap(_scan_chunk, chunks):
+            results += chunk_results
+            elapsed = time.perf_counter() - start_time
+            print(f"PII extraction: {len(results)}/{len(texts)} rows "
+                  f"({len(results) / elapsed:.1f} rows/s)")
+    return results
+
+
+def _init_worker(profile, analyzer):
+    """
+    Loads the analyzer once when a worker process starts. An error is
+    kept to be raised by the chunks, since the pool would otherwise
+    restart the failed workers forever.
+    Parameters
+    ----------
+    profile : str
+        The profile of the engine in the parent process.
+    analyzer : AnalyzerEngine
+        The engine of the parent process if it was replaced with
+        `set_analyzer`, else None to set up the engine of the profile.
+    """
+    global _worker_error
+    try:
+        set_profile(profile)
+        if analyzer is None:
+            get_analyzer()
+        else:
+            set_analyzer(analyzer)
+    except Exception as error:
+        _worker_error = error
+
+
+def _scan_chunk(args):
+    """
+    Scans a chunk of texts in a worker process.
+    Parameters
+    ----------
+    args : tuple
+        The scan function, the texts and the parameters of the function.
+    Returns
+    -------
+    results : list
+        The result of each text.
+    """
+    if _worker_error is not None:
+        raise _worker_error
+    function, *params = args
+    return function(*params)
+
+
+def _pii_fii_flags(texts, conf_threshold, early_exit,
+                   sample_size=None, max_bytes=None):
+    """
+    Scans the texts for PII and FII.
+    Parameters
+    ----------
+    texts : list
+        The texts to be analyzed.
+    conf_threshold : float
+        The confidence threshold.
+    early_exit : bool
+        Whether to stop the scan of a text once both flags are decided.
+    sample_size : int
+        The number of records analyzed in the json arrays of records with
+        the same keys, or None to analyze every record.
+    max_bytes : int
+        The number of bytes of each text analyzed, or None for no limit.
+    Returns
+    -------
+    flags : list
+        A list containing, for each text, a tuple (is_pii, is_fii, sampled).
+    """
+    rows = _pii_fii_scores(texts, conf_threshold, early_exit,
+                           sample_size, max_bytes)
+    return [PiiFlags(*_flags_from_scores(row[:-1], conf_threshold), row[-1])
+            for row in rows]
+
+
+def _pii_fii_scores(texts, conf_threshold, early_exit,
+                    sample_size=None, max_bytes=None):
+    """
+    Scans the texts for the highest score of each PII and FII entity.
+    Parameters
+    ----------
+    texts : list
+        The texts to be analyzed.
+    conf_threshold : float
+        The confidence threshold deciding the flags for `early_exit`.
+    early_exit : bool
+        Whether to stop the scan of a text once both flags are decided.
+        The scores of the entities that were no longer looked for are
+        then incomplete.
+    sample_size : int
+        The number of records analyzed in the json arrays of records with
+        the same keys, or None to analyze every record.
+    max_bytes : int
+        The number of bytes of each text analyzed, or None for no limit.
+    Returns
+    -------
+    rows : list
+        A list containing, for each text, the highest score of each entity
+        of `pii + fii` (None if it was not found) followed by the
+        sampled flag.
+    """
+    if not texts:
+        return []
+    entities = pii + fii
+    rows = [[None] * len(entities) + [False] for _ in texts]
+
+    def decided(i):
+        return _flags_from_scores(rows[i][:-1], conf_threshold)
+
+    pending = {}
+    for i, text in enumerate(texts):
+        sampling = None
+        if sample_size is not None or max_bytes is not None:
+            sampling = {"sample_size": sample_size,
+                        "budget": max_bytes,
+                        "sampled": False}
+        pending[i] = _documents_from_text(text, sampling)
+        if sampling is not None:
+            rows[i][-1] = sampling["sampled"]
+
+    # With `early_exit`, the documents are analyzed in rounds of
+    # `early_exit_batch_size` documents of each undecided text, and
+    # the texts decided by a round are not analyzed any further.
+    # The documents of a round are batched through the pipeline
+    analyzer = get_analyzer()
+    while pending:
+        owners = []
+        documents = []
+        for i in list(pending):
+            text_documents = pending.pop(i)
+            if early_exit:
+                pending[i] = text_documents[early_exit_batch_size:]
+                text_documents = text_documents[:early_exit_batch_size]
+                if not pending[i]:
+                    del pending[i]
+            for document, spans in text_documents:
+                owners.append((i, spans))
+                documents.append(document)
+
+        nlp_results = _process_batch(analyzer, documents)
+        for (owner, spans), (document, nlp_artifacts) in zip(owners,
+                                                             nlp_results):
+            scanned = entities
+            if early_exit:
+                is_pii, is_fii = decided(owner)
+                scanned = [entity for entity in entities
+                           if not (is_pii if entity in pii else is_fii)]
+                # An empty list would make the analyzer look for every
+                # entity
+                if not scanned:
+                    continue
+            analyzed = analyzer.analyze(text=document,
+                                        entities=scanned,
+                                        language="en",
+                                        nlp_artifacts=nlp_artifacts)
+            for _, result in _map_results(analyzed, spans):
+                if result.entity_type in entities:
+                    column = entities.index(result.entity_type)
+                    score = rows[owner][column]
+                    if score is None or result.score > score:
+                        rows[owner][column] = result.score
+        for i in list(pending):
+            if all(decided(i)):
+                del pending[i]
+    return rows
+
+
+def _process_batch(analyzer, documents):
+    """
+    Runs the spaCy pipeline of the analyzer on documents, in batches of
+    `nlp_batch_size` documents.
+    Parameters
+    ----------
+    analyzer : AnalyzerEngine
+        The engine, with a spaCy NLP engine.
+    documents : iterable
+        The documents to be processed.
+    Returns
+    -------
+    nlp_results : generator
+        The (document, nlp_artifacts) of each document, to be passed to
+        the `analyze` method of the analyzer.
+    """
+    nlp_engine = analyzer.nlp_engine
+    # _doc_to_nlp_artifact is private, presidio is pinned for it in
+    # requirements.txt and env.yml
+    for doc in nlp_engine.nlp["en"].pipe(documents, batch_size=nlp_batch_size):
+        yield doc.text, nlp_engine._doc_to_nlp_artifact(doc, "en")
+
+
+def _flags_from_scores(scores, conf_threshold):
+    """
+    Derives the PII and FII flags from the scores of the entities.
+    Parameters
+    ----------
+    scores : list
+        The highest score of each entity of `pii + fii`, or None.
+    conf_threshold : float
+        The confidence threshold.
+    Returns
+    -------
+    flags : tuple
+        A tuple (is_pii, is_fii) of booleans.
+    """
+    found = [score is not None and score >= conf_threshold for score in scores]
+    return any(found[:len(pii)]), any(found[len(pii):])
+
+
+def _validate_parameters(type, conf_threshold):
+    """
+    Validates the parameters of the PII extraction.
+    Parameters
+    ----------
+    type : str
+        The type of PII to be extracted.
+    conf_threshold : float
+        The confidence threshold.
+    """
     # Check if the type is valid
     if not isinstance(type, str):
         raise TypeError("`type` should be a string")
@@ -39,6 +841,41 @@ def pii_extraction(text, type="pii", conf_threshold=0.5):
     if type != "pii" and type != "fii":
         raise ValueError("`type` should be either 'pii' or 'fii'")
 
+    _validate_conf_threshold(conf_threshold)
+
+
+def _validate_scan_parameters(n_workers, chunk_size, sample_size, max_bytes):
+    """
+    Validates the parameters of the batch scans.
+    Parameters
+    ----------
+    n_workers : int
+        The number of worker processes.
+    chunk_size : int
+        The number of texts sent to a worker at a time.
+    sample_size : int
+        The number of records analyzed per array of records, or None.
+    max_bytes : int
+        The number of bytes of each text analyzed, or None.
+    """
+    for name, value in [("n_workers", n_workers), ("chunk_size", chunk_size),
+                        ("sample_size", sample_size), ("max_bytes", max_bytes)]:
+        if value is None and name in ("sample_size", "max_bytes"):
+            continue
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise TypeError(f"`{name}` should be an integer")
+        if value < 1:
+            raise ValueError(f"`{name}` should be positive")
+
+
+def _validate_conf_threshold(conf_threshold):
+    """
+    Validates the confidence threshold.
+    Parameters
+    ----------
+    conf_threshold : float
+        The confidence threshold.
+    """
     # Check if the confidence threshold is valid
     if not isinstance(conf_threshold, float) and not isinstance(conf_threshold, int):
         raise TypeError("`conf_threshold` should be either integer or float")
@@ -46,20 +883,182 @@ def pii_extraction(text, type="pii", conf_threshold=0.5):
     if conf_threshold < 0 or conf_threshold > 1:
         raise ValueError("`conf_threshold` should be between 0 and 1")
 
-    results = []
-    text = str(text)
-    # Check if the text is html or xml
-    if bool(BeautifulSoup(text, "html.parser").find()):
-        html = BeautifulSoup(text, "html.parser").text
-        results += _pii_extraction_from_text(html, type, conf_threshold)
+
+def _documents_from_text(text, sampling=None):
+    """
+    Splits a text into the documents to be analyzed.
+    Parameters
+    ----------
+    text : str
+        The text to be split.
+    sampling : dict
+        The sampling state, see `_json_leaves`. Texts longer than the
+        byte budget are truncated.
+    Returns
+    -------
+    documents : list
+        A list of (document, spans) tuples: the html text, the aggregated
+        leaves of the json with their spans or the plain text. The spans
+        are None if the document is not made of json leaves.
+    """
+    text_format, content = _sniff_text(str(text))
+    if text_format == "json":
+        return _aggregate_leaves(_json_leaves(content, (), sampling))
+    return [(_truncate(content, sampling), None)]
+
+
+def _sniff_text(text):
+    """
+    Detects the format of a text from its first characters and parses it.
+    Parameters
+    ----------
+    text : str
+        The text to be parsed.
+    Returns
+    -------
+    text_format : str
+        Either 'json', 'html' (html or xml) or 'text'.
+    content : object
+        The parsed json, the text of the html or the plain text.
+    """
+    start = text.lstrip("\ufeff \t\r\n")[:1]
     # Check if the text is json
-    elif _validateJSON(text):
-        texts = json.loads(text)
-        results += _pii_extraction_from_json(texts, type, conf_threshold)
+    if start in ("{", "["):
+        try:
+            return "json", json.loads(text)
+        except ValueError:
+            pass
+    # Check if the text is html or xml
+    if start == "<" or _tag_pattern.search(text):
+        content = _html_text(text)
+        if content is not None:
+            return "html", content
     # Check if the text is plain text
-    else:
-        results += _pii_extraction_from_text(text, type, conf_threshold)
-    return results
+    return "text", text
+
+
+def _html_text(text):
+    """
+    Extracts the text of a html or xml document, without the content
+    of its script and style elements.
+    Parameters
+    ----------
+    text : str
+        The html or xml document.
+    Returns
+    -------
+    content : str
+        The text of the document, or None if it cannot be parsed.
+    """
+    try:
+        try:
+            root = html.fromstring(text)
+        except ValueError:
+            # Strings with an xml encoding declaration must be parsed as bytes
+            root = html.fromstring(text.encode("utf-8"))
+    except (etree.ParserError, ValueError):
+        return None
+    etree.strip_elements(root, "script", "style", etree.Comment,
+                         with_tail=False)
+    return root.text_content()
+
+
+def _truncate(text, sampling):
+    """
+    Truncates a text to the byte budget of the sampling.
+    Parameters
+    ----------
+    text : str
+        The text to be truncated.
+    sampling : dict
+        The sampling state, see `_json_leaves`.
+    Returns
+    -------
+    text : str
+        The text, truncated if it is longer than the budget.
+    """
+    if sampling is None or sampling["budget"] is None:
+        return text
+    encoded = text.encode("utf-8")
+    if len(encoded) <= sampling["budget"]:
+        return text
+    sampling["sampled"] = True
+    return encoded[:sampling["budget"]].decode("utf-8", errors="ignore")
+
+
+def _aggregate_leaves(leaves):
+    """
+    Aggregates json leaves into a few large documents.
+    Each distinct leaf value is only added once.
+    Parameters
+    ----------
+    leaves : list
+        A list of (path, leaf) tuples.
+    Returns
+    -------
+    documents : list
+        A list of (document, spans) tuples. The spans are the
+        (start, end, paths) of each leaf value in the document.
+    """
+    # Group the paths of the repeated leaf values
+    paths = {}
+    for path, leaf in leaves:
+        paths.setdefault(leaf, []).append(path)
+
+    documents = []
+    parts = []
+    spans = []
+    length = 0
+    for leaf, leaf_paths in paths.items():
+        if parts:
+            if length + len(leaf_separator) + len(leaf) > max_document_length:
+                documents.append((leaf_separator.join(parts), spans))
+                parts, spans, length = [], [], 0
+            else:
+                length += len(leaf_separator)
+        spans.append((length, length + len(leaf), leaf_paths))
+        parts.append(leaf)
+        length += len(leaf)
+    if parts:
+        documents.append((leaf_separator.join(parts), spans))
+    return documents
+
+
+def _map_results(results, spans):
+    """
+    Maps the results on a document back to the json leaves.
+    Parameters
+    ----------
+    results : list
+        The results on the document.
+    spans : list
+        The (start, end, paths) of the leaves in the document, or None
+        if the document is not made of json leaves.
+    Returns
+    -------
+    mapped_results : list
+        A list of (path, result) tuples, with one result per path of
+        the leaf and the result offsets relative to the leaf.
+    """
+    if spans is None:
+        return [((), result) for result in results]
+
+    starts = [start for start, _, _ in spans]
+    mapped_results = []
+    for result in results:
+        i = bisect_right(starts, result.start) - 1
+        if i < 0:
+            continue
+        start, end, paths = spans[i]
+        # Skip the results found on a separator
+        if result.start >= end:
+            continue
+        leaf_result = copy(result)
+        leaf_result.start = result.start - start
+        leaf_result.end = min(result.end, end) - start
+        for path in paths:
+            mapped_results.append((path, leaf_result))
+    return mapped_results
 
 
 def _pii_extraction_from_text(text, type="pii", conf_threshold=0.5):
@@ -81,9 +1080,9 @@ def _pii_extraction_from_text(text, type="pii", conf_threshold=0.5):
     filtered_results = []
 
     if type == "pii":
-        results = analyzer.analyze(text=text, entities=pii, language="en")
+        results = get_analyzer().analyze(text=text, entities=pii, language="en")
     else:
-        results = analyzer.analyze(text=text, entities=fii, language="en")
+        results = get_analyzer().analyze(text=text, entities=fii, language="en")
 
     for result in results:
         if result.score >= conf_threshold:
@@ -92,58 +1091,76 @@ def _pii_extraction_from_text(text, type="pii", conf_threshold=0.5):
     return filtered_results
 
 
-def _pii_extraction_from_json(objs, type="pii", conf_threshold=0.5):
+def _json_leaves(objs, path=(), sampling=None):
     """
-    Extracts PII from a json.
+    Collects the leaves of a json along with their path.
     Parameters
     ----------
     objs : list
-        The json to be analyzed.
-    type : str
-        The type of PII to be extracted.
-    conf_threshold : float
-        The confidence threshold.
+        The json to be walked.
+    path : tuple
+        The keys and indices leading to `objs`.
+    sampling : dict
+        The sampling state, None to collect every leaf. Its
+        "sample_size" is the number of records kept in the arrays of
+        records with the same keys, its "budget" the number of bytes
+        of leaves left to collect (None for no limit), and "sampled" is
+        set to True when part of the json is skipped.
     Returns
     -------
-    filtered_results : list
-        A list containing the extracted PII.
+    leaves : list
+        A list of (path, leaf) tuples with the non-empty leaves as strings.
     """
     # Base Case
     if not objs:
         return []
+    if sampling is not None and sampling["budget"] is not None:
+        if sampling["budget"] <= 0:
+            sampling["sampled"] = True
+            return []
+    if not isinstance(objs, (str, list, dict)):
+        objs = str(objs)
     if isinstance(objs, str):
-        return _pii_extraction_from_text(objs, type, conf_threshold)
+        if sampling is not None and sampling["budget"] is not None:
+            objs = _truncate(objs, sampling)
+            sampling["budget"] -= len(objs.encode("utf-8"))
+        return [(path, objs)]
 
-    filtered_results = []
+    leaves = []
     # Check if the object is a list
     if isinstance(objs, list):
+        indices = range(len(objs))
+        if sampling is not None and sampling["sample_size"] is not None:
+            if len(objs) > sampling["sample_size"] and _is_homogeneous(objs):
+                # Keep records spread over the whole array
+                step = len(objs) / sampling["sample_size"]
+                indices = [int(i * step) for i in range(sampling["sample_size"])]
+                sampling["sampled"] = True
         # Recursively call the function for each element in the list
-        for obj in objs:
-            filtered_results += _pii_extraction_from_json(obj, type, conf_threshold)
+        for i in indices:
+            leaves += _json_leaves(objs[i], path + (i,), sampling)
     # Check if the object is a dictionary
-    elif isinstance(objs, dict):
-        # Recursively call the function for each element in the dictionary
-        for obj in objs.values():
-            filtered_results += _pii_extraction_from_json(obj, type, conf_threshold)
     else:
-        filtered_results += _pii_extraction_from_text(str(objs), type, conf_threshold)
-    return filtered_results
+        # Recursively call the function for each element in the dictionary
+        for key, obj in objs.items():
+            leaves += _json_leaves(obj, path + (key,), sampling)
+    return leaves
 
 
-def _validateJSON(jsonData):
+def _is_homogeneous(objs):
     """
-    Validates the JSON data.
+    Checks if a json array is made of records with the same keys.
     Parameters
     ----------
-    jsonData : str
-        The JSON data to be validated.
+    objs : list
+        The json array.
     Returns
     -------
-    valid : bool
-        True if the JSON data is valid, False otherwise.
+    homogeneous : bool
+        True if every element is a dictionary with the same key set.
     """
-    try:
-        json.loads(jsonData)
-    except ValueError as err:
+    if not isinstance(objs[0], dict):
         return False
-    return True
+    fingerprint = objs[0].keys()
+    return all(isinstance(obj, dict) and obj.keys() == fingerprint
+               for obj in objs)
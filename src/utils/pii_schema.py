@@ -0,0 +1,179 @@
+import hashlib
+import re
+
+# Entity types inferred from the (normalized) name of a json key. A key
+# also matches when it ends with one of the names, like `billing_iban`,
+# except for the names in `exact_key_names`
+key_entities = {
+    "email": "EMAIL_ADDRESS",
+    "e_mail": "EMAIL_ADDRESS",
+    "email_address": "EMAIL_ADDRESS",
+    "first_name": "PERSON",
+    "firstname": "PERSON",
+    "last_name": "PERSON",
+    "lastname": "PERSON",
+    "surname": "PERSON",
+    "full_name": "PERSON",
+    "fullname": "PERSON",
+    "given_name": "PERSON",
+    "address": "LOCATION",
+    "billing_address": "LOCATION",
+    "shipping_address": "LOCATION",
+    "delivery_address": "LOCATION",
+    "home_address": "LOCATION",
+    "mailing_address": "LOCATION",
+    "postal_address": "LOCATION",
+    "residential_address": "LOCATION",
+    "street": "LOCATION",
+    "street_address": "LOCATION",
+    "postal_code": "LOCATION",
+    "zip_code": "LOCATION",
+    "zipcode": "LOCATION",
+    "nationality": "NRP",
+    "religion": "NRP",
+    "ethnicity": "NRP",
+    "ip": "IP_ADDRESS",
+    "ip_address": "IP_ADDRESS",
+    "ipaddress": "IP_ADDRESS",
+    "remote_addr": "IP_ADDRESS",
+    "medical_license": "MEDICAL_LICENSE",
+    "card_number": "CREDIT_CARD",
+    "debit_card_number": "CREDIT_CARD",
+    "credit_card": "CREDIT_CARD",
+    "credit_card_number": "CREDIT_CARD",
+    "cc_number": "CREDIT_CARD",
+    "pan": "CREDIT_CARD",
+    "wallet_address": "CRYPTO",
+    "btc_address": "CRYPTO",
+    "bitcoin_address": "CRYPTO",
+    "crypto_address": "CRYPTO",
+    "iban": "IBAN_CODE",
+    "account_number": "US_BANK_NUMBER",
+    "bank_account": "US_BANK_NUMBER",
+    "bank_account_number": "US_BANK_NUMBER",
+    "itin": "US_ITIN",
+    "ssn": "US_SSN",
+    "social_security_number": "US_SSN",
+}
+# The names too generic to match as the end of a key, like `mac_address`,
+# `contract_address` or `gift_card_number`. These keys are not
+# classified, so their values are analyzed
+exact_key_names = {"address", "pan", "card_number", "account_number"}
+# The version of the inference, part of the keys of the cached flags
+# of the json key sets
+key_inference_version = 2
+
+
+def classify_key(key):
+    """
+    Infers the entity type of the values of a json key from its name.
+    Parameters
+    ----------
+    key : str
+        The name of the key.
+    Returns
+    -------
+    entity : str
+        The entity type, or None if the name is not known.
+    """
+    if not isinstance(key, str):
+        raise TypeError("`key` should be a string")
+    # Split camelCase and normalize the separators to underscores
+    name = re.sub(r"([a-z0-9])([A-Z])", r"\1_\2", key).lower()
+    name = re.sub(r"[^a-z0-9]+", "_", name).strip("_")
+    if name in key_entities:
+        return key_entities[name]
+    # Use the longest known name the key ends with, the generic
+    # names only match the whole key
+    suffixes = [known_name for known_name in key_entities
+                if name.endswith("_" + known_name)
+                and known_name not in exact_key_names]
+    if not suffixes:
+        return None
+    return key_entities[max(suffixes, key=len)]
+
+
+def infer_key_entities(objs):
+    """
+    Infers the entity types of a json from the names of its keys.
+    Only the keys with a non-empty value are considered.
+    Parameters
+    ----------
+    objs : dict or list
+        The json to be classified.
+    Returns
+    -------
+    entities : set
+        The entity types inferred from the key names.
+    """
+    entities = set()
+    for key, obj in _items(objs):
+        if isinstance(obj, (dict, list)):
+            entities |= infer_key_entities(obj)
+        elif key is not None and obj not in (None, ""):
+            entity = classify_key(key)
+            if entity is not None:
+                entities.add(entity)
+    return entities
+
+
+def schema_fingerprint(objs):
+    """
+    Computes the fingerprint of the key set of a json.
+    The indices of the arrays are ignored, so that responses with the
+    same schema but a different number of records share a fingerprint.
+    Parameters
+    ----------
+    objs : dict or list
+        The json to be fingerprinted.
+    Returns
+    -------
+    fingerprint : str
+        The sha256 hex digest of the key paths, or None if the json
+        has no key.
+    """
+    paths = set()
+    _key_paths(objs, "", paths)
+    if not paths:
+        return None
+    content = "\n".join(sorted(paths))
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _key_paths(objs, prefix, paths):
+    """
+    Collects the key paths of a json.
+    Parameters
+    ----------
+    objs : dict or list
+        The json to be walked.
+    prefix : str
+        The path leading to `objs`.
+    paths : set
+        The set the key paths are added to.
+    """
+    for key, obj in _items(objs):
+        path = prefix + ("[]" if key is None else "." + str(key))
+        if key is not None:
+            paths.add(path)
+        if isinstance(obj, (dict, list)):
+            _key_paths(obj, path, paths)
+
+
+def _items(objs):
+    """
+    Iterates over the items of a json object or array.
+    Parameters
+    ----------
+    objs : dict or list
+        The json object or array.
+    Returns
+    -------
+    items : iterable
+        The (key, value) pairs, with None keys for the array elements.
+    """
+    if isinstance(objs, dict):
+        return objs.items()
+    if isinstance(objs, list):
+        return ((None, obj) for obj in objs)
+    return ()
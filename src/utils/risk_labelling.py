@@ -1,5 +1,517 @@
+from collections import namedtuple
+from copy import copy
+import hashlib
+import numpy as np
 import pandas as pd
 from pathlib import Path
+import pickle
+
+
+# the wildcard value of the rule columns that match any value of the api
+rule_wildcards = {
+    "server_location": "Anywhere",
+    "security_test_category": "All Tests Performed/Available",
+}
+
+# the format of the compiled rules artifact, to be increased when
+# the normalization or the index change
+rules_format = 1
+CompiledRules = namedtuple("CompiledRules", ["version", "rules", "index", "report"])
+
+# the mapping tables from the values of the api_df to the values of the
+# rules, the values that are not in a table are kept as they are
+pii_fii_map = {True: "Yes", False: "No"}
+# the authentication values meaning "No Authentication",
+# any other value is "Some Authentication"
+no_authentication = ["None", "No Authentication"]
+security_test_category_map = {
+    "None": "No Test Performed/Available",
+    "SQL Injection": "Injections",
+    "Insecure Deserialization": "All Tests Performed/Available",
+}
+security_test_result_map = {0.: "Pass", 1.: "Fail"}
+server_location_map = {
+    "None": "Anywhere",
+    **{country: "Americas" for country in ["United States", "Canada"]},
+    **{country: "West Europe" for country in [
+        "United Kingdom", "Ireland", "Germany", "Spain",
+        "Luxembourg", "Sweden", "France", "Netherlands"]},
+    **{country: "Others" for country in [
+        "India", "Bangladesh", "Japan", "Australia", "Czechia",
+        "Lithuania", "Singapore"]},
+}
+
+
+class RuleIndex:
+    """
+    Hash index of the risk rules.
+    The rules are grouped by the set of their wildcard columns, and each
+    group maps the values of the other columns to the first rule with
+    these values. A row is then labelled with one lookup per group, and
+    the first matching rule in the order of `rule_df` wins. A dataframe
+    is labelled with one merge per group instead.
+
+    Parameters
+    ----------
+    rule_df : pandas.DataFrame
+        A dataframe that contains the risk rules
+    default : str
+        The label of the rows that match no rule
+    """
+
+    def __init__(self, rule_df, default="Low"):
+        if not isinstance(rule_df, pd.DataFrame):
+            raise TypeError("`rule_df` should be a pandas DataFrame")
+        self.columns = [column for column in rule_df.columns
+                        if column != "Risk_Label"]
+        self.default = default
+        self._wildcards = [(self.columns.index(column), value)
+                           for column, value in rule_wildcards.items()
+                           if column in self.columns]
+
+        self._indexes = {}
+        rules = rule_df[self.columns].to_numpy().tolist()
+        for position, (rule, label) in enumerate(
+                zip(rules, rule_df["Risk_Label"])):
+            group = frozenset(j for j, value in self._wildcards
+                              if rule[j] == value)
+            index = self._indexes.setdefault(group, {})
+            # keep the first rule of the duplicated keys
+            index.setdefault(self._key(rule, group), (position, label))
+
+        # the same index as tables, to be merged with the rows
+        self._tables = {}
+        for group, index in self._indexes.items():
+            on = [column for j, column in enumerate(self.columns)
+                  if j not in group]
+            table = pd.DataFrame(list(index.keys()), columns=on, dtype="object")
+            table["_position"] = [found[0] for found in index.values()]
+            table["_label"] = [found[1] for found in index.values()]
+            self._tables[group] = (on, table)
+
+    def __len__(self):
+        return sum(len(index) for index in self._indexes.values())
+
+    def with_default(self, default):
+        """
+        Share the index with another label for the rows matching no rule
+
+        Parameters
+        ----------
+        default : str
+            The label of the rows that match no rule
+
+        Returns
+        -------
+        RuleIndex
+            A copy of the index with the new default
+        """
+        rule_index = copy(self)
+        rule_index.default = default
+        return rule_index
+
+    def shadowing(self, rule):
+        """
+        Find the earliest rule of the index matching every row that a rule
+        matches, which makes the rule useless if it comes after it
+
+        Parameters
+        ----------
+        rule : list
+            The values of the rule, in the order of `columns`
+
+        Returns
+        -------
+        tuple
+            The position and the label of the earliest such rule,
+            or None if there is none
+        """
+        group = frozenset(j for j, value in self._wildcards
+                          if rule[j] == value)
+        match = None
+        for other_group, index in self._indexes.items():
+            # the rules with more wildcards match more rows
+            if not group <= other_group:
+                continue
+            found = index.get(self._key(rule, other_group))
+            if found is not None and (match is None or found[0] < match[0]):
+                match = found
+        return match
+
+    def lookup(self, values):
+        """
+        Find the label of the first rule matching the values of a row
+
+        Parameters
+        ----------
+        values : tuple
+            The values of the row, in the order of `columns`
+
+        Returns
+        -------
+        str
+            The risk label
+        """
+        match = None
+        for group, index in self._indexes.items():
+            found = index.get(self._key(values, group))
+            if found is not None and (match is None or found[0] < match[0]):
+                match = found
+        return self.default if match is None else match[1]
+
+    def classify(self, df):
+        """
+        Find the label of each row of a dataframe
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            A dataframe with the columns of the rules
+
+        Returns
+        -------
+        list
+            The risk label of each row
+        """
+        missing = [column for column in self.columns if column not in df]
+        if missing:
+            raise ValueError("`df` is missing the rule columns " +
+                             ", ".join(missing))
+        rows = df[self.columns].astype("object").reset_index(drop=True)
+        positions = np.full(len(rows), np.inf)
+        labels = np.full(len(rows), self.default, dtype="object")
+        for on, table in self._tables.values():
+            if on:
+                # the keys of a table are unique, so the left merge
+                # keeps one row per row of df, in the same order
+                matched = rows[on].merge(table, how="left", on=on)
+                found = matched["_position"].to_numpy(dtype="float64")
+                found_labels = matched["_label"].to_numpy()
+            else:
+                # a rule with only wildcard columns matches every row
+                found = np.full(len(rows), table["_position"].iloc[0], "float64")
+                found_labels = np.full(len(rows), table["_label"].iloc[0], "object")
+            # NaN is never lower, so the rows without a match are kept
+            earlier = found < positions
+            positions[earlier] = found[earlier]
+            labels[earlier] = found_labels[earlier]
+        return labels.tolist()
+
+    @staticmethod
+    def _key(values, group):
+        """
+        Build the key of the values, without the columns of the group
+
+        Parameters
+        ----------
+        values : list
+            The values of a rule or a row
+        group : frozenset
+            The positions of the wildcard columns
+
+        Returns
+        -------
+        tuple
+            The values of the other columns
+        """
+        return tuple(value for j, value in enumerate(values) if j not in group)
+
+
+def compile_rules(risk_rules_path):
+    """
+    Compile the risk rules workbook into normalized rules and their index.
+    The exact duplicates are dropped, and the rules that can never be
+    used are reported: the "conflict" rules have the same conditions as
+    an earlier rule with another label, and the "shadowed" rules only
+    match rows that an earlier rule with more wildcards already matches.
+
+    Parameters
+    ----------
+    risk_rules_path : str
+        The path to the risk rules workbook
+
+    Returns
+    -------
+    CompiledRules
+        The version of the rules (the sha256 of the workbook), the
+        normalized rules, their index and the report of the duplicated
+        and shadowed rules, by row of the workbook
+    """
+    if not isinstance(risk_rules_path, str):
+        raise TypeError("`risk_rules_path` should be a string")
+    with open(risk_rules_path, "rb") as file:
+        version = hashlib.sha256(file.read()).hexdigest()
+
+    # read risk rules
+    rule_df = pd.read_excel(risk_rules_path, sheet_name="RiskRules")
+    # drop the first column vendor_api_category since we not using it
+    rule_df = rule_df.iloc[:, 1:]
+    # fill the empty values with "None"
+    rule_df = rule_df.fillna("None")
+    # the rows of the workbook, after its header
+    workbook_rows = (rule_df.index + 2).tolist()
+
+    report = []
+    kept_rows = []
+    first_rows = {}
+    for row, values in zip(workbook_rows, rule_df.to_numpy().tolist()):
+        first_row = first_rows.setdefault(tuple(values), row)
+        if first_row == row:
+            kept_rows.append(row)
+        else:
+            report.append({"row": row, "issue": "duplicate",
+                           "label": values[-1], "used_label": values[-1],
+                           "by_row": first_row})
+    # remove duplicates
+    rule_df = rule_df.drop_duplicates()
+    rule_index = RuleIndex(rule_df)
+
+    rules = rule_df[rule_index.columns].to_numpy().tolist()
+    for position, (rule, label) in enumerate(zip(rules, rule_df["Risk_Label"])):
+        found = rule_index.shadowing(rule)
+        if found is not None and found[0] < position:
+            conflict = rule == rules[found[0]]
+            report.append({"row": kept_rows[position],
+                           "issue": "conflict" if conflict else "shadowed",
+                           "label": label, "used_label": found[1],
+                           "by_row": kept_rows[found[0]]})
+    report = pd.DataFrame(report, columns=["row", "issue", "label",
+                                           "used_label", "by_row"])
+    return CompiledRules(version, rule_df, rule_index,
+                         report.sort_values("row", ignore_index=True))
+
+
+def load_rules(risk_rules_path, artifact_path=None):
+    """
+    Load the compiled risk rules, compiling the workbook only if it
+    changed since the artifact was saved. The issues of the rules are
+    printed when they are compiled.
+
+    Parameters
+    ----------
+    risk_rules_path : str
+        The path to the risk rules workbook
+    artifact_path : str
+        The path to the compiled rules, by default next to the workbook
+        with the .rules.pkl extension
+
+    Returns
+    -------
+    CompiledRules
+        The version, the normalized rules, their index and their report
+    """
+    if not isinstance(risk_rules_path, str):
+        raise TypeError("`risk_rules_path` should be a string")
+    if artifact_path is None:
+        artifact_path = str(Path(risk_rules_path).with_suffix(".rules.pkl"))
+    with open(risk_rules_path, "rb") as file:
+        version = hashlib.sha256(file.read()).hexdigest()
+
+    if Path(artifact_path).exists():
+        with open(artifact_path, "rb") as file:
+            artifact = pickle.load(file)
+        if artifact.get("format") == rules_format and \
+                artifact["rules"].version == version:
+            return artifact["rules"]
+
+    compiled = compile_rules(risk_rules_path)
+    with open(artifact_path, "wb") as file:
+        pickle.dump({"format": rules_format, "rules": compiled}, file)
+    counts = compiled.report["issue"].value_counts()
+    print(f"Compiled {len(compiled.rules)} risk rules: " +
+          ", ".join(f"{counts.get(issue, 0)} {issue}"
+                    for issue in ["duplicate", "conflict", "shadowed"]))
+    return compiled
+
+
+def diff_rules(old_index, new_index):
+    """
+    Compare two versions of the risk rules.
+    Only the first rule of each key counts, like in the index.
+
+    Parameters
+    ----------
+    old_index : RuleIndex
+        The index of the previous rules
+    new_index : RuleIndex
+        The index of the new rules
+
+    Returns
+    -------
+    dict
+        The "added", "removed" and "changed" (other label) rules, as sets
+        of (wildcard group, key) pairs, and whether the rules kept in both
+        versions are "reordered"
+    """
+    old_rules = {(group, key): found for group, index in old_index._indexes.items()
+                 for key, found in index.items()}
+    new_rules = {(group, key): found for group, index in new_index._indexes.items()
+                 for key, found in index.items()}
+    kept = old_rules.keys() & new_rules.keys()
+    return {
+        "added": new_rules.keys() - old_rules.keys(),
+        "removed": old_rules.keys() - new_rules.keys(),
+        "changed": {rule for rule in kept
+                    if old_rules[rule][1] != new_rules[rule][1]},
+        "reordered": sorted(kept, key=lambda rule: old_rules[rule][0]) !=
+        sorted(kept, key=lambda rule: new_rules[rule][0]),
+    }
+
+
+def relabel_changed_rules(api_df, labels, old_index, new_index):
+    """
+    Relabel only the rows matching a rule that was added, removed or
+    changed between two versions of the rules. The other rows keep their
+    label. All the rows are relabelled if the rules kept in both versions
+    were reordered, since the order decides between overlapping rules.
+
+    Parameters
+    ----------
+    api_df : pandas.DataFrame
+        The normalized rows, with the columns of the rules
+    labels : list
+        The labels of the rows with the previous rules
+    old_index : RuleIndex
+        The index of the previous rules
+    new_index : RuleIndex
+        The index of the new rules
+
+    Returns
+    -------
+    tuple
+        The list of the labels with the new rules, and a boolean array of
+        the relabelled rows
+    """
+    if len(labels) != len(api_df):
+        raise ValueError("`labels` should have one label per row of `api_df`")
+    changes = diff_rules(old_index, new_index)
+    if changes["reordered"] or old_index.columns != new_index.columns or \
+            old_index.default != new_index.default:
+        return new_index.classify(api_df), np.ones(len(api_df), dtype=bool)
+
+    # the rules to look for in each wildcard group
+    groups = {}
+    for group, key in changes["added"] | changes["removed"] | changes["changed"]:
+        groups.setdefault(group, set()).add(key)
+
+    rows = api_df[new_index.columns].astype("object").reset_index(drop=True)
+    relabelled = np.zeros(len(rows), dtype=bool)
+    for group, keys in groups.items():
+        on = [column for j, column in enumerate(new_index.columns)
+              if j not in group]
+        if not on:
+            # a rule with only wildcard columns matches every row
+            relabelled[:] = True
+            break
+        table = pd.DataFrame(list(keys), columns=on, dtype="object")
+        table["_matched"] = True
+        matched = rows[on].merge(table, how="left", on=on)["_matched"]
+        relabelled |= matched.notna().to_numpy()
+
+    labels = list(labels)
+    positions = np.flatnonzero(relabelled)
+    for i, label in zip(positions, new_index.classify(rows.iloc[positions])):
+        labels[i] = label
+    return labels, relabelled
+
+
+def save_label_snapshot(snapshot_path, rule_df, api_df):
+    """
+    Save the rules and the labelled rows of a labelling, for the next
+    `relabel_from_snapshot`.
+
+    Parameters
+    ----------
+    snapshot_path : str
+        The path to the snapshot
+    rule_df : pandas.DataFrame
+        The compiled rules
+    api_df : pandas.DataFrame
+        The normalized rows, with the api_endpoint_id, the columns of
+        the rules and the Risk_Label
+    """
+    if not isinstance(rule_df, pd.DataFrame) or \
+            not isinstance(api_df, pd.DataFrame):
+        raise TypeError("`rule_df` and `api_df` should be pandas DataFrames")
+    columns = [column for column in rule_df.columns if column != "Risk_Label"]
+    rows = api_df[["api_endpoint_id"] + columns + ["Risk_Label"]]
+    pd.to_pickle({"rules": rule_df, "rows": rows.reset_index(drop=True)},
+                 snapshot_path)
+
+
+def relabel_from_snapshot(api_df, rule_df, rule_index, snapshot_path):
+    """
+    Label the normalized rows, only relabelling what changed since the
+    labelling saved at `snapshot_path`: the rows matching a rule that was
+    added, removed or changed, and the rows that are new or whose
+    normalized values changed. The other rows keep their previous label.
+    All the rows are labelled if there is no snapshot. The snapshot is
+    then replaced by the one of these rules and rows.
+
+    Parameters
+    ----------
+    api_df : pandas.DataFrame
+        The normalized rows, with the api_endpoint_id and the columns
+        of the rules
+    rule_df : pandas.DataFrame
+        The compiled rules of `rule_index`
+    rule_index : RuleIndex
+        The index of the rules
+    snapshot_path : str
+        The path to the snapshot
+
+    Returns
+    -------
+    tuple
+        The labels and the previous labels (NaN for the new rows), as
+        Series with the index of `api_df`, and a boolean array of the
+        relabelled rows
+    """
+    if not isinstance(api_df, pd.DataFrame):
+        raise TypeError("`api_df` should be a pandas DataFrame")
+    if not isinstance(snapshot_path, str):
+        raise TypeError("`snapshot_path` should be a string")
+    columns = rule_index.columns
+    if Path(snapshot_path).exists():
+        snapshot = pd.read_pickle(snapshot_path)
+        previous_rows = snapshot["rows"]
+        if previous_rows["api_endpoint_id"].tolist() == \
+                api_df["api_endpoint_id"].tolist():
+            previous = previous_rows
+        else:
+            # the ids are not unique, so the rows of the duplicated
+            # ids are unknown and labelled again
+            previous_rows = previous_rows.drop_duplicates("api_endpoint_id",
+                                                          keep=False)
+            previous = api_df[["api_endpoint_id"]].merge(
+                previous_rows, how="left", on="api_endpoint_id")
+        previous = previous.set_axis(api_df.index)
+        previous_index = RuleIndex(snapshot["rules"], default=rule_index.default)
+        labels, relabelled = relabel_changed_rules(
+            api_df, previous["Risk_Label"].tolist(), previous_index, rule_index)
+        # the new rows and the rows whose values changed, NaN being
+        # equal to NaN
+        old_values = previous[columns].astype("object")
+        new_values = api_df[columns].astype("object")
+        same = (old_values == new_values) | \
+            (old_values.isna() & new_values.isna())
+        changed = (~same.all(axis=1) | previous["Risk_Label"].isna()).to_numpy()
+        changed &= ~relabelled
+        positions = np.flatnonzero(changed)
+        for i, label in zip(positions,
+                            rule_index.classify(api_df.iloc[positions])):
+            labels[i] = label
+        relabelled |= changed
+        previous_labels = previous["Risk_Label"]
+    else:
+        labels = rule_index.classify(api_df)
+        relabelled = np.ones(len(api_df), dtype=bool)
+        previous_labels = pd.Series(np.nan, index=api_df.index, dtype="object")
+
+    labels = pd.Series(labels, index=api_df.index, dtype="object")
+    save_label_snapshot(snapshot_path, rule_df,
+                        api_df.assign(Risk_Label=labels))
+    return labels, previous_labels, relabelled
 
 
 def classify_risk(row, rule_df):
@@ -12,8 +524,8 @@ def classify_risk(row, rule_df):
     ----------
     row : pandas.Series
         A row in the api_df
-    rule_df : pandas.DataFrame
-        A dataframe that contains the risk rules
+    rule_df : pandas.DataFrame or RuleIndex
+        A dataframe that contains the risk rules, or its index
 
     Returns
     -------
@@ -23,27 +535,20 @@ def classify_risk(row, rule_df):
     """
     if not isinstance(row, pd.Series):
         raise TypeError("`type` should be a valid Pandas Series")
-    if not isinstance(rule_df, pd.DataFrame):
+    if not isinstance(rule_df, (pd.DataFrame, RuleIndex)):
         raise TypeError("`rule_df` should be a pandas DataFrame")
+    rule_index = rule_df
+    if isinstance(rule_df, pd.DataFrame):
+        rule_index = RuleIndex(rule_df)
     # remove api_endpoint_id from row series
     row = row.drop(labels=["api_endpoint_id"])
-    # loop through each row in rule_df
-    for i in range(len(rule_df)):
-        rule_copy = rule_df.iloc[i]
-        # drop the column "Risk_Label"
-        rule_copy = rule_copy.drop(["Risk_Label"])
-        if rule_copy['server_location'] == 'Anywhere':
-            rule_copy['server_location'] = row['server_location']
-        if rule_copy['security_test_category'] == 'All Tests Performed/Available':
-            rule_copy['security_test_category'] = row['security_test_category']
-        # check if the row is the same with any row in rule_df
-        if row.equals(rule_copy):
-            # return the value in column "Risk_Label"
-            return rule_df.iloc[i]["Risk_Label"]
-    return "Low"
-
-
-def create_risk_label(df, risk_rules_path):
+    # the row only matches the rules with the same columns
+    if list(row.index) != rule_index.columns:
+        return rule_index.default
+    return rule_index.lookup(row.tolist())
+
+
+def create_risk_label(df, risk_rules_path, snapshot_path=None):
     '''
     Create the risk label for the api_df
 
@@ -53,98 +558,67 @@ def create_risk_label(df, risk_rules_path):
         The api_df
     risk_rules_path : str
         The path to the risk rules
+    snapshot_path : str
+        The path to the snapshot of the previous labelling, to only
+        relabel the rows affected by the changes of the rules or of the
+        rows with `relabel_from_snapshot`, all the rows by default
 
     Returns
     -------
     pandas.DataFrame
         The api_df with the risk label
     '''
-    # read risk rules
-    rule_df = pd.read_excel(risk_rules_path, sheet_name="RiskRules")
-    # drop the first column vendor_api_category since we not using it
-    rule_df = rule_df.iloc[:, 1:]
-    # fill the empty values with "None"
-    rule_df = rule_df.fillna("None")
-    # remove duplicates
-    rule_df = rule_df.drop_duplicates()
-    # change server_location from Amaricas to Americas
-    # rule_df["server_location"] = rule_df["server_location"].replace(
-    #     "Amaricas", "Americas")
+    # load the compiled risk rules
+    compiled = load_rules(risk_rules_path)
+    rule_index = compiled.index
 
     # # read the data with fii and pii
     # original_df = pd.read_excel(path_to_pii)
     # original_df = original_df.drop_duplicates()
     # # make a copy of api_df
-    api_df = df.copy()
+    api_df = df[['api_endpoint_id', 'authentication', 'security_test_category',
+                 'security_test_result', 'server_location', 'hosting_isp', 'is_pii', 'is_fii']]
     # fill the empty values with "None"
     api_df = api_df.fillna("None")
-    api_df = api_df[['api_endpoint_id', 'authentication', 'security_test_category',
-                     'security_test_result', 'server_location', 'hosting_isp', 'is_pii', 'is_fii']]
-
-    # rename the column "is_pii" to "PII"
-    api_df = api_df.rename(columns={"is_pii": "PII"})
-    # rename the column "is_fii" to "FII"
-    api_df = api_df.rename(columns={"is_fii": "FII"})
-    # replace is_pii true to yes and false to no
-    api_df["PII"] = api_df["PII"].replace(True, "Yes")
-    api_df["PII"] = api_df["PII"].replace(False, "No")
-    # replace is_fii true to yes and false to no
-    api_df["FII"] = api_df["FII"].replace(True, "Yes")
-    api_df["FII"] = api_df["FII"].replace(False, "No")
-
-    # process column authentication from api_df, replace nan and none with "No Authentication"
-    api_df["authentication"] = api_df["authentication"].replace(
-        "None", "No Authentication")
-    # replace all value that not "No Authentication" with "Some Authentication"
-    api_df["authentication"].mask(api_df["authentication"] !=
-                                  "No Authentication", "Some Authentication", inplace=True)
-
-    # process column security_test_category from api_df, replace nan with "No Test Performed/Available"
-    api_df["security_test_category"] = api_df["security_test_category"].replace(
-        "None", "No Test Performed/Available")
-    # replace Injections with "SQL Injection"
-    api_df["security_test_category"] = api_df["security_test_category"].replace(
-        "SQL Injection", "Injections")
-    # replace "Insecure Deserialization" with "No Test Performed/Available"
+
+    # rename the columns "is_pii" and "is_fii" to "PII" and "FII"
+    api_df = api_df.rename(columns={"is_pii": "PII", "is_fii": "FII"})
+    # replace true with yes and false with no
+    api_df["PII"] = api_df["PII"].replace(pii_fii_map)
+    api_df["FII"] = api_df["FII"].replace(pii_fii_map)
+
+    # process column authentication from api_df, "No Authentication" for nan
+    # and none, "Some Authentication" for all the other values
+    api_df["authentication"] = np.where(
+        api_df["authentication"].isin(no_authentication),
+        "No Authentication", "Some Authentication")
+
+    # process column security_test_category from api_df, nan is
+    # "No Test Performed/Available" and the categories are mapped
+    # to the categories of the rules
     api_df["security_test_category"] = api_df["security_test_category"].replace(
-        "Insecure Deserialization", "All Tests Performed/Available")
+        security_test_category_map)
 
-    # process column security_test_result from api_df, replace false with "Passed"
+    # process column security_test_result from api_df, false is "Pass"
+    # and true is "Fail"
     api_df["security_test_result"] = api_df["security_test_result"].replace(
-        0., "Pass")
-    # replace true with "Failed"
-    api_df["security_test_result"] = api_df["security_test_result"].replace(
-        1., "Fail")
+        security_test_result_map)
 
-    # process column server_location from api_df, replace nan with "Anywhere"
-    api_df["server_location"] = api_df["server_location"].replace(
-        "None", "Anywhere")
-    api_df["server_location"] = api_df["server_location"].replace(
-        ["United States", "Canada"], "Americas")
-    api_df["server_location"] = api_df["server_location"].replace(
-        ["United Kingdom", "Ireland", "Germany", "Spain",
-         "Luxembourg", "Sweden", "France", "Netherlands"], "West Europe")
-    # replace everything else with "Others"
+    # process column server_location from api_df, nan is "Anywhere"
+    # and the countries are mapped to their region
     api_df["server_location"] = api_df["server_location"].replace(
-        ["India", "Bangladesh", "Japan", "Australia",  "Czechia", "Lithuania", "Singapore"], "Others")
+        server_location_map)
 
     # process column hosting_isp from api_df, replace value with "Anyone"
     api_df["hosting_isp"] = "Anyone"
 
-    # apply the function classify_risk to each row in api_df
-    api_df["Risk_Label"] = api_df.apply(classify_risk, axis=1, args=(rule_df,))
-
-    # create risk_df on api_df columns "api_endpoint_id" and "Risk_Label"
-    # make a copy of api_df
-    # risk_df = api_df[["api_endpoint_id", "Risk_Label"]]
-    risk_df = api_df[["Risk_Label"]]
-
-    # to avoid unexpected behavior, we need to drop the duplicates
-    # risk_df = risk_df.drop_duplicates()
-
-    # merge df and df_risk_labeled
-    # df = df.merge(risk_df, how="left", on="api_endpoint_id")
-    df_full = pd.merge(df, risk_df, left_index=True, right_index=True)
+    # label each row in api_df with the index of the rules,
+    # "Low" for the rows that match no rule
+    df_full = df.copy()
+    if snapshot_path is None:
+        df_full["Risk_Label"] = rule_index.classify(api_df)
+    else:
+        df_full["Risk_Label"], _, _ = relabel_from_snapshot(
+            api_df, compiled.rules, rule_index, snapshot_path)
 
     return df_full
-
@@ -1,70 +1,86 @@
 # Import dependencies
+import numpy as np
 import pandas as pd
-from sklearn.compose import make_column_transformer
-from sklearn.impute import SimpleImputer
-from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder
-from sklearn.pipeline import make_pipeline
+
+# Levels of the security test result, a missing result is in between
+test_result_levels = [0.0, 0.5, 1.0]
 
 
 def security_test_feat_creation(df):
     """
     Create security test features.
+    Only the security test category and result are encoded, the new
+    columns are added to `df` and its other columns keep their dtypes.
     Parameters
     ----------
     df : pandas dataframe
-        The text to be analyzed.
+        The endpoints.
     Returns
     -------
     transformed_df : pandas df
-        A list containing the extracted PII.
+        The endpoints with the security test features, without
+        duplicates, indexed by their position in `df`.
     """
     # Check if the df is valid
     if not isinstance(df, pd.DataFrame):
         raise TypeError("`df` should be a valid Pandas DataFrame")
-    # SETTING-UP pre-processor variables
-    # Define column types
-    # make copy of column security_test_category
-    df['security_test_category_processed'] = df['security_test_category']
-    df['security_test_result_processed'] = df['security_test_result']
-    categorical_features = ["security_test_category_processed"]
-    ordinal_features = ["security_test_result_processed"]
-    # passthrough_features is the list of columns in df
-    # minus the categorical and ordinal features
-    passthrough_features = [
-        feature for feature in df.columns 
-        if feature not in ordinal_features + categorical_features
-    ]
-    # Define levels for ordinal encoder
-    test_result_levels = [
-        0.0,
-        0.5,
-        1.0
-    ]
-    # Define transformers
-    categorical_transformer = make_pipeline(
-        SimpleImputer(strategy="constant", fill_value="Missing"),
-        OneHotEncoder(handle_unknown="ignore", sparse=False),
-    )
-    ordinal_transformer = make_pipeline(
-        SimpleImputer(strategy="constant", fill_value=0.5),
-        OrdinalEncoder(categories=[test_result_levels], dtype=int)
-    )
-    # Build preprocessor
-    preprocessor = make_column_transformer(
-        ("passthrough", passthrough_features),
-        (ordinal_transformer, ordinal_features),
-        (categorical_transformer, categorical_features),
-    )
-
     # Create security test features
-    preprocessor.fit(df)
-    transformed = preprocessor.transform(df)
+    df = encode_security_tests(
+        df, security_test_values(df["security_test_category"]))
+
+    kept = ~df.duplicated().to_numpy()
+    transformed_df = df[kept]
+    transformed_df.index = pd.RangeIndex(len(df))[kept]
+    return transformed_df
 
-    # Get column names
-    ohe_features = list(preprocessor.named_transformers_['pipeline-2'].named_steps['onehotencoder'].get_feature_names())
-    feature_names = passthrough_features  + ordinal_features + ohe_features
 
-    transformed_df = pd.DataFrame(transformed, columns=feature_names)
+def security_test_values(security_test_category):
+    """
+    List the security test categories one hot encoded by
+    `encode_security_tests`, a missing category being "Missing".
+    Parameters
+    ----------
+    security_test_category : pandas series
+        The security test category of the endpoints.
+    Returns
+    -------
+    test_categories : list
+        The sorted security test categories.
+    """
+    return sorted(security_test_category.fillna("Missing").unique())
+
+
+def encode_security_tests(df, test_categories):
+    """
+    Create the security test features with given security test categories.
+    The new columns are added to `df`, the other columns are left as
+    they are.
+    Parameters
+    ----------
+    df : pandas dataframe
+        The endpoints.
+    test_categories : list
+        The one hot encoded categories, from `security_test_values`.
+    Returns
+    -------
+    df : pandas df
+        The endpoints with the security_test_result_processed column
+        and a x0_ column per security test category.
+    """
+    # Encode the results with their level, a missing result being 0.5
+    results = df["security_test_result"].astype(float).fillna(0.5)
+    result_codes = pd.Categorical(results, categories=test_result_levels).codes
+    if (result_codes < 0).any():
+        raise ValueError("`security_test_result` should be 0, 1 or missing")
+
+    # One hot encode the categories, the unknown ones with zeros
+    codes = pd.Categorical(df["security_test_category"].fillna("Missing"),
+                           categories=test_categories).codes
+    ohe = np.zeros((len(df), len(test_categories)))
+    found = codes >= 0
+    ohe[np.flatnonzero(found), codes[found]] = 1
 
-    transformed_df = transformed_df.drop_duplicates()
-    return transformed_df
\ No newline at end of file
+    df["security_test_result_processed"] = result_codes.astype("int64")
+    for i, category in enumerate(test_categories):
+        df["x0_" + str(category)] = ohe[:, i]
+    return df
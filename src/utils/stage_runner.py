@@ -0,0 +1,191 @@
+from collections import namedtuple
+import hashlib
+import os
+import pandas as pd
+from pathlib import Path
+import pickle
+import time
+
+# A step of a pipeline: `function` is called with the outputs of its
+# `inputs`, which are the names of sources or of other stages. Its output
+# is cached under a key of its inputs, of `params`, a dict of the values
+# the output depends on, and of `version`, to be increased when the code
+# of the stage changes its output
+Stage = namedtuple("Stage", ["name", "function", "inputs", "params", "version"])
+
+
+def file_hash(path):
+    """
+    Hash the content of a file, to be used as a parameter of a stage.
+    Parameters
+    ----------
+    path : str
+        The path to the file.
+    Returns
+    -------
+    digest : str
+        The sha256 hex digest of the file.
+    """
+    if not isinstance(path, str):
+        raise TypeError("`path` should be a string")
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def frame_hash(df):
+    """
+    Hash the columns, dtypes, index and values of a dataframe.
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The dataframe.
+    Returns
+    -------
+    digest : str
+        The sha256 hex digest of the dataframe.
+    """
+    if not isinstance(df, pd.DataFrame):
+        raise TypeError("`df` should be a valid Pandas DataFrame")
+    digest = hashlib.sha256()
+    digest.update(repr([list(df.columns),
+                        [str(dtype) for dtype in df.dtypes]]).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def run_stages(stages, sources, cache_dir, targets=None):
+    """
+    Runs the stages of a pipeline in the order of their inputs. The
+    output of a stage is read from `cache_dir` when a previous run had
+    the same key: the sha256 of its name, version and parameters and of
+    the keys of its inputs, the sources being keyed by their content.
+    So a change only recomputes the stages that depend on it, and the
+    outputs of the other stages are only read if they are needed.
+    A single output is kept per stage in `cache_dir`.
+    Parameters
+    ----------
+    stages : list
+        The stages of the pipeline.
+    sources : dict
+        The input dataframes of the pipeline, by name.
+    cache_dir : str
+        The folder of the cached outputs.
+    targets : list
+        The names of the stages whose outputs are returned, by default
+        the last stage to run.
+    Returns
+    -------
+    outputs : dict
+        The outputs of the targets, by name.
+    report : pandas.DataFrame
+        The status of each stage: a cache hit or recomputed, with its
+        seconds and key.
+    """
+    if not isinstance(stages, list) or \
+            not all(isinstance(stage, Stage) for stage in stages):
+        raise TypeError("`stages` should be a list of Stage")
+    if not isinstance(sources, dict):
+        raise TypeError("`sources` should be a dict")
+    if not isinstance(cache_dir, str):
+        raise TypeError("`cache_dir` should be a string")
+    order = _stage_order(stages, sources)
+    if targets is None:
+        targets = [list(order)[-1]]
+    for target in targets:
+        if target not in order:
+            raise ValueError(f"`targets` should be stages, not {target}")
+
+    keys = {name: frame_hash(source) for name, source in sources.items()}
+    for stage in order.values():
+        content = pickle.dumps([stage.name, stage.version,
+                                sorted(stage.params.items()),
+                                [keys[name] for name in stage.inputs]])
+        keys[stage.name] = hashlib.sha256(content).hexdigest()
+
+    cache_path = Path(cache_dir)
+    cache_path.mkdir(parents=True, exist_ok=True)
+    paths = {name: cache_path / f"{name}-{keys[name]}.pkl" for name in order}
+    # The outputs to read or compute: the targets, and the inputs
+    # of the stages to recompute
+    needed = set(targets)
+    for stage in reversed(list(order.values())):
+        if stage.name in needed and not paths[stage.name].exists():
+            needed.update(stage.inputs)
+
+    outputs = dict(sources)
+    report = []
+    for stage in order.values():
+        path = paths[stage.name]
+        hit = path.exists()
+        start = time.perf_counter()
+        if stage.name in needed and hit:
+            with open(path, "rb") as file:
+                outputs[stage.name] = pickle.load(file)
+        elif stage.name in needed:
+            outputs[stage.name] = stage.function(
+                *[outputs[name] for name in stage.inputs])
+            _save_output(outputs[stage.name], path)
+        report.append({"stage": stage.name,
+                       "status": "hit" if hit else "recomputed",
+                       "seconds": time.perf_counter() - start,
+                       "key": keys[stage.name]})
+    return ({target: outputs[target] for target in targets},
+            pd.DataFrame(report, columns=["stage", "status", "seconds", "key"]))
+
+
+def _stage_order(stages, sources):
+    """
+    Sorts the stages so that each stage comes after its inputs,
+    keeping the order of the list otherwise.
+    Parameters
+    ----------
+    stages : list
+        The stages of the pipeline.
+    sources : dict
+        The input dataframes of the pipeline, by name.
+    Returns
+    -------
+    order : dict
+        The sorted stages, by name.
+    """
+    names = [stage.name for stage in stages]
+    if len(set(names)) < len(names) or set(names) & set(sources):
+        raise ValueError("The stages and sources should have distinct names")
+    for stage in stages:
+        for name in stage.inputs:
+            if name not in names and name not in sources:
+                raise ValueError(
+                    f"`{stage.name}` has an unknown input {name}")
+
+    order = {}
+    remaining = list(stages)
+    while remaining:
+        ready = [stage for stage in remaining
+                 if all(name in sources or name in order
+                        for name in stage.inputs)]
+        if not ready:
+            raise ValueError("The inputs of the stages should not have a cycle")
+        order[ready[0].name] = ready[0]
+        remaining.remove(ready[0])
+    return order
+
+
+def _save_output(output, path):
+    """
+    Saves the output of a stage, replacing the previous outputs of
+    the stage.
+    Parameters
+    ----------
+    output : object
+        The output of the stage.
+    path : Path
+        The path to the cached output, named after the stage and its key.
+    """
+    stage_name = path.name.rsplit("-", 1)[0]
+    temporary_path = path.with_suffix(".tmp")
+    with open(temporary_path, "wb") as file:
+        pickle.dump(output, file, protocol=pickle.HIGHEST_PROTOCOL)
+    for previous in path.parent.glob(f"{stage_name}-*.pkl"):
+        if previous.name.rsplit("-", 1)[0] == stage_name:
+            previous.unlink()
+    os.replace(temporary_path, path)